@@ -0,0 +1,103 @@
+"""Render a camera fly-through with one scene setup and warm workers.
+
+    python animate.py --scene random --frames 0:48 --width 320 --height 180
+
+The camera orbits the scene's view unless --keyframes names a JSON file
+mapping frame numbers to `scene_camera` arguments, e.g.
+
+    {"0": {"lookfrom": [13, 2, 3], "lookat": [0, 0, 0], "vup": [0, 1, 0],
+           "vfov": 20, "aperture": 0.1, "focus_dist": 10},
+     "47": {"lookfrom": [4, 1, 2], "vfov": 30}}
+"""
+import os
+import json
+import argparse
+import time
+import numpy as np
+from utils import backend
+from utils.animation import CameraPath, render_animation
+from main import named_scene
+
+
+def frame_range(text):
+    start, stop = text.split(":")
+    return range(int(start), int(stop))
+
+
+def main() -> None:
+    start_time = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scene", default="random",
+        help="three_ball, random, procedural or the path of a scene file"
+    )
+    parser.add_argument(
+        "--spheres", type=int, default=10000,
+        help="sphere count of the procedural scene"
+    )
+    parser.add_argument(
+        "--frames", type=frame_range, default=frame_range("0:48"),
+        help="start:stop, stop excluded"
+    )
+    parser.add_argument("--keyframes", default=None)
+    parser.add_argument(
+        "--turns", type=float, default=1,
+        help="orbits over frames 0 to stop when there are no keyframes"
+    )
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=180)
+    parser.add_argument("--samples", type=int, default=8)
+    parser.add_argument("--max-depth", type=int, default=5)
+    parser.add_argument("--backend", choices=backend.BACKENDS, default=None)
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="render processes (default one per core, 0 renders in-process)"
+    )
+    parser.add_argument("--output", default="./frames/frame_{:04d}.png")
+    parser.add_argument("--memory-budget", type=int, default=256 * 1024**2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--denoise", action="store_true")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        backend.set_backend(args.backend)
+    np.random.seed(args.seed)
+    world, view = named_scene(args.scene, args.spheres)
+    if args.keyframes is None:
+        path = CameraPath.orbit(view, args.frames.stop, args.turns)
+    else:
+        with open(args.keyframes) as f:
+            path = CameraPath({int(k): v for k, v in json.load(f).items()})
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def report(frame_stats):
+        print(
+            f"frame {frame_stats['frame']}: "
+            f"{round(frame_stats['seconds'], 2)} s, "
+            f"{round(frame_stats['rays_per_second'] / 1e3, 1)} k primary rays/s"
+        )
+
+    print(
+        f"Rendering {len(args.frames)} frames of {args.scene} at "
+        f"{args.width}x{args.height}, {args.samples} spp "
+        f"({backend.get_backend()} backend)."
+    )
+    stats = render_animation(
+        world, path, args.frames, args.width, args.height, args.samples,
+        args.max_depth, args.memory_budget, args.output, args.seed,
+        args.workers, args.denoise, report, start_time
+    )
+    seconds = [frame["seconds"] for frame in stats["frames"]]
+    print(
+        f"Done in {round(stats['total_seconds'], 1)} s: "
+        f"{round(float(np.mean(seconds)), 2)} s per frame "
+        f"(first {round(seconds[0], 2)} s), "
+        f"{round(stats['amortized_rays_per_second'] / 1e3, 1)} k primary "
+        f"rays/s amortized over setup and all frames."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import time
+import numpy as np
+from utils import backend
+from utils.backend import asnumpy
+from utils.bvh import BVH
+from utils.render import render_samples, render_adaptive
+from main import random_scene, random_camera
+
+
+def main() -> None:
+    image_width = 128
+    image_height = 72
+    base_samples = 4
+    max_samples = 32
+    max_error = 0.05
+    max_depth = 5
+    memory_budget = 64 * 1024**2
+    seed = 0
+
+    np.random.seed(0)
+    world = BVH(random_scene())
+    cam = random_camera(image_width / image_height)
+    print(
+        f"Backend: {backend.get_backend()}, {image_width}x{image_height}, "
+        f"{base_samples}-{max_samples} spp, max error {max_error}"
+    )
+
+    start_time = time.perf_counter()
+    uniform = render_samples(
+        world, cam, image_width, image_height, max_samples,
+        max_depth, memory_budget, seed
+    )
+    uniform_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    adaptive = render_adaptive(
+        world, cam, image_width, image_height, base_samples, max_samples,
+        max_error, max_depth, memory_budget, seed
+    )
+    adaptive_time = time.perf_counter() - start_time
+
+    uniform_rays = uniform.samples()
+    adaptive_rays = adaptive.samples()
+    rmse = np.sqrt(np.mean(asnumpy(adaptive.mean - uniform.mean) ** 2))
+    print(f" uniform: {uniform_rays} primary rays, {round(uniform_time, 1)} s")
+    print(
+        f"adaptive: {adaptive_rays} primary rays, {round(adaptive_time, 1)} s, "
+        f"saved {uniform_rays - adaptive_rays} rays "
+        f"({round(100 * (1 - adaptive_rays / uniform_rays))}%)"
+    )
+    print(f"RMSE between the two: {round(float(rmse), 4)}")
+
+
+if __name__ == "__main__":
+    main()
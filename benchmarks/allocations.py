@@ -0,0 +1,69 @@
+import contextlib
+import numpy as np
+from utils import backend, kernels, profiler, workspace
+from utils.bvh import BVH
+from utils.accumulator import Accumulator
+from utils.render import scan_frame_tiled
+from main import random_scene, random_camera
+
+# Stages that do not nest inside each other, so their bytes add up.
+STAGES = ("camera", "traversal", "material", "sky", "compaction", "accumulate")
+
+
+def measure(world, cam, image_width, image_height, max_depth, scratch):
+    """Transient bytes per bounce of a 1 spp frame, with tracemalloc.
+
+    With `scratch` (a `Workspace`) active, its buffers are already warm
+    from a previous frame; without it every buffer is a fresh array.
+    """
+    accumulator = Accumulator(image_width, image_height)
+    context = workspace.use(scratch) if scratch else contextlib.nullcontext()
+    with context, profiler.profile(memory=True) as prof:
+        scan_frame_tiled(world, cam, accumulator, max_depth, 64 * 1024**2, 0)
+    report = prof.report()
+    wavefronts = sum(bounce["wavefronts"] for bounce in report["bounces"])
+    stages = report["stages"]
+    allocated = sum(
+        stages[name]["bytes_allocated"] for name in STAGES if name in stages
+    )
+    peak = max(stages[name]["peak_bytes"] for name in STAGES if name in stages)
+    return allocated / wavefronts, peak
+
+
+def main() -> None:
+    image_width = 160
+    image_height = 90
+    max_depth = 5
+
+    backend.set_backend("numpy")
+    np.random.seed(0)
+    scene = random_scene()
+    cam = random_camera(image_width / image_height)
+    paths = [("array", False)]
+    if kernels.numba is not None:
+        paths.append(("jit", True))
+
+    print(f"random_scene(), {image_width}x{image_height}, 1 spp")
+    for world_name, world in (("BVH", BVH(scene)), ("HittableList", scene)):
+        for path_name, jit in paths:
+            kernels.set_enabled(jit)
+            scratch = workspace.Workspace()
+            measure(world, cam, image_width, image_height, max_depth, scratch)
+            warm = scratch.report()
+            fresh = measure(world, cam, image_width, image_height, max_depth, None)
+            reused = measure(world, cam, image_width, image_height, max_depth, scratch)
+            after = scratch.report()
+            print(
+                f"{world_name:>12} {path_name:>5}: "
+                f"{round(fresh[0] / 1024)} -> {round(reused[0] / 1024)} KiB "
+                f"allocated per bounce, peak stage {round(fresh[1] / 1024)} -> "
+                f"{round(reused[1] / 1024)} KiB; workspace "
+                f"{warm['buffers']} buffers ({round(warm['bytes'] / 1024)} KiB), "
+                f"{after['requests'] - warm['requests']} requests and "
+                f"{after['allocations'] - warm['allocations']} allocations "
+                f"in the warm frame"
+            )
+
+
+if __name__ == "__main__":
+    main()
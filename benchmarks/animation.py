@@ -0,0 +1,82 @@
+import os
+import time
+import tempfile
+import numpy as np
+from utils import backend
+from utils.bvh import BVH
+from utils.render_pool import RenderPool
+from utils.animation import CameraPath, render_animation
+from main import random_scene, random_view
+
+
+def frame_per_call(path, frame, image_width, image_height, samples, max_depth, memory_budget, output):
+    """One frame as a `main()` call per frame renders it.
+
+    The scene is rebuilt, a pool started and the PNG written before the
+    next frame begins.
+    """
+    np.random.seed(0)
+    world = BVH(random_scene())
+    cam = path.camera(frame, image_width / image_height)
+    with RenderPool(world) as pool:
+        accumulator = pool.render(
+            cam, image_width, image_height, samples, max_depth,
+            memory_budget, seed=0
+        )
+    img = accumulator.snapshot()
+    img.gamma(2)
+    img.save(output.format(frame))
+
+
+def main() -> None:
+    image_width = 160
+    image_height = 90
+    samples = 4
+    max_depth = 5
+    memory_budget = 64 * 1024**2
+    frames = range(8)
+    rays = image_width * image_height * samples
+
+    print(
+        f"Backend: {backend.get_backend()}, random_scene(), {len(frames)} "
+        f"frames at {image_width}x{image_height}, {samples} spp, "
+        f"{os.cpu_count()} workers"
+    )
+    path = CameraPath.orbit(random_view(), len(frames))
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "frame_{:04d}.png")
+
+        start_time = time.perf_counter()
+        seconds = list()
+        for frame in frames:
+            frame_start = time.perf_counter()
+            frame_per_call(
+                path, frame, image_width, image_height, samples,
+                max_depth, memory_budget, output
+            )
+            seconds.append(time.perf_counter() - frame_start)
+        total = time.perf_counter() - start_time
+        print(
+            f"main() per frame: {round(float(np.mean(seconds)), 2)} s per frame, "
+            f"{round(rays * len(frames) / total / 1e3, 1)} k primary rays/s amortized"
+        )
+
+        start_time = time.perf_counter()
+        np.random.seed(0)
+        stats = render_animation(
+            random_scene(), path, frames, image_width, image_height,
+            samples, max_depth, memory_budget, output, 0,
+            start_time=start_time
+        )
+        seconds = [frame["seconds"] for frame in stats["frames"]]
+        print(
+            f"render_animation: {round(float(np.mean(seconds[1:])), 2)} s per "
+            f"frame after the first ({round(seconds[0], 2)} s), "
+            f"{round(stats['amortized_rays_per_second'] / 1e3, 1)} k primary "
+            f"rays/s amortized; {round(total / stats['total_seconds'], 1)}x "
+            f"faster overall"
+        )
+
+
+if __name__ == "__main__":
+    main()
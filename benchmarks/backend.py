@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from utils import backend
+from utils.render import scan_frame
+from main import random_scene, random_camera
+
+
+def available_backends():
+    names = []
+    for name in backend.BACKENDS:
+        try:
+            backend.set_backend(name)
+            if name == "cupy":
+                backend.xp.cuda.runtime.getDeviceCount()
+            names.append(name)
+        except Exception:
+            pass
+    return names
+
+
+def run(name, image_width, image_height, samples, max_depth):
+    backend.set_backend(name)
+    np.random.seed(0)
+    world = random_scene()
+    cam = random_camera(image_width / image_height)
+    # Warm-up pass: kernel compilation and allocator pools.
+    scan_frame(world, cam, image_width, image_height, max_depth)
+
+    start_time = time.perf_counter()
+    for _ in range(samples):
+        scan_frame(world, cam, image_width, image_height, max_depth)
+    elapsed = time.perf_counter() - start_time
+    return elapsed, image_width * image_height * samples / elapsed
+
+
+def main() -> None:
+    image_width = 160
+    image_height = 90
+    samples = 4
+    max_depth = 5
+
+    results = dict()
+    for name in available_backends():
+        elapsed, rays_per_sec = run(
+            name, image_width, image_height, samples, max_depth
+        )
+        results[name] = rays_per_sec
+        print(
+            f"{name:>6}: {round(elapsed, 2)} s, "
+            f"{round(rays_per_sec / 1e3, 1)} k primary rays/s"
+        )
+
+    if "cupy" in results and "numpy" in results:
+        print(f"GPU speedup: {round(results['cupy'] / results['numpy'], 1)}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import time
+from utils import backend
+from utils.backend import xp
+from utils.bvh import BVH
+from main import random_scene, procedural_scene, procedural_camera
+
+
+def primary_rays(n_spheres, length):
+    cam = procedural_camera(n_spheres, 16 / 9)
+    xp.random.seed(0)
+    return cam.get_ray(
+        xp.random.rand(length).astype(xp.float32),
+        xp.random.rand(length).astype(xp.float32)
+    )
+
+
+def time_hit(world, r, repeat = 3):
+    world.hit(r, 0.001, xp.inf)
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        world.hit(r, 0.001, xp.inf)
+    return (time.perf_counter() - start_time) / repeat
+
+
+def main() -> None:
+    rays = 1 << 16
+    list_limit = 2000
+
+    print(f"Backend: {backend.get_backend()}, {rays} rays per hit() call")
+    scenes = [("random_scene", random_scene())]
+    for n in (1000, 10000, 100000):
+        scenes.append((f"procedural_{n}", procedural_scene(n)))
+
+    for name, world in scenes:
+        n = len(world.objects)
+        r = primary_rays(n, rays)
+
+        start_time = time.perf_counter()
+        bvh = BVH(world)
+        build_time = time.perf_counter() - start_time
+
+        bvh_time = time_hit(bvh, r)
+        line = (
+            f"{name:>18}: {n:>6} spheres, build {round(build_time, 3)} s, "
+            f"BVH {round(rays / bvh_time / 1e6, 2)} M rays/s"
+        )
+        if n <= list_limit:
+            list_time = time_hit(world, r, 1)
+            line += (
+                f", list {round(rays / list_time / 1e6, 2)} M rays/s"
+                f" ({round(list_time / bvh_time, 1)}x)"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from utils import backend
+from utils.bvh import BVH
+from utils.render import render_samples
+from main import random_scene, random_camera
+
+
+def rmse(img, reference):
+    return float(np.sqrt(np.mean((img.frame - reference.frame) ** 2)))
+
+
+def main() -> None:
+    image_width = 96
+    image_height = 54
+    reference_samples = 256
+    max_depth = 5
+    memory_budget = 64 * 1024**2
+
+    np.random.seed(0)
+    world = BVH(random_scene())
+    cam = random_camera(image_width / image_height)
+    print(f"Backend: {backend.get_backend()}, {image_width}x{image_height}")
+
+    reference = render_samples(
+        world, cam, image_width, image_height, reference_samples,
+        max_depth, memory_budget, seed=1
+    ).snapshot().gamma(2)
+
+    for samples in (4, 8, 16, 48):
+        start_time = time.perf_counter()
+        accumulator = render_samples(
+            world, cam, image_width, image_height, samples,
+            max_depth, memory_budget, seed=0, features=True
+        )
+        render_time = time.perf_counter() - start_time
+        raw = accumulator.snapshot().gamma(2)
+
+        start_time = time.perf_counter()
+        denoised = accumulator.snapshot().denoise().gamma(2)
+        denoise_time = time.perf_counter() - start_time
+        print(
+            f"{samples:>3} spp: {round(render_time, 2)} s render, "
+            f"RMSE {round(rmse(raw, reference), 4)}; "
+            f"+{round(denoise_time, 2)} s denoise, "
+            f"RMSE {round(rmse(denoised, reference), 4)}"
+        )
+    print(f"Reference: {reference_samples} spp")
+
+
+if __name__ == "__main__":
+    main()
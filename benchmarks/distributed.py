@@ -0,0 +1,92 @@
+import os
+import time
+import asyncio
+import numpy as np
+from utils import backend
+from utils.backend import asnumpy
+from utils.render import render_samples
+from utils.scene_file import scene_camera
+from utils.distributed import Coordinator
+from distributed import start_local_workers
+from main import named_scene
+
+
+async def render_with(world, view, n_workers, settings, kill_after = None):
+    """Render time, result and statistics with `n_workers` local workers.
+
+    A tiny frame first warms every worker up. With `kill_after`, one worker
+    is killed once that many units are done.
+    """
+    coordinator = Coordinator(world)
+    host, port = await coordinator.start()
+    workers = start_local_workers(n_workers, host, port)
+    while len(coordinator.workers) < n_workers:
+        await asyncio.sleep(0.05)
+    await coordinator.render(view, 8, 8, n_workers, 5, 0, 8, 1)
+    coordinator.stats.clear()
+
+    start_time = time.perf_counter()
+    render = asyncio.create_task(coordinator.render(view, **settings))
+    if kill_after is not None:
+        while coordinator.stats["units"] < kill_after:
+            await asyncio.sleep(0.01)
+        workers[0].kill()
+    accumulator = await render
+    seconds = time.perf_counter() - start_time
+    await coordinator.close()
+    for worker in workers:
+        worker.join()
+    return seconds, asnumpy(accumulator.mean), coordinator.stats
+
+
+def main() -> None:
+    settings = dict(
+        image_width=320, image_height=180, samples=16, max_depth=5, seed=0,
+        tile_size=64, unit_samples=4
+    )
+    worker_counts = sorted({1, 2, 4, os.cpu_count()})
+
+    np.random.seed(0)
+    world, view = named_scene("random")
+    print(
+        f"Backend: {backend.get_backend()}, random_scene() at "
+        f"{settings['image_width']}x{settings['image_height']}, "
+        f"{settings['samples']} spp, {settings['tile_size']}px tiles x "
+        f"{settings['unit_samples']} samples per unit, {os.cpu_count()} cores"
+    )
+
+    start_time = time.perf_counter()
+    local = render_samples(
+        world, scene_camera(view, 16 / 9), settings["image_width"],
+        settings["image_height"], settings["samples"], settings["max_depth"],
+        256 * 1024**2, settings["seed"]
+    )
+    local_time = time.perf_counter() - start_time
+    print(f"in-process render_samples: {round(local_time, 2)} s")
+
+    reference = None
+    base_time = None
+    for n in worker_counts:
+        seconds, mean, stats = asyncio.run(render_with(world, view, n, settings))
+        if reference is None:
+            reference, base_time = mean, seconds
+        print(
+            f"{n:>3} workers: {round(seconds, 2)} s, "
+            f"{round(base_time / seconds, 2)}x vs 1 worker; {stats['units']} "
+            f"units, {stats['stolen']} stolen; same image as 1 worker: "
+            f"{np.array_equal(mean, reference)}, max difference from "
+            f"in-process {float(np.abs(mean - asnumpy(local.mean)).max()):.1e}"
+        )
+
+    seconds, mean, stats = asyncio.run(
+        render_with(world, view, 2, settings, kill_after=5)
+    )
+    print(
+        f"  2 workers, one killed after 5 units: {round(seconds, 2)} s, "
+        f"{stats['reissued']} re-issued, {stats['stolen']} stolen; same image: "
+        f"{np.array_equal(mean, reference)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import time
+import numpy as np
+from utils import backend, kernels
+from utils.bvh import BVH
+from utils.render import render_samples
+from main import random_scene, random_camera
+
+
+def render_time(world, cam, image_width, image_height, samples, max_depth):
+    start_time = time.perf_counter()
+    accumulator = render_samples(
+        world, cam, image_width, image_height, samples,
+        max_depth, 64 * 1024**2, 0
+    )
+    return time.perf_counter() - start_time, accumulator
+
+
+def main() -> None:
+    image_width = 160
+    image_height = 90
+    samples = 4
+    max_depth = 5
+
+    backend.set_backend("numpy")
+    if kernels.numba is None:
+        print("Numba is not installed: only the array path is available.")
+        return
+
+    np.random.seed(0)
+    world = BVH(random_scene())
+    cam = random_camera(image_width / image_height)
+    print(
+        f"random_scene(), {image_width}x{image_height}, {samples} spp, "
+        f"{kernels.numba.get_num_threads()} threads"
+    )
+
+    results = dict()
+    for name, jit in (("array", False), ("jit", True)):
+        kernels.set_enabled(jit)
+        # Warm-up; for the JIT this is the (cached) compilation.
+        warm_up, _ = render_time(world, cam, 16, 9, 1, max_depth)
+        elapsed, accumulator = render_time(
+            world, cam, image_width, image_height, samples, max_depth
+        )
+        results[name] = elapsed, accumulator.mean
+        print(
+            f"{name:>6}: {round(elapsed, 2)} s, "
+            f"{round(image_width * image_height * samples / elapsed / 1e3, 1)} "
+            f"k primary rays/s (warm-up {round(warm_up, 2)} s)"
+        )
+
+    rmse = np.sqrt(np.mean((results["jit"][1] - results["array"][1]) ** 2))
+    print(
+        f"JIT speedup: {round(results['array'][0] / results['jit'][0], 1)}x, "
+        f"RMSE between the two: {rmse:.2e}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import time
+import tempfile
+import numpy as np
+from utils import backend
+from utils.backend import xp
+from utils.vec3 import Point3, Vec3, Color
+from utils.camera import Camera
+from utils.material import Lambertian
+from utils.triangle_mesh import TriangleMesh
+from utils.obj_file import read_obj_arrays, write_obj
+from benchmarks.bvh import time_hit
+
+
+def terrain(side):
+    """A wavy `side` x `side` height field, 2 (side - 1)**2 triangles."""
+    x, z = np.meshgrid(np.linspace(-10, 10, side), np.linspace(-10, 10, side))
+    y = 0.5 * np.sin(x) * np.cos(z) + 0.1 * np.sin(5 * x + 3 * z)
+    vertices = np.stack([x, y, z], axis=-1).reshape(-1, 3).astype(np.float32)
+    corner = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)).ravel()
+    faces = np.concatenate([
+        np.stack([corner, corner + side, corner + 1], axis=1),
+        np.stack([corner + 1, corner + side, corner + side + 1], axis=1),
+    ])
+    return vertices, faces
+
+
+def read_lines(path):
+    """Reference loader: one Python list per vertex and face line."""
+    vertices = list()
+    faces = list()
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields and fields[0] == "v":
+                vertices.append([float(a) for a in fields[1:4]])
+            elif fields and fields[0] == "f":
+                faces.append([int(a.split("/")[0]) - 1 for a in fields[1:]])
+    return np.array(vertices, dtype=np.float32), np.array(faces, dtype=np.int32)
+
+
+def rays(length):
+    cam = Camera(
+        Point3(12, 6, 12), Point3(0, 0, 0), Vec3(0, 1, 0), 50, 16 / 9, 0, 10
+    )
+    xp.random.seed(0)
+    return cam.get_ray(
+        xp.random.rand(length).astype(xp.float32),
+        xp.random.rand(length).astype(xp.float32)
+    )
+
+
+def main() -> None:
+    n_rays = 1 << 16
+    reference_limit = 300000
+    brute_force_limit = 2000
+    brute_force_rays = 1 << 12
+    material = Lambertian(Color(0.5, 0.5, 0.5), 1)
+
+    print(f"Backend: {backend.get_backend()}, {n_rays} rays per hit() call")
+    r = rays(n_rays)
+    with tempfile.TemporaryDirectory() as directory:
+        for side in (24, 101, 317, 819):
+            vertices, faces = terrain(side)
+            path = os.path.join(directory, f"terrain_{side}.obj")
+            write_obj(path, vertices, faces)
+            size = os.path.getsize(path)
+
+            start_time = time.perf_counter()
+            read_obj_arrays(path)
+            load_time = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            mesh = TriangleMesh(vertices, faces, material)
+            build_time = time.perf_counter() - start_time
+            hit_time = time_hit(mesh, r)
+
+            line = (
+                f"{len(faces):>8} triangles ({round(size / 1024**2, 1)} MiB OBJ): "
+                f"load {round(load_time, 3)} s ({round(size / load_time / 1024**2)} "
+                f"MiB/s), build {round(build_time, 2)} s, "
+                f"hit {round(n_rays / hit_time / 1e6, 2)} M rays/s"
+            )
+            if len(faces) <= reference_limit:
+                start_time = time.perf_counter()
+                read_lines(path)
+                line += (
+                    f"; line-by-line load {round(time.perf_counter() - start_time, 3)} s"
+                )
+            if len(faces) <= brute_force_limit:
+                # Every (ray, triangle) pair at once, on fewer rays to bound memory.
+                o = r.origin().e[:brute_force_rays, None]
+                d = r.direction().e[:brute_force_rays, None]
+                candidate = xp.arange(len(mesh))[None]
+                start_time = time.perf_counter()
+                mesh.intersect(o, d, candidate, 0.001, xp.inf).min(axis=1)
+                brute_force_time = time.perf_counter() - start_time
+                line += (
+                    f", all pairs {round(brute_force_rays / brute_force_time / 1e3, 1)}"
+                    f" k rays/s"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
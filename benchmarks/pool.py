@@ -0,0 +1,56 @@
+import os
+import time
+import numpy as np
+from utils import backend
+from utils.bvh import BVH
+from utils.render_pool import RenderPool
+from main import random_scene, random_camera
+
+
+def worker_counts(n):
+    counts = list()
+    k = 1
+    while k < n:
+        counts.append(k)
+        k *= 2
+    return counts + [n]
+
+
+def main() -> None:
+    image_width = 160
+    image_height = 90
+    samples = 8
+    max_depth = 5
+    memory_budget = 16 * 1024**2
+
+    np.random.seed(0)
+    world = BVH(random_scene())
+    cam = random_camera(image_width / image_height)
+
+    print(
+        f"Backend: {backend.get_backend()}, {image_width}x{image_height}, "
+        f"{samples} spp, {os.cpu_count()} cores"
+    )
+    base_time = None
+    for n_workers in worker_counts(os.cpu_count()):
+        with RenderPool(world, n_workers) as pool:
+            # Warm-up: worker start and scene attach are not part of a frame.
+            pool.render(cam, image_width, image_height, 1, max_depth, memory_budget)
+            start_time = time.perf_counter()
+            pool.render(
+                cam, image_width, image_height, samples, max_depth, memory_budget
+            )
+            elapsed = time.perf_counter() - start_time
+
+        if base_time is None:
+            base_time = elapsed
+        speedup = base_time / elapsed
+        print(
+            f"{n_workers:>3} workers: {round(elapsed, 2)} s, "
+            f"speedup {round(speedup, 2)}x, "
+            f"efficiency {round(100 * speedup / n_workers)}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
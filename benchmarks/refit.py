@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from utils import backend
+from utils.bvh import BVH
+from utils.material import MaterialTable
+from main import procedural_spheres
+from benchmarks.bvh import primary_rays, time_hit
+
+
+def main() -> None:
+    frames = 12
+    rays = 1 << 15
+    # Scene units per frame; the spheres are 0.4 across.
+    speed = 0.1
+
+    print(
+        f"Backend: {backend.get_backend()}, {frames} frames of spheres moving "
+        f"{speed} per frame, {rays} rays per hit() call"
+    )
+    for n in (10000, 30000, 100000):
+        centers, radii, mat_ids, materials = procedural_spheres(n)
+        table = MaterialTable(materials)
+        r = primary_rays(n, rays)
+        velocity = np.random.RandomState(1).normal(size=(n, 3)).astype(np.float32)
+        velocity[:, 1] = 0
+        velocity *= speed / np.linalg.norm(velocity, axis=1, keepdims=True)
+        velocity[0] = 0
+
+        world = BVH.from_spheres(centers, radii, mat_ids, table)
+        update_seconds = list()
+        build_seconds = list()
+        rebuilds = 0
+        for _ in range(frames):
+            centers = centers + velocity
+            start_time = time.perf_counter()
+            rebuilds += world.update_spheres(centers)
+            update_seconds.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            fresh = BVH.from_spheres(centers, radii, mat_ids, table)
+            build_seconds.append(time.perf_counter() - start_time)
+
+        inflation = world.inflation()
+        refit_time = time_hit(world, r)
+        fresh_time = time_hit(fresh, r)
+        update = float(np.mean(update_seconds))
+        build = float(np.mean(build_seconds))
+        print(
+            f"{n:>7} spheres: update {round(1e3 * update, 1)} ms, rebuild "
+            f"{round(1e3 * build, 1)} ms per frame ({round(build / update, 1)}x); "
+            f"{rebuilds} rebuilds, inflation {round(inflation, 2)} after "
+            f"{frames} frames; hit {round(rays / refit_time / 1e6, 2)} M rays/s "
+            f"refit vs {round(rays / fresh_time / 1e6, 2)} M rays/s rebuilt"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import subprocess
+import numpy as np
+from utils.render_service import submit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run_job(address, job, latencies, render_seconds):
+    start_time = time.perf_counter()
+    async for event in submit(address, job):
+        if event["event"] == "done":
+            render_seconds.append(event["seconds"])
+    latencies.append(time.perf_counter() - start_time)
+
+
+async def load(address, job, n_jobs, concurrency):
+    """Jobs per second with `concurrency` clients submitting `n_jobs` in all."""
+    latencies = list()
+    render_seconds = list()
+    remaining = iter(range(n_jobs))
+
+    async def client():
+        for _ in remaining:
+            await run_job(address, job, latencies, render_seconds)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    return n_jobs / elapsed, latencies, render_seconds
+
+
+def fresh_process(job, n_workers, output):
+    """Wall time of the same render as a new `progressive.py` process."""
+    start_time = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable, "progressive.py", "--scene", job["scene"],
+            "--width", str(job["width"]), "--height", str(job["height"]),
+            "--max-samples", str(job["samples"]), "--budget", "1e9",
+            "--workers", str(n_workers), "--output", output,
+        ],
+        cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start_time
+
+
+def main() -> None:
+    n_workers = os.cpu_count()
+    job = dict(scene="random", width=96, height=54, samples=4)
+    n_jobs = 32
+    fresh_runs = 3
+
+    print(
+        f"{job['scene']} at {job['width']}x{job['height']}, {job['samples']} spp, "
+        f"PNG sent back; {n_workers} workers"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        address = os.path.join(directory, "render.sock")
+        start_time = time.perf_counter()
+        daemon = subprocess.Popen(
+            [
+                sys.executable, "render_daemon.py", "--unix", address,
+                "--workers", str(n_workers),
+            ],
+            cwd=ROOT, stdout=subprocess.PIPE, text=True
+        )
+        try:
+            daemon.stdout.readline()
+            print(f"daemon ready in {round(time.perf_counter() - start_time, 2)} s")
+            for concurrency in (1, 4, 16):
+                jobs_per_second, latencies, render_seconds = asyncio.run(
+                    load(address, job, n_jobs, concurrency)
+                )
+                print(
+                    f"{concurrency:>3} clients: {round(jobs_per_second, 1)} jobs/s, "
+                    f"latency median {round(1e3 * np.median(latencies))} ms, "
+                    f"p95 {round(1e3 * np.percentile(latencies, 95))} ms, "
+                    f"render {round(1e3 * np.mean(render_seconds))} ms per job"
+                )
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+        output = os.path.join(directory, "fresh.png")
+        seconds = [
+            fresh_process(job, n_workers, output) for _ in range(fresh_runs)
+        ]
+        print(
+            f"fresh process per job: {round(1 / np.mean(seconds), 2)} jobs/s, "
+            f"{round(1e3 * np.mean(seconds))} ms per job"
+        )
+
+
+if __name__ == "__main__":
+    main()
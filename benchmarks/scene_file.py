@@ -0,0 +1,84 @@
+import os
+import time
+import tempfile
+import multiprocessing
+from utils import backend
+from utils.bvh import BVH
+from utils.material import MaterialTable
+from utils.render import render_samples
+from utils.scene_file import write_scene, read_scene, scene_camera
+from main import procedural_spheres, procedural_scene, procedural_view
+
+
+def resident():
+    # Current resident set size (Linux); mapped file pages count once read.
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def load_objects(n_spheres):
+    return BVH(procedural_scene(n_spheres))
+
+
+def load_file(path):
+    return read_scene(path)[0]
+
+
+def measure(load, arg, view):
+    """Load time and resident memory growth, in a fresh process."""
+    rss = resident()
+    start_time = time.perf_counter()
+    world = load(arg)
+    elapsed = time.perf_counter() - start_time
+    loaded = resident() - rss
+
+    # One small frame touches the pages the renderer actually reads.
+    render_samples(world, scene_camera(view, 16 / 9), 64, 36, 1, 3, 1 << 24, 0)
+    return elapsed, loaded, resident() - rss
+
+
+def run_isolated(load, arg, view):
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(measure, (load, arg, view))
+
+
+def main() -> None:
+    object_limit = 100000
+
+    print(f"Backend: {backend.get_backend()}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n in (10000, 100000, 1000000):
+            path = os.path.join(directory, f"procedural_{n}.scene")
+            view = procedural_view(n)
+            start_time = time.perf_counter()
+            centers, radii, mat_ids, materials = procedural_spheres(n)
+            world = BVH.from_spheres(
+                centers, radii, mat_ids, MaterialTable(materials)
+            )
+            write_scene(path, world, view)
+            write_time = time.perf_counter() - start_time
+            del world
+
+            load_time, load_rss, render_rss = run_isolated(load_file, path, view)
+            line = (
+                f"{n:>8} spheres: build+write {round(write_time, 2)} s, "
+                f"{round(os.path.getsize(path) / 1024**2, 1)} MiB file; "
+                f"mmap load {round(1e3 * load_time, 2)} ms, "
+                f"+{round(load_rss / 1024**2, 1)} MiB resident "
+                f"(+{round(render_rss / 1024**2, 1)} MiB after a frame)"
+            )
+            if n <= object_limit:
+                load_time, load_rss, render_rss = run_isolated(
+                    load_objects, n, view
+                )
+                line += (
+                    f"; objects {round(load_time, 2)} s, "
+                    f"+{round(load_rss / 1024**2, 1)} MiB "
+                    f"(+{round(render_rss / 1024**2, 1)} MiB)"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import time
+import numpy as np
+from utils import backend
+from main import random_scene, procedural_scene, three_ball_scene, random_camera
+
+
+def best_time(fn, *args, repeat = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main() -> None:
+    print(f"Backend: {backend.get_backend()}")
+    np.random.seed(0)
+    cases = [
+        ("random_camera", random_camera, (16 / 9,)),
+        ("three_ball_scene", three_ball_scene, ()),
+        ("random_scene", random_scene, ()),
+        ("procedural_scene(10000)", procedural_scene, (10000,)),
+    ]
+    for name, fn, args in cases:
+        elapsed = best_time(fn, *args)
+        print(f"{name:>24}: {round(1e3 * elapsed, 3)} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import time
+import numpy as np
+from utils import backend
+from utils.backend import xp
+from utils.sphere_set import SphereSet
+from main import random_scene, random_camera
+
+
+def main() -> None:
+    rays = 1 << 16
+    repeat = 3
+
+    np.random.seed(0)
+    xp.random.seed(0)
+    world = random_scene()
+    cam = random_camera(16 / 9)
+    r = cam.get_ray(
+        xp.random.rand(rays).astype(xp.float32),
+        xp.random.rand(rays).astype(xp.float32)
+    )
+
+    print(
+        f"Backend: {backend.get_backend()}, random_scene() with "
+        f"{len(world.objects)} spheres, {rays} rays"
+    )
+    results = dict()
+    for name, hittable in (
+        ("HittableList", world),
+        ("SphereSet", SphereSet.from_list(world)),
+    ):
+        hittable.hit(r, 0.001, xp.inf)
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            hittable.hit(r, 0.001, xp.inf)
+        elapsed = (time.perf_counter() - start_time) / repeat
+        results[name] = elapsed
+        print(f"{name:>12}: {round(rays / elapsed / 1e6, 3)} M rays/s")
+
+    print(
+        f"SphereSet speedup: "
+        f"{round(results['HittableList'] / results['SphereSet'], 2)}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
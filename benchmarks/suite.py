@@ -0,0 +1,329 @@
+"""Standard benchmark scenes with JSON results and a regression gate.
+
+    python -m benchmarks.suite --preset quick
+    python -m benchmarks.suite --preset quick --save-baseline
+
+    python -m benchmarks.suite --preset full --output before.json
+    python -m benchmarks.suite --preset full --throughput-baseline before.json
+
+Every case is a (scene, resolution, spp, max_depth) point of the preset's
+sweep, rendered in-process with a fixed seed, so its image is the same
+bits on every run and any change of its RMSE against the reference image
+means the output changed. The process exits with status 1 when a case's
+RMSE rises, or when there is no baseline or reference image to compare
+with.
+
+Baselines hold only the RMSE of each case and live in
+benchmarks/baseline/ with their reference images; they are only written
+by --save-baseline. Throughput depends on the machine, so it is only
+reported, unless --throughput-baseline names an earlier results file
+from the same machine: then a drop of more than --throughput-tolerance
+is a regression too.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+from utils import backend
+from utils.backend import xp, asnumpy
+from utils.bvh import BVH
+from utils.render import render_samples
+from main import (
+    three_ball_scene, random_scene, procedural_scene,
+    three_ball_camera, random_camera, procedural_camera
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baseline")
+
+
+def seeded(build):
+    def scene():
+        # random_scene() draws from the global generator.
+        np.random.seed(0)
+        return build()
+    return scene
+
+
+SCENES = {
+    "three_ball": (seeded(three_ball_scene), three_ball_camera),
+    "random": (seeded(random_scene), random_camera),
+}
+for n in (1000, 10000, 100000):
+    SCENES[f"procedural_{n // 1000}k"] = (
+        lambda n=n: procedural_scene(n),
+        lambda aspect_ratio, n=n: procedural_camera(n, aspect_ratio)
+    )
+
+PRESETS = {
+    "quick": dict(
+        scenes=("three_ball", "random", "procedural_1k"),
+        resolutions=((96, 54),), samples=(1, 4), max_depths=(5,),
+        reference_samples=16, repeats=3,
+    ),
+    "full": dict(
+        scenes=tuple(SCENES),
+        resolutions=((96, 54), (192, 108)), samples=(1, 8),
+        max_depths=(1, 5, 10), reference_samples=64, repeats=2,
+    ),
+}
+
+
+class CountingWorld:
+    """Forwards to a world and counts the rays of every `hit` call.
+
+    `ray_color_loop` fetches the material table once and then calls `hit`
+    once per bounce, which is what the bounce index is derived from.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.bounce_rays = list()
+        self.bounces = 0
+        self.bounce = 0
+
+    def get_material_table(self):
+        self.bounce = 0
+        return self.world.get_material_table()
+
+    def hit(self, r, t_min, t_max):
+        if self.bounce == len(self.bounce_rays):
+            self.bounce_rays.append(0)
+        self.bounce_rays[self.bounce] += len(r)
+        self.bounce += 1
+        self.bounces += 1
+        return self.world.hit(r, t_min, t_max)
+
+
+def synchronize():
+    if backend.is_gpu():
+        xp.cuda.Device().synchronize()
+
+
+def case_key(scene, image_width, image_height, samples, max_depth):
+    return f"{scene}/{image_width}x{image_height}/{samples}spp/depth{max_depth}"
+
+
+def reference_image(path, world, cam, image_width, image_height, max_depth, samples, memory_budget, seed, save):
+    """The reference image at `path`; rendered and written only if `save`."""
+    if not save:
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No reference image {path}; record the baseline with "
+                f"--save-baseline"
+            )
+        return np.load(path)
+    image = asnumpy(render_samples(
+        world, cam, image_width, image_height, samples,
+        max_depth, memory_budget, seed
+    ).mean)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, image)
+    return image
+
+
+def run_case(world, cam, image_width, image_height, samples, max_depth, memory_budget, seed, repeats):
+    # Best of `repeats`: seeded renders trace the same rays every time.
+    elapsed = float("inf")
+    for _ in range(repeats):
+        counting = CountingWorld(world)
+        synchronize()
+        start_time = time.perf_counter()
+        accumulator = render_samples(
+            counting, cam, image_width, image_height, samples,
+            max_depth, memory_budget, seed
+        )
+        synchronize()
+        elapsed = min(elapsed, time.perf_counter() - start_time)
+
+    # Peak memory of one sample pass; tiles are reused across samples, so
+    # it does not grow with spp. tracemalloc sees NumPy buffers only.
+    tracemalloc.start()
+    render_samples(
+        world, cam, image_width, image_height, 1,
+        max_depth, memory_budget, seed
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    primary_rays = image_width * image_height * samples
+    total_rays = sum(counting.bounce_rays)
+    return dict(
+        seconds=elapsed,
+        primary_rays=primary_rays,
+        total_rays=total_rays,
+        primary_rays_per_sec=primary_rays / elapsed,
+        total_rays_per_sec=total_rays / elapsed,
+        bounce_rays=counting.bounce_rays,
+        seconds_per_bounce=elapsed / max(counting.bounces, 1),
+        peak_host_bytes=peak if not backend.is_gpu() else None,
+    ), asnumpy(accumulator.mean)
+
+
+def run_suite(preset, memory_budget, seed, reference_dir, save_references = False):
+    results = dict()
+    for scene in preset["scenes"]:
+        build, camera = SCENES[scene]
+        start_time = time.perf_counter()
+        world = BVH(build())
+        build_time = time.perf_counter() - start_time
+        print(f"{scene}: {len(world)} spheres, setup {round(build_time, 2)} s")
+
+        for image_width, image_height in preset["resolutions"]:
+            cam = camera(image_width / image_height)
+            # Warm-up: allocator pools and, on CuPy, kernel compilation.
+            render_samples(world, cam, 16, 9, 1, 2, memory_budget, seed)
+            for max_depth in preset["max_depths"]:
+                reference = reference_image(
+                    os.path.join(reference_dir, case_key(
+                        scene, image_width, image_height,
+                        preset["reference_samples"], max_depth
+                    ).replace("/", "_") + ".npy"),
+                    world, cam, image_width, image_height, max_depth,
+                    preset["reference_samples"], memory_budget, seed + 1,
+                    save_references
+                )
+                for samples in preset["samples"]:
+                    key = case_key(
+                        scene, image_width, image_height, samples, max_depth
+                    )
+                    result, image = run_case(
+                        world, cam, image_width, image_height, samples,
+                        max_depth, memory_budget, seed, preset["repeats"]
+                    )
+                    result["rmse"] = float(np.sqrt(np.mean((image - reference) ** 2)))
+                    results[key] = result
+                    print(
+                        f"  {key}: "
+                        f"{round(result['primary_rays_per_sec'] / 1e3, 1)} k primary rays/s, "
+                        f"{round(result['total_rays_per_sec'] / 1e3, 1)} k total rays/s, "
+                        f"{round(1e3 * result['seconds_per_bounce'], 1)} ms/bounce, "
+                        f"RMSE {round(result['rmse'], 4)}"
+                        + (
+                            f", peak {round(result['peak_host_bytes'] / 1024**2, 1)} MiB"
+                            if result["peak_host_bytes"] is not None else ""
+                        )
+                    )
+    return results
+
+
+def compare(results, baseline, rmse_tolerance):
+    """RMSE regression messages; a case missing from `baseline` is one too."""
+    regressions = list()
+    for key, result in results.items():
+        if key not in baseline:
+            regressions.append(f"{key}: not in the baseline")
+            continue
+        base = baseline[key]
+        if result["rmse"] > base["rmse"] * (1 + rmse_tolerance) + 1e-6:
+            regressions.append(
+                f"{key}: RMSE {round(result['rmse'], 5)} vs "
+                f"{round(base['rmse'], 5)}"
+            )
+    return regressions
+
+
+def compare_throughput(results, earlier, tolerance):
+    """Print each case's throughput change; regression messages for drops
+    of more than `tolerance`."""
+    regressions = list()
+    for key, result in results.items():
+        if key not in earlier:
+            continue
+        ratio = result["total_rays_per_sec"] / earlier[key]["total_rays_per_sec"]
+        message = (
+            f"{key}: throughput {round(100 * (ratio - 1), 1):+}% "
+            f"({round(result['total_rays_per_sec'] / 1e3, 1)} k vs "
+            f"{round(earlier[key]['total_rays_per_sec'] / 1e3, 1)} k rays/s)"
+        )
+        print(f"  {message}")
+        if ratio < 1 - tolerance:
+            regressions.append(message)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=tuple(PRESETS), default="quick")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument(
+        "--baseline", help="baseline JSON (default: baseline/<preset>.json)"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="write the RMSE of every case to --baseline instead of comparing"
+    )
+    parser.add_argument(
+        "--throughput-baseline",
+        help="results JSON of an earlier run on this machine to gate "
+             "throughput against (default: report throughput only)"
+    )
+    parser.add_argument("--throughput-tolerance", type=float, default=0.15)
+    parser.add_argument("--rmse-tolerance", type=float, default=0.01)
+    parser.add_argument("--memory-budget", type=int, default=64 * 1024**2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.baseline is None:
+        args.baseline = os.path.join(BASELINE_DIR, f"{args.preset}.json")
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        sys.exit(
+            f"No baseline at {args.baseline}; record one with --save-baseline"
+        )
+    throughput_baseline = args.throughput_baseline
+    if throughput_baseline is not None and not os.path.exists(throughput_baseline):
+        sys.exit(f"No results at {throughput_baseline}")
+
+    print(f"Backend: {backend.get_backend()}, preset {args.preset}")
+    reference_dir = os.path.join(
+        os.path.dirname(os.path.abspath(args.baseline)), "reference"
+    )
+    try:
+        results = run_suite(
+            PRESETS[args.preset], args.memory_budget, args.seed,
+            reference_dir, args.save_baseline
+        )
+    except FileNotFoundError as error:
+        sys.exit(str(error))
+    report = dict(
+        backend=backend.get_backend(), preset=args.preset,
+        seed=args.seed, memory_budget=args.memory_budget, cases=results
+    )
+
+    if args.save_baseline:
+        # Only the machine-independent part: the RMSE of every case.
+        path = args.baseline
+        report["cases"] = {
+            key: dict(rmse=result["rmse"]) for key, result in results.items()
+        }
+    else:
+        path = args.output
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {path}")
+    if args.save_baseline:
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["backend"] != report["backend"]:
+        print(f"Warning: baseline was recorded on {baseline['backend']}")
+    regressions = compare(results, baseline["cases"], args.rmse_tolerance)
+    if throughput_baseline is not None:
+        with open(throughput_baseline) as f:
+            earlier = json.load(f)
+        regressions += compare_throughput(
+            results, earlier["cases"], args.throughput_tolerance
+        )
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
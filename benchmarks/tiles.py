@@ -0,0 +1,48 @@
+import time
+import tracemalloc
+import numpy as np
+from utils import backend
+from utils.bvh import BVH
+from utils.render import scan_frame, render_samples
+from main import random_scene, random_camera
+
+
+def peak_memory(fn, *args):
+    # tracemalloc sees NumPy buffers only, so this measures the CPU backend.
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main() -> None:
+    max_depth = 3
+    memory_budget = 8 * 1024**2
+
+    backend.set_backend("numpy")
+    np.random.seed(0)
+    world = BVH(random_scene())
+    cam = random_camera(16 / 9)
+
+    print(f"Tile memory budget: {memory_budget // 1024**2} MiB")
+    for image_width in (96, 192, 384):
+        image_height = image_width * 9 // 16
+        full, full_time = peak_memory(
+            scan_frame, world, cam, image_width, image_height, max_depth
+        )
+        tiled, tiled_time = peak_memory(
+            render_samples, world, cam, image_width, image_height,
+            1, max_depth, memory_budget
+        )
+        print(
+            f"{image_width}x{image_height}: "
+            f"full frame {round(full / 1024**2, 1)} MiB ({round(full_time, 1)} s), "
+            f"tiled {round(tiled / 1024**2, 1)} MiB ({round(tiled_time, 1)} s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Render one frame on TCP workers, on this machine or others.
+
+    python distributed.py coordinator --scene random --local-workers 4
+    python distributed.py coordinator --listen 0.0.0.0:9100 &
+    python distributed.py worker --connect coordinator-host:9100
+
+The coordinator splits the frame into (tile, sample range) units; workers
+steal from each other when idle, and units of workers that die are
+re-issued, up to --max-attempts times per unit. There is no
+authentication: use a trusted network.
+"""
+import sys
+import argparse
+import asyncio
+import multiprocessing
+import time
+import numpy as np
+from utils import backend
+from utils.distributed import Coordinator, run_worker
+from main import named_scene
+
+
+def address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def start_local_workers(n_workers, host, port, threads = 1):
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=run_worker, args=(host, port, threads), daemon=True)
+        for _ in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+async def coordinate(args, start_time):
+    np.random.seed(args.seed)
+    world, view = named_scene(args.scene, args.spheres)
+    coordinator = Coordinator(world, args.unit_timeout, args.max_attempts)
+    host, port = await coordinator.start(*args.listen)
+    print(f"Listening on {host}:{port}.", flush=True)
+    workers = start_local_workers(args.local_workers, host, port)
+    while len(coordinator.workers) < max(args.min_workers, 1):
+        await asyncio.sleep(0.05)
+
+    render_start = time.perf_counter()
+    try:
+        accumulator = await coordinator.render(
+            view, args.width, args.height, args.samples, args.max_depth,
+            args.seed, args.tile_size, args.unit_samples, args.denoise
+        )
+    except RuntimeError as error:
+        sys.exit(f"Render failed: {error}")
+    finally:
+        await coordinator.close()
+        for worker in workers:
+            worker.join()
+    render_time = time.perf_counter() - render_start
+
+    img = accumulator.snapshot()
+    if args.denoise:
+        img.denoise()
+    img.gamma(2)
+    img.save(args.output)
+    stats = coordinator.stats
+    print(
+        f"Rendered in {round(render_time, 2)} s ({round(time.perf_counter() - start_time, 1)} s "
+        f"total): {stats['units']} units, {stats['stolen']} stolen, "
+        f"{stats['reissued']} re-issued."
+    )
+
+
+def main() -> None:
+    start_time = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=backend.BACKENDS, default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator")
+    coordinator.add_argument(
+        "--scene", default="random",
+        help="three_ball, random, procedural or the path of a scene file"
+    )
+    coordinator.add_argument("--spheres", type=int, default=10000)
+    coordinator.add_argument("--width", type=int, default=720)
+    coordinator.add_argument("--height", type=int, default=405)
+    coordinator.add_argument("--samples", type=int, default=16)
+    coordinator.add_argument("--max-depth", type=int, default=5)
+    coordinator.add_argument("--seed", type=int, default=0)
+    coordinator.add_argument("--tile-size", type=int, default=64)
+    coordinator.add_argument(
+        "--unit-samples", type=int, default=4,
+        help="samples of a tile per work unit"
+    )
+    coordinator.add_argument("--unit-timeout", type=float, default=60)
+    coordinator.add_argument(
+        "--max-attempts", type=int, default=3,
+        help="workers a unit may be lost or stall on before the render fails"
+    )
+    coordinator.add_argument(
+        "--listen", type=address, default=("127.0.0.1", 0),
+        help="host:port to accept workers on (default a free local port)"
+    )
+    coordinator.add_argument(
+        "--local-workers", type=int, default=0,
+        help="worker processes to start on this machine"
+    )
+    coordinator.add_argument(
+        "--min-workers", type=int, default=1,
+        help="connected workers to wait for before rendering"
+    )
+    coordinator.add_argument("--output", default="./output.png")
+    coordinator.add_argument("--denoise", action="store_true")
+
+    worker = commands.add_parser("worker")
+    worker.add_argument("--connect", type=address, required=True)
+    worker.add_argument(
+        "--threads", type=int, default=None,
+        help="JIT kernel threads (default all cores)"
+    )
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        backend.set_backend(args.backend)
+    if args.command == "worker":
+        run_worker(*args.connect, args.threads)
+    else:
+        asyncio.run(coordinate(args, start_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,17 @@
-import cupy as cp
-import multiprocessing
+import os
 import time
-from joblib import Parallel, delayed
-from utils.vec3 import Vec3, Point3, Color, Vec3List
-from utils.image import Img
-from utils.ray import Ray, RayList
+import numpy as np
+from utils.backend import get_backend
+from utils.vec3 import Vec3, Point3, Color
 from utils.sphere import Sphere
-from utils.hittable import Hittable, HitRecord, HitRecordList
 from utils.hittable_list import HittableList
-from utils.utils import random_float, random_float_list
-from utils.camera import Camera
-from utils.material import Material, Lambertian, Metal, Dielectric
+from utils.bvh import BVH
+from utils.utils import random_float
+from utils.render_pool import RenderPool
+from utils.scene_file import scene_camera, read_scene
+from utils.checkpoint import save_checkpoint, load_checkpoint
+from utils import profiler
+from utils.material import Lambertian, Metal, Dielectric
 
 def three_ball_scene():
     world = HittableList()
@@ -76,134 +77,94 @@ def random_scene():
     return world
 
 
-def compress(r, rec):
-    condition = rec.t > 0
-    full_rate = condition.sum() / len(r)
-    if full_rate > 0.5:
-        return r, rec, None
+def procedural_spheres(n_spheres, seed = 0):
+    """Host arrays of `procedural_scene`, for scenes too large for objects."""
+    rs = np.random.RandomState(seed)
+    materials = [
+        Lambertian(Color(0.5, 0.5, 0.5), 1),
+        Lambertian(Color(0.4, 0.2, 0.1), 2),
+        Metal(Color(0.7, 0.6, 0.5), 0.1, 3),
+        Dielectric(1.5, 4),
+    ]
+
+    side = 1.2 * np.sqrt(n_spheres)
+    xz = rs.uniform(-side / 2, side / 2, (n_spheres - 1, 2))
+    choose_mat = rs.randint(len(materials) - 1, size=n_spheres - 1)
+
+    centers = np.full((n_spheres, 3), 0.2, dtype=np.float32)
+    centers[0] = (0, -1000, 0)
+    centers[1:, 0] = xz[:, 0]
+    centers[1:, 2] = xz[:, 1]
+    radii = np.full(n_spheres, 0.2, dtype=np.float32)
+    radii[0] = 1000
+    mat_ids = np.concatenate([[1], choose_mat + 2]).astype(np.int32)
+    return centers, radii, mat_ids, {mat.idx: mat for mat in materials}
+
+
+def procedural_scene(n_spheres, seed = 0):
+    centers, radii, mat_ids, materials = procedural_spheres(n_spheres, seed)
+    world = HittableList()
+    for center, radius, mat_id in zip(centers, radii, mat_ids):
+        world.add(Sphere(
+            Point3(*center.tolist()), float(radius), materials[int(mat_id)]
+        ))
+    return world
+
 
-    idx = cp.where(condition)[0]
-    new_r = RayList(
-        Vec3List(r.origin().get_ndarray(idx)), Vec3List(r.direction().get_ndarray(idx))
+# Camera arguments of each scene, less the aspect ratio (see scene_camera).
+def three_ball_view():
+    return dict(
+        lookfrom=(-2, 2, 1), lookat=(0, 0, -1), vup=(0, 1, 0),
+        vfov=30, aperture=0, focus_dist=1
     )
-    new_rec = HitRecordList(
-        Vec3List(rec.p.get_ndarray(idx)),
-        rec.t[idx],
-        rec.material[idx],
-        Vec3List(rec.normal.get_ndarray(idx)),
-        rec.front_face[idx]
+
+
+def random_view():
+    return dict(
+        lookfrom=(13, 2, 3), lookat=(0, 0, 0), vup=(0, 1, 0),
+        vfov=20, aperture=0.1, focus_dist=10
     )
-    return new_r, new_rec, idx
 
 
-def decompress(r, a, idx, length):
-    if idx is None:
-        return r, a
+def procedural_view(n_spheres):
+    side = 1.2 * n_spheres ** 0.5
+    return dict(
+        lookfrom=(side / 2, 2 + side / 20, side / 2), lookat=(0, 0, 0),
+        vup=(0, 1, 0), vfov=40, aperture=0, focus_dist=10
+    )
 
-    old_idx = cp.arange(len(idx))
-    new_r = RayList.new_zero(length)
-    new_r.origin().e[idx] = r.origin().e[old_idx]
-    new_r.direction().e[idx] = r.direction().e[old_idx]
 
-    new_a = Vec3List.new_zero(length)
-    new_a.e[idx] = a.e[old_idx]
+# Scenes `named_scene` generates; any other name is a scene file path.
+SCENES = ("three_ball", "random", "procedural")
 
-    return new_r, new_a
 
+def named_scene(name, n_spheres = 10000):
+    """BVH and camera arguments (see `scene_camera`) of a scene.
 
-def ray_color(r, world, depth):
-    length = len(r)
-    if not r.direction().e.any():
-        return None, None, Vec3List.new_zero(length)
+    `name` is one of `SCENES` or the path of a scene file.
+    """
+    if name == "three_ball":
+        return BVH(three_ball_scene()), three_ball_view()
+    if name == "random":
+        return BVH(random_scene()), random_view()
+    if name == "procedural":
+        return BVH(procedural_scene(n_spheres)), procedural_view(n_spheres)
+    world, view = read_scene(name)
+    if view is None:
+        raise ValueError(f"{name} has no camera")
+    return world, view
 
-    rec_list = world.hit(r, 0.001, cp.inf)
 
-    empty_vec3list = Vec3List.new_zero(length)
-    empty_array_float = cp.zeros(length, cp.float32)
-    empty_array_bool = cp.zeros(length, cp.bool)
-    empty_array_int = cp.zeros(length, cp.int32)
+def three_ball_camera(aspect_ratio):
+    return scene_camera(three_ball_view(), aspect_ratio)
 
-    unit_direction = r.direction().unit_vector()
-    sky_condition = Vec3List.from_array(
-        (unit_direction.length() > 0) & (rec_list.material == 0)
-    )
-    t = (unit_direction.y() + 1) * 0.5
-    blue_bg = (
-        Vec3List.from_vec3(Color(1, 1, 1), length).mul_ndarray(1 - t)
-        + Vec3List.from_vec3(Color(0.5, 0.7, 1), length).mul_ndarray(t)
-    )
-    result_bg = Vec3List(
-        cp.where(sky_condition.e, blue_bg.e, empty_vec3list.e)
-    )
-    if depth <= 1:
-        return None, None, result_bg
-
-    materials = world.get_materials()
-    scattered_list = RayList.new_zero(length)
-    attenuation_list = Vec3List.new_zero(length)
-    for mat_idx in materials:
-        mat_condition = (rec_list.material == mat_idx)
-        mat_condition_3 = Vec3List.from_array(mat_condition)
-        if not mat_condition.any():
-            continue
-
-        ray = RayList(
-            Vec3List(cp.where(mat_condition_3.e, r.origin().e, empty_vec3list.e)),
-            Vec3List(cp.where(mat_condition_3.e, r.direction().e, empty_vec3list.e))
-        )
-        rec = HitRecordList(
-            Vec3List(cp.where(
-                mat_condition_3.e, rec_list.p.e, empty_vec3list.e
-            )),
-            cp.where(mat_condition, rec_list.t, empty_array_float),
-            cp.where(mat_condition, rec_list.material, empty_array_int),
-            Vec3List(cp.where(
-                mat_condition_3.e, rec_list.normal.e, empty_vec3list.e
-            )),
-            cp.where(mat_condition, rec_list.front_face, empty_array_bool)
-        )
-        ray, rec, idx_list = compress(ray, rec)
-
-        scattered, attenuation = materials[mat_idx].scatter(ray, rec)
-        scattered, attenuation = decompress(
-            scattered, attenuation, idx_list, length
-        )
-        scattered_list += scattered
-        attenuation_list += attenuation
-
-    return scattered_list, attenuation_list, result_bg
-
-
-def ray_color_loop(r, world, depth):
-    attenuation_list = dict()
-    result_bg_list = dict()
-    length = 0
-    ray = r
-    for d in range(depth, 0, -1):
-        scattered, attenuation, result_bg = ray_color(ray, world, d)
-        result_bg_list[length] = result_bg.as_float32()
-        if scattered is None or attenuation is None:
-            break
-        attenuation_list[length] = attenuation.as_float32()
-        ray = scattered
-        length += 1
-
-    result = result_bg_list[length]
-    for i in range(length - 1, -1, -1):
-        result = result * attenuation_list[i] + result_bg_list[i]
-    return result.cpu()
-
-
-def scan_frame(world, cam, image_width, image_height, max_depth):
-    length = image_width * image_height
-    i_list = cp.tile(cp.arange(image_width), image_height)
-    j_list = cp.concatenate(cp.transpose(
-        cp.tile(cp.arange(image_height), (image_width, 1))
-    ))
-    u = (random_float_list(length) + i_list) / (image_width - 1)
-    v = (random_float_list(length) + j_list) / (image_height - 1)
-    r = cam.get_ray(u, v)
-    return ray_color_loop(r, world, max_depth)
+
+def random_camera(aspect_ratio):
+    return scene_camera(random_view(), aspect_ratio)
+
+
+def procedural_camera(n_spheres, aspect_ratio):
+    return scene_camera(procedural_view(n_spheres), aspect_ratio)
 
 
 def main() -> None:
@@ -212,36 +173,61 @@ def main() -> None:
     image_height = int(image_width / aspect_ratio)
     samples_per_pixel = 48
     max_depth = 5
-
-    world = random_scene()
-
-    lookfrom = Point3(13, 2, 3)
-    lookat = Point3(0, 0, 0)
-    vup = Vec3(0, 1, 0)
-    vfov = 20
-    dist_to_focus = 10
-    aperture = 0.1
-    cam = Camera(
-        lookfrom, lookat, vup, vfov, aspect_ratio, aperture, dist_to_focus
+    memory_budget = 256 * 1024**2
+    n_workers = None  # one per core
+    seed = 0
+    denoise = False
+    profile = False  # per-stage timings, written as a Chrome trace
+    checkpoint_path = "./render.ckpt"
+    checkpoint_samples = 8  # samples between checkpoints
+    resume = False  # continue from checkpoint_path if it exists
+
+    np.random.seed(seed)
+    world = BVH(random_scene())
+
+    cam = random_camera(aspect_ratio)
+
+    # A checkpoint only continues the render it was written by.
+    settings = dict(
+        scene="random_scene", width=image_width, height=image_height,
+        seed=seed, max_depth=max_depth, features=denoise
     )
+    accumulator = None
+    first_sample = 0
+    if resume and os.path.exists(checkpoint_path):
+        accumulator, first_sample = load_checkpoint(checkpoint_path, **settings)
+        print(f"Resuming {checkpoint_path} at sample {first_sample}.")
 
-    print("Start rendering.")
+    print(f"Start rendering ({get_backend()} backend).")
     start_time = time.time()
 
-    img_list = Parallel(n_jobs=2, verbose=20)(
-        delayed(scan_frame)(
-            world, cam, image_width, image_height, max_depth
-        ) for s in range(samples_per_pixel)
-    )
+    with RenderPool(world, n_workers) as pool:
+        with profiler.profile(enabled=profile) as prof:
+            for s in range(first_sample, samples_per_pixel, checkpoint_samples):
+                samples = min(checkpoint_samples, samples_per_pixel - s)
+                accumulator = pool.render(
+                    cam, image_width, image_height, samples, max_depth,
+                    memory_budget, accumulator, seed, s, denoise
+                )
+                save_checkpoint(
+                    checkpoint_path, accumulator, s + samples, **settings
+                )
 
     end_time = time.time()
     print(f"\nDone. Total time: {round(end_time - start_time, 1)} s.")
-
-    final_img = Img(image_width, image_height)
-    for img in img_list:
-        final_img.write_frame(img)
-    final_img.average(samples_per_pixel).gamma(2)
+    if prof is not None:
+        print(prof.summary())
+        prof.save_trace("./trace.json")
+
+    final_img = accumulator.snapshot()
+    if denoise:
+        final_img.denoise()
+    final_img.gamma(2)
     final_img.save("./output.png", True)
+    # The render is complete; a leftover checkpoint would only be resumed
+    # by mistake.
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
 
 
 if __name__ == "__main__":
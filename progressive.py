@@ -0,0 +1,112 @@
+"""Render progressively until a wall-clock budget or noise target is met.
+
+    python progressive.py --scene random --width 720 --height 405 --budget 60
+
+--scene also takes the path of a file written by utils.scene_file.
+The image at --output is rewritten every --interval seconds while the
+render converges, and a last time with the final estimate.
+"""
+import argparse
+import time
+import numpy as np
+from utils import backend
+from utils.render import render_progressive
+from utils.render_pool import RenderPool
+from utils.scene_file import scene_camera
+from main import named_scene
+
+
+def build_scene(name, n_spheres, aspect_ratio):
+    world, view = named_scene(name, n_spheres)
+    return world, scene_camera(view, aspect_ratio)
+
+
+def save_snapshot(accumulator, path, denoise):
+    img = accumulator.snapshot()
+    if denoise:
+        img.denoise()
+    img.gamma(2)
+    img.save(path)
+
+
+def main() -> None:
+    start_time = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scene", default="random",
+        help="three_ball, random, procedural or the path of a scene file"
+    )
+    parser.add_argument(
+        "--spheres", type=int, default=10000,
+        help="sphere count of the procedural scene"
+    )
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=405)
+    parser.add_argument(
+        "--budget", type=float, default=60,
+        help="wall-clock seconds, scene setup included"
+    )
+    parser.add_argument(
+        "--max-error", type=float, default=None,
+        help="stop once the mean relative standard error is this low"
+    )
+    parser.add_argument("--max-samples", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=5)
+    parser.add_argument("--backend", choices=backend.BACKENDS, default=None)
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="render processes (default one per core, 0 renders in-process)"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=10,
+        help="seconds between snapshots"
+    )
+    parser.add_argument("--output", default="./output.png")
+    parser.add_argument("--memory-budget", type=int, default=256 * 1024**2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--denoise", action="store_true")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        backend.set_backend(args.backend)
+    np.random.seed(args.seed)
+    world, cam = build_scene(args.scene, args.spheres, args.width / args.height)
+
+    def snapshot(accumulator):
+        save_snapshot(accumulator, args.output, args.denoise)
+        print(
+            f"{round(time.perf_counter() - start_time, 1)} s: "
+            f"{accumulator.samples() // (args.width * args.height)} spp, "
+            f"snapshot written to {args.output}"
+        )
+
+    print(
+        f"Rendering {args.scene} at {args.width}x{args.height} for up to "
+        f"{args.budget} s ({backend.get_backend()} backend)."
+    )
+    render_args = (
+        world, cam, args.width, args.height, args.budget,
+        args.max_depth, args.memory_budget, args.seed,
+        args.max_error, args.max_samples, snapshot, args.interval
+    )
+    if args.workers == 0:
+        accumulator = render_progressive(
+            *render_args, features=args.denoise, start_time=start_time
+        )
+    else:
+        with RenderPool(world, args.workers) as pool:
+            accumulator = render_progressive(
+                *render_args, pool=pool, features=args.denoise,
+                start_time=start_time
+            )
+
+    save_snapshot(accumulator, args.output, args.denoise)
+    print(
+        f"Done in {round(time.perf_counter() - start_time, 1)} s: "
+        f"{accumulator.samples() // (args.width * args.height)} spp, "
+        f"mean error {round(float(accumulator.error().mean()), 4)}."
+    )
+
+
+if __name__ == "__main__":
+    main()
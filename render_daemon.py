@@ -0,0 +1,76 @@
+"""Serve render jobs from warm workers until interrupted.
+
+    python render_daemon.py --unix ./render.sock
+    curl --unix-socket ./render.sock -d '{"scene": "random", "width": 160,
+        "height": 90, "samples": 4, "output": "out.png"}' http://localhost/jobs
+
+Jobs are JSON objects (see `utils.render_service.JOB_FIELDS`); the reply
+streams one JSON event per line up to "done" or "error". `GET /status`
+reports the queue. Job scene files and outputs are relative paths, kept
+inside --scene-dir and --output-dir. The default scene is loaded and the workers are started
+before the first job arrives.
+"""
+import argparse
+import asyncio
+import time
+from utils import backend
+from utils.render_service import RenderService
+from main import named_scene, SCENES
+
+
+def main() -> None:
+    start_time = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--unix", default=None,
+        help="listen on this Unix socket instead of TCP"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--scene", default="random",
+        help="scene loaded before the first job: three_ball, random, "
+             "procedural or a scene file in --scene-dir"
+    )
+    parser.add_argument(
+        "--scene-dir", default=".",
+        help="directory job scene files are read from"
+    )
+    parser.add_argument(
+        "--output-dir", default=".",
+        help="directory job outputs are written to"
+    )
+    parser.add_argument("--spheres", type=int, default=10000)
+    parser.add_argument("--backend", choices=backend.BACKENDS, default=None)
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="render processes (default one per core, 0 renders in-process)"
+    )
+    parser.add_argument("--memory-budget", type=int, default=256 * 1024**2)
+    parser.add_argument(
+        "--max-scenes", type=int, default=4,
+        help="scenes kept loaded between jobs"
+    )
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        backend.set_backend(args.backend)
+    address = args.unix or f"{args.host}:{args.port}"
+
+    def ready():
+        print(
+            f"Serving on {address} after {round(time.perf_counter() - start_time, 2)} s "
+            f"({backend.get_backend()} backend).", flush=True
+        )
+
+    service = RenderService(
+        named_scene, args.workers, args.memory_budget, args.max_scenes,
+        SCENES, args.scene_dir, args.output_dir
+    )
+    with service.start(dict(scene=args.scene, spheres=args.spheres)):
+        asyncio.run(service.serve(args.host, args.port, args.unix, ready))
+    print("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
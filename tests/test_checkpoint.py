@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from utils.backend import asnumpy
+from utils.render import scan_frame_tiled, render_samples
+from utils.checkpoint import save_checkpoint, load_checkpoint
+from tests.test_render import scene, render, WIDTH, HEIGHT, MAX_DEPTH, SAMPLES
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "render.ckpt"
+    accumulator = render(features=True)
+    save_checkpoint(path, accumulator, SAMPLES, seed=0, width=WIDTH)
+    loaded, next_sample = load_checkpoint(path, seed=0, width=WIDTH)
+    assert next_sample == SAMPLES
+    for name, a in accumulator.pack().items():
+        b = asnumpy(getattr(loaded, name))
+        assert b.dtype == a.dtype
+        assert np.array_equal(a, b)
+
+
+def test_settings_must_match(tmp_path):
+    path = tmp_path / "render.ckpt"
+    save_checkpoint(path, render(), SAMPLES, seed=0)
+    with pytest.raises(ValueError):
+        load_checkpoint(path, seed=1)
+
+
+def test_not_a_checkpoint(tmp_path):
+    path = tmp_path / "render.ckpt"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        load_checkpoint(path)
+
+
+def test_resume_is_bit_identical(tmp_path):
+    path = tmp_path / "render.ckpt"
+    save_checkpoint(path, render(), SAMPLES)
+    resumed, next_sample = load_checkpoint(path)
+    world, cam = scene()
+    for s in range(next_sample, 2 * SAMPLES):
+        scan_frame_tiled(world, cam, resumed, MAX_DEPTH, 256 * 1024**2, 0, s)
+
+    world, cam = scene()
+    straight = render_samples(
+        world, cam, WIDTH, HEIGHT, 2 * SAMPLES, MAX_DEPTH, 256 * 1024**2, 0
+    )
+    assert np.array_equal(asnumpy(resumed.mean), asnumpy(straight.mean))
+    assert np.array_equal(asnumpy(resumed.m2), asnumpy(straight.m2))
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import numpy as np
+import pytest
+from utils.accumulator import Accumulator
+from utils.distributed import Coordinator, Frame, WorkerState, encode, read_message
+from main import named_scene
+
+SETTINGS = dict(
+    image_width=16, image_height=8, samples=4, max_depth=2, seed=0,
+    tile_size=8, unit_samples=2
+)
+
+
+async def fake_worker(host, port, crashes, hangs):
+    """A worker that answers with empty results, drops the connection on
+    the units `crashes(unit)` picks and never answers those `hangs` picks."""
+    reader, writer = await asyncio.open_connection(host, port)
+    await read_message(reader)
+    try:
+        while True:
+            header, _ = await read_message(reader)
+            unit = tuple(header["unit"])
+            if crashes(unit):
+                break
+            if hangs(unit):
+                await reader.read()
+                break
+            _, _, width, height = header["tile"]
+            writer.write(encode(
+                dict(type="result", unit=header["unit"]),
+                Accumulator(width, height).pack()
+            ))
+            await writer.drain()
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+async def render_with(crashes, n_workers, max_attempts = 3, hangs = lambda unit: False, unit_timeout = 60):
+    world, view = named_scene("three_ball")
+    coordinator = Coordinator(world, unit_timeout, max_attempts)
+    host, port = await coordinator.start()
+    workers = [
+        asyncio.create_task(fake_worker(host, port, crashes, hangs))
+        for _ in range(n_workers)
+    ]
+    while len(coordinator.workers) < n_workers:
+        await asyncio.sleep(0.01)
+    try:
+        render = coordinator.render(view, **SETTINGS)
+        return await asyncio.wait_for(render, 10), coordinator.stats
+    finally:
+        await coordinator.close()
+        await asyncio.gather(*workers)
+
+
+def test_render():
+    accumulator, stats = asyncio.run(render_with(lambda unit: False, 2))
+    assert stats["units"] == 4
+    assert stats["reissued"] == 0
+    assert np.all(accumulator.mean == 0)
+
+
+def test_lost_unit_is_reissued():
+    crashed = set()
+
+    def crashes(unit):
+        if unit[0] == 1 and not crashed:
+            crashed.add(unit)
+            return True
+        return False
+
+    _, stats = asyncio.run(render_with(crashes, 2))
+    assert stats["units"] == 4
+    assert stats["reissued"] == 1
+
+
+def test_poison_unit_fails_the_frame():
+    with pytest.raises(RuntimeError, match="lost by 2 workers"):
+        asyncio.run(render_with(lambda unit: unit[0] == 1, 3, max_attempts=2))
+
+
+def test_stalled_unit_fails_the_frame():
+    with pytest.raises(RuntimeError, match="stalled on 2 workers"):
+        asyncio.run(render_with(
+            lambda unit: False, 2, max_attempts=2,
+            hangs=lambda unit: unit[:2] == (1, 0), unit_timeout=0
+        ))
+
+
+def test_only_worker_hangs():
+    start_time = time.perf_counter()
+    with pytest.raises(RuntimeError, match="Every worker"):
+        asyncio.run(render_with(
+            lambda unit: False, 1, max_attempts=2,
+            hangs=lambda unit: True, unit_timeout=0.5
+        ))
+    assert time.perf_counter() - start_time < 5
+
+
+def test_losing_a_stalled_copy():
+    async def lose_stalled_copy():
+        world, _ = named_scene("three_ball")
+        coordinator = Coordinator(world, max_attempts=2)
+        coordinator.work = asyncio.Condition()
+        frame = coordinator.frame = Frame(
+            dict(width=8, height=8), [(0, 0, 8, 8)], 2, 2, False
+        )
+        unit = frame.units[0]
+        stalled = WorkerState("stalled", None)
+        healthy = coordinator.workers["healthy"] = WorkerState("healthy", None)
+        stalled.in_flight = healthy.in_flight = unit
+        frame.attempts[unit] = 2
+        frame.reissued.add((stalled.name, unit))
+        await coordinator.reissue(stalled)
+        return frame
+
+    frame = asyncio.run(lose_stalled_copy())
+    assert frame.error is None
+    assert not frame.unassigned
+
+
+def test_no_workers_left():
+    with pytest.raises(RuntimeError, match="All workers disconnected"):
+        asyncio.run(render_with(lambda unit: True, 2, max_attempts=5))
+
+
+def test_no_workers():
+    async def render():
+        world, view = named_scene("three_ball")
+        coordinator = Coordinator(world)
+        await coordinator.start()
+        try:
+            await coordinator.render(view, **SETTINGS)
+        finally:
+            await coordinator.close()
+
+    with pytest.raises(RuntimeError, match="No workers"):
+        asyncio.run(render())
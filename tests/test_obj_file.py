@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from utils.obj_file import read_obj_arrays, write_obj
+
+
+def read(tmp_path, text, chunk_size = 1 << 22):
+    path = tmp_path / "mesh.obj"
+    path.write_text(text)
+    return read_obj_arrays(path, chunk_size)
+
+
+def test_triangles(tmp_path):
+    vertices, faces = read(tmp_path, "v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    assert np.array_equal(vertices, [(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+    assert vertices.dtype == np.float32
+    assert np.array_equal(faces, [(0, 1, 2)])
+    assert faces.dtype == np.int32
+
+
+def test_indented_lines(tmp_path):
+    vertices, faces = read(
+        tmp_path, "v 0 0 0\n  v 1 0 0\n\tv 0 1 0\n  v 5 5 5\n \t f 1 2 4\n"
+    )
+    assert np.array_equal(vertices[3], (5, 5, 5))
+    assert np.array_equal(faces, [(0, 1, 3)])
+
+
+def test_comments_and_other_statements(tmp_path):
+    vertices, faces = read(tmp_path, (
+        "# v 9 9 9\nmtllib scene.mtl\no mesh\nv 0 0 0 # first\nvt 0.5 0.5\n"
+        "vn 0 0 1\nv 1 0 0\n\nv 0 1 0\ng group\nusemtl red\ns off\n"
+        "f 1 2 3 # f 3 2 1\n   # f 1 1 1\n"
+    ))
+    assert len(vertices) == 3
+    assert np.array_equal(faces, [(0, 1, 2)])
+
+
+def test_polygons_are_fans(tmp_path):
+    text = "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nv -1 1 0\nf 1 2 3 4\nf 1 2 3 4 5\n"
+    _, faces = read(tmp_path, text)
+    assert np.array_equal(
+        faces, [(0, 1, 2), (0, 2, 3), (0, 1, 2), (0, 2, 3), (0, 3, 4)]
+    )
+
+
+def test_negative_indices(tmp_path):
+    text = "v 0 0 0\nv 1 0 0\nv 0 1 0\nf -3 -2 -1\nv 1 1 0\nf -1 -3 -2\n"
+    _, faces = read(tmp_path, text)
+    assert np.array_equal(faces, [(0, 1, 2), (3, 1, 2)])
+
+
+def test_corner_references(tmp_path):
+    text = (
+        "v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nvn 0 0 1\n"
+        "f 1/1/1 2/1/1 3/1/1\nf 3//1 2//1 1//1\nf 1/1 3/1 2/1\n"
+    )
+    _, faces = read(tmp_path, text)
+    assert np.array_equal(faces, [(0, 1, 2), (2, 1, 0), (0, 2, 1)])
+
+
+def test_extra_vertex_values_are_ignored(tmp_path):
+    vertices, _ = read(tmp_path, "v 1 2 3 1.0\nv 4 5 6 0.1 0.2 0.3\n")
+    assert np.array_equal(vertices, [(1, 2, 3), (4, 5, 6)])
+
+
+def test_chunks_split_lines(tmp_path):
+    vertices = np.random.RandomState(0).rand(100, 3).astype(np.float32)
+    faces = np.random.RandomState(1).randint(0, 100, (300, 3))
+    path = tmp_path / "mesh.obj"
+    write_obj(path, vertices, faces)
+    for chunk_size in (7, 100, 1 << 22):
+        v, f = read_obj_arrays(path, chunk_size)
+        assert np.allclose(v, vertices, rtol=1e-6)
+        assert np.array_equal(f, faces)
+
+
+@pytest.mark.parametrize("text", [
+    "v 0 0 0\nv 1 0 0\nf 1 2 3\n",
+    "v 0 0 0\nf -2 -1 1\n",
+    "v 0 0\n",
+    "v 0 0 x\n",
+])
+def test_malformed(tmp_path, text):
+    with pytest.raises(ValueError):
+        read(tmp_path, text)
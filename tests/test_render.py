@@ -0,0 +1,64 @@
+import numpy as np
+from utils.backend import asnumpy
+from utils.render import render_samples, render_adaptive, RAY_BYTES
+from utils.scene_file import scene_camera
+from main import named_scene
+
+WIDTH, HEIGHT = 32, 18
+SAMPLES = 3
+MAX_DEPTH = 4
+
+
+def scene():
+    np.random.seed(0)
+    world, view = named_scene("three_ball")
+    return world, scene_camera(view, WIDTH / HEIGHT)
+
+
+def render(memory_budget = 256 * 1024**2, seed = 0, **kwargs):
+    world, cam = scene()
+    return render_samples(
+        world, cam, WIDTH, HEIGHT, SAMPLES, MAX_DEPTH, memory_budget, seed,
+        **kwargs
+    )
+
+
+def test_seeded_render_is_reproducible():
+    a = render()
+    b = render()
+    assert np.array_equal(asnumpy(a.mean), asnumpy(b.mean))
+    assert np.array_equal(asnumpy(a.m2), asnumpy(b.m2))
+
+
+def test_seed_changes_the_image():
+    assert not np.array_equal(asnumpy(render().mean), asnumpy(render(seed=1).mean))
+
+
+def test_tiling_does_not_change_the_image():
+    untiled = render()
+    # Tiles of 5 pixels: partial rows, so tiles do not line up with rows.
+    tiled = render(memory_budget=5 * RAY_BYTES)
+    assert np.array_equal(asnumpy(untiled.mean), asnumpy(tiled.mean))
+    assert np.array_equal(asnumpy(untiled.count), asnumpy(tiled.count))
+
+
+def test_features_do_not_change_the_image():
+    plain = render()
+    with_features = render(features=True)
+    assert np.array_equal(asnumpy(plain.mean), asnumpy(with_features.mean))
+
+
+def test_one_sample_error_is_unknown():
+    accumulator = render_samples(
+        *scene(), WIDTH, HEIGHT, 1, MAX_DEPTH, 256 * 1024**2, 0
+    )
+    assert np.all(np.isinf(asnumpy(accumulator.error())))
+
+
+def test_adaptive_from_one_base_sample():
+    accumulator = render_adaptive(
+        *scene(), WIDTH, HEIGHT, 1, 4, 0.05, MAX_DEPTH, 256 * 1024**2, 0
+    )
+    count = asnumpy(accumulator.count)
+    assert count.min() >= 2
+    assert count.max() == 4
@@ -0,0 +1,126 @@
+import os
+import asyncio
+import pytest
+from utils.render_service import make_job, parse_job, resolve, read_request, RenderService, MAX_BODY
+from main import random_view, named_scene
+
+
+def test_defaults():
+    job = make_job({})
+    assert job["scene"] == "random"
+    assert job["image"] is True
+    assert make_job(dict(output="out.png"))["image"] is False
+
+
+@pytest.mark.parametrize("job", [
+    dict(width=True),
+    dict(samples=0),
+    dict(seed=False),
+    dict(priority=1.5),
+    dict(denoise=1),
+    dict(image="yes"),
+    dict(unknown=1),
+    dict(scene="/etc/passwd"),
+    dict(scene="../scenes/a.scene"),
+    dict(scene="scenes/../../a.scene"),
+    dict(scene=""),
+    dict(scene=3),
+    dict(output="/tmp/out.png"),
+    dict(output="../out.png"),
+    dict(camera=[1, 2, 3]),
+    dict(camera=dict(random_view(), extra=1)),
+    dict(camera=dict(random_view(), lookfrom=[1, 2])),
+    dict(camera=dict(random_view(), vfov=True)),
+    dict(camera=dict(random_view(), vfov=180)),
+    dict(camera=dict(random_view(), focus_dist=0)),
+])
+def test_invalid_jobs(job):
+    with pytest.raises(ValueError):
+        make_job(job)
+
+
+def test_camera():
+    camera = {
+        name: list(value) if isinstance(value, tuple) else value
+        for name, value in random_view().items()
+    }
+    assert make_job(dict(camera=camera))["camera"] == camera
+
+
+def test_parse_job():
+    assert parse_job(b'{"width": 16}')["width"] == 16
+    with pytest.raises(ValueError):
+        parse_job(b"{")
+
+
+def test_resolve(tmp_path):
+    assert resolve(tmp_path, "a/b.png") == os.path.join(os.path.realpath(tmp_path), "a", "b.png")
+    os.symlink("/", tmp_path / "root")
+    with pytest.raises(ValueError):
+        resolve(tmp_path, "root/etc/passwd")
+
+
+def test_scene_files_stay_in_scene_dir(tmp_path):
+    loaded = list()
+    service = RenderService(
+        lambda name, n: loaded.append(name), scene_names=("random",),
+        scene_dir=tmp_path
+    )
+    service.scene(make_job(dict(scene="random")))
+    with pytest.raises(ValueError):
+        service.scene(make_job(dict(scene="missing.scene")))
+    (tmp_path / "a.scene").write_bytes(b"")
+    service.scene(make_job(dict(scene="a.scene")))
+    assert loaded == ["random", os.path.join(os.path.realpath(tmp_path), "a.scene")]
+
+
+def read(data):
+    async def read_data():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+
+    return asyncio.run(read_data())
+
+
+def test_read_request():
+    assert read(b"POST /jobs HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}") == ("POST", "/jobs", b"{}")
+    assert read(b"GET /status HTTP/1.1\r\n\r\n") == ("GET", "/status", b"")
+
+
+@pytest.mark.parametrize("data", [
+    b"GET\r\n\r\n",
+    b"POST /jobs HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+    b"POST /jobs HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+    f"POST /jobs HTTP/1.1\r\nContent-Length: {MAX_BODY + 1}\r\n\r\n".encode(),
+])
+def test_malformed_requests(data):
+    with pytest.raises(ValueError):
+        read(data)
+
+
+def test_malformed_request_gets_400():
+    async def send(data):
+        server = await asyncio.start_server(RenderService(named_scene).handle, "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(data)
+            response = await reader.read()
+            writer.close()
+        return response
+
+    assert asyncio.run(send(b"GET\r\n\r\n")).startswith(b"HTTP/1.1 400 ")
+
+
+def test_output_directory_is_created(tmp_path):
+    service = RenderService(
+        named_scene, n_workers=0, scene_names=("three_ball",), output_dir=tmp_path
+    )
+    with service.start(dict(scene="three_ball")):
+        job = make_job(dict(
+            scene="three_ball", width=8, height=8, samples=1,
+            output="frames/a/out.png"
+        ))
+        service.render(job, lambda done, total: None)
+    assert (tmp_path / "frames" / "a" / "out.png").is_file()
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from utils import array_file
+from utils.backend import asnumpy
+from utils.bvh import BVH
+from utils.scene_file import write_scene, read_scene, MAGIC
+from main import procedural_scene
+
+
+def test_round_trip_keeps_the_sphere_order(tmp_path):
+    path = tmp_path / "a.scene"
+    world = BVH(procedural_scene(200))
+    write_scene(path, world, camera=dict(vfov=20))
+    loaded, camera = read_scene(path)
+    assert camera == dict(vfov=20)
+    assert np.array_equal(loaded.order, world.order)
+
+    centers = np.zeros((1, 3), dtype=np.float32)
+    world.update_spheres(centers, [0.5], [7])
+    loaded.update_spheres(centers, [0.5], [7])
+    assert np.array_equal(asnumpy(loaded.spheres.centers), asnumpy(world.spheres.centers))
+
+
+def test_older_versions_are_rejected(tmp_path):
+    path = tmp_path / "a.scene"
+    arrays = BVH(procedural_scene(10)).pack()
+    del arrays["order"]
+    array_file.write(path, MAGIC, 1, arrays, camera=None)
+    with pytest.raises(ValueError, match="version 1"):
+        read_scene(path)
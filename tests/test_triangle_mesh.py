@@ -0,0 +1,39 @@
+import numpy as np
+from utils.backend import xp, asnumpy
+from utils.vec3 import Point3, Color, Vec3List
+from utils.ray import RayList
+from utils.sphere import Sphere
+from utils.material import Lambertian
+from utils.hittable_list import HittableList
+from utils.triangle_mesh import TriangleMesh
+
+
+def quad(material):
+    """The square [-1, 1]^2 at z = -1, as two triangles."""
+    vertices = [(-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1)]
+    return TriangleMesh(vertices, [(0, 1, 2), (0, 2, 3)], material)
+
+
+def rays(directions):
+    d = xp.asarray(directions, dtype=xp.float32)
+    return RayList(Vec3List(xp.zeros_like(d)), Vec3List(d))
+
+
+def test_hits():
+    mesh = quad(Lambertian(Color(0.5, 0.5, 0.5), 1))
+    rec = mesh.hit(rays([(0, 0, -1), (0.5, -0.5, -1), (2, 0, -1), (0, 0, 1)]), 0.001, np.inf)
+    assert np.allclose(asnumpy(rec.t), [1, 1, np.inf, np.inf])
+    assert list(asnumpy(rec.material)) == [1, 1, 0, 0]
+    assert np.allclose(asnumpy(rec.normal.e[:2]), [(0, 0, 1), (0, 0, 1)])
+
+
+def test_hits_inside_hittable_list():
+    # Every ray, the last one of the batch included, must keep its hit.
+    mesh = quad(Lambertian(Color(0.5, 0.5, 0.5), 1))
+    world = HittableList(mesh)
+    world.add(Sphere(Point3(0, 0, -5), 0.5, Lambertian(Color(0.1, 0.2, 0.5), 2)))
+    r = rays([(0, 0, -1), (0.2, 0.2, -1), (-0.3, 0.1, -1)])
+    bare = mesh.hit(r, 0.001, np.inf)
+    rec = world.hit(r, 0.001, np.inf)
+    assert list(asnumpy(rec.material)) == [1, 1, 1]
+    assert np.array_equal(asnumpy(rec.t), asnumpy(bare.t))
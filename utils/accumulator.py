@@ -0,0 +1,142 @@
+import numpy as np
+from utils.backend import xp, asnumpy
+from utils.image import Img
+
+
+class Accumulator:
+    """Running per-pixel mean and variance of the rendered samples.
+
+    Buffers live on the render device and are updated in place with
+    Welford's algorithm as each tile finishes, so memory does not grow with
+    the sample count. Nothing is copied to the host until `snapshot`.
+
+    With `features` set it also sums the first-hit normal, albedo and depth
+    buffers that `Img.denoise` is guided by.
+    """
+
+    ARRAYS = ("count", "mean", "m2")
+    FEATURE_ARRAYS = ("feature_count", "normal", "albedo", "depth")
+
+    def __init__(self, w, h, features = False):
+        self.w = w
+        self.h = h
+        self.count = xp.zeros((h, w), dtype=xp.int32)
+        self.mean = xp.zeros((h, w, 3), dtype=xp.float32)
+        self.m2 = xp.zeros((h, w, 3), dtype=xp.float32)
+        self.feature_count = None
+        if features:
+            self.feature_count = xp.zeros((h, w), dtype=xp.int32)
+            self.normal = xp.zeros((h, w, 3), dtype=xp.float32)
+            self.albedo = xp.zeros((h, w, 3), dtype=xp.float32)
+            self.depth = xp.zeros((h, w), dtype=xp.float32)
+
+    def has_features(self):
+        return self.feature_count is not None
+
+    def pack(self):
+        """The running state as host arrays, e.g. for a checkpoint."""
+        names = Accumulator.ARRAYS
+        if self.has_features():
+            names += Accumulator.FEATURE_ARRAYS
+        return {name: asnumpy(getattr(self, name)) for name in names}
+
+    @staticmethod
+    def from_arrays(arrays):
+        """Inverse of `pack`; the arrays are copied to the render device."""
+        h, w = arrays["count"].shape
+        accumulator = Accumulator(w, h, "feature_count" in arrays)
+        for name, value in arrays.items():
+            setattr(accumulator, name, xp.array(value))
+        return accumulator
+
+    def add(self, x, y, w, h, tile, features = None):
+        if features is not None and self.has_features():
+            self.feature_count[y:y + h, x:x + w] += 1
+            self.normal[y:y + h, x:x + w] += features.normal.e.reshape((h, w, 3))
+            self.albedo[y:y + h, x:x + w] += features.albedo.e.reshape((h, w, 3))
+            self.depth[y:y + h, x:x + w] += features.depth.reshape((h, w))
+
+        count = self.count[y:y + h, x:x + w]
+        mean = self.mean[y:y + h, x:x + w]
+        m2 = self.m2[y:y + h, x:x + w]
+        value = tile.e.reshape((h, w, 3))
+
+        count += 1
+        delta = value - mean
+        mean += delta / count[:, :, None]
+        m2 += delta * (value - mean)
+        return self
+
+    def add_pixels(self, pixel, values):
+        """Welford update for a list of distinct flat pixel indices."""
+        count = self.count.reshape(-1)
+        mean = self.mean.reshape(-1, 3)
+        m2 = self.m2.reshape(-1, 3)
+
+        n = count[pixel] + 1
+        delta = values.e - mean[pixel]
+        new_mean = mean[pixel] + delta / n[:, None]
+        m2[pixel] += delta * (values.e - new_mean)
+        mean[pixel] = new_mean
+        count[pixel] = n
+        return self
+
+    def merge(self, other, x = 0, y = 0):
+        """Fold in the samples of `other`, covering the region at (x, y).
+
+        Means and M2 are combined with Chan et al.'s parallel update, so
+        partial accumulations of the same pixels (e.g. of disjoint sample
+        ranges) merge into one estimate.
+        """
+        region = (slice(y, y + other.h), slice(x, x + other.w))
+        count = self.count[region]
+        mean = self.mean[region]
+        total = count + other.count
+        safe_count = xp.maximum(total, 1)[:, :, None]
+        delta = other.mean - mean
+        self.m2[region] += other.m2 + delta**2 * (
+            count * other.count
+        )[:, :, None] / safe_count
+        mean += delta * (other.count[:, :, None] / safe_count)
+        count[...] = total
+        if self.has_features() and other.has_features():
+            self.feature_count[region] += other.feature_count
+            self.normal[region] += other.normal
+            self.albedo[region] += other.albedo
+            self.depth[region] += other.depth
+        return self
+
+    def samples(self):
+        return int(self.count.sum())
+
+    def variance(self):
+        return self.m2 / xp.maximum(self.count - 1, 1)[:, :, None]
+
+    def error(self, eps = 1e-2):
+        """Relative standard error of each pixel's mean brightness.
+
+        It is infinite for pixels with fewer than two samples, whose
+        variance is not known yet.
+        """
+        n = xp.maximum(self.count, 1)
+        stderr = xp.sqrt(self.variance().mean(axis=2) / n)
+        error = stderr / (self.mean.mean(axis=2) + eps)
+        return xp.where(self.count < 2, xp.inf, error)
+
+    def snapshot(self):
+        img = Img(self.w, self.h)
+        img.set_frame(asnumpy(self.mean).astype(np.float64))
+        if self.has_features():
+            n = xp.maximum(self.feature_count, 1)
+            normal = self.normal / n[:, :, None]
+            img.set_features(
+                asnumpy(normal / xp.maximum(
+                    xp.sqrt((normal ** 2).sum(axis=2)), 1e-6
+                )[:, :, None]),
+                asnumpy(self.albedo / n[:, :, None]),
+                asnumpy(self.depth / n),
+                asnumpy(
+                    self.variance().mean(axis=2) / xp.maximum(self.count, 1)
+                ).astype(np.float64)
+            )
+        return img
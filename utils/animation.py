@@ -0,0 +1,183 @@
+import math
+import time
+import queue
+import threading
+import contextlib
+import numpy as np
+from utils.bvh import BVH
+from utils.render import render_samples
+from utils.render_pool import RenderPool
+from utils.scene_file import scene_camera
+from utils import workspace
+
+VIEW_KEYS = ("lookfrom", "lookat", "vup", "vfov", "aperture", "focus_dist")
+
+
+class CameraPath:
+    """Keyframed camera arguments, linearly interpolated per frame.
+
+    `keyframes` maps frame numbers to `scene_camera` argument dicts. Only
+    the first keyframe has to give all of them; later ones may give just
+    what changes. Frames outside the keyframed range hold the nearest
+    keyframe's view.
+    """
+
+    def __init__(self, keyframes):
+        if not keyframes:
+            raise ValueError("A camera path needs at least one keyframe")
+        self.frames = sorted(keyframes)
+        self.views = list()
+        view = dict()
+        for frame in self.frames:
+            view = dict(view, **keyframes[frame])
+            missing = [key for key in VIEW_KEYS if key not in view]
+            if missing:
+                raise ValueError(f"Keyframe {frame} is missing {missing}")
+            self.views.append(
+                {key: np.asarray(view[key], dtype=np.float64) for key in VIEW_KEYS}
+            )
+
+    def view(self, frame):
+        k = int(np.searchsorted(self.frames, frame, side="right"))
+        if k == 0 or k == len(self.frames):
+            view = self.views[max(k - 1, 0)]
+            return {key: value.tolist() for key, value in view.items()}
+        f0, f1 = self.frames[k - 1], self.frames[k]
+        w = (frame - f0) / (f1 - f0)
+        v0, v1 = self.views[k - 1], self.views[k]
+        return {key: ((1 - w) * v0[key] + w * v1[key]).tolist() for key in VIEW_KEYS}
+
+    def camera(self, frame, aspect_ratio):
+        return scene_camera(self.view(frame), aspect_ratio)
+
+    @staticmethod
+    def orbit(view, length, turns = 1):
+        """`view` with lookfrom circling the vertical axis through lookat.
+
+        One keyframe per frame over `length` frames, so the path is a true
+        circle rather than a polygon.
+        """
+        lookat = np.asarray(view["lookat"], dtype=np.float64)
+        offset = np.asarray(view["lookfrom"], dtype=np.float64) - lookat
+        keyframes = dict()
+        for frame in range(length + 1):
+            angle = 2 * math.pi * turns * frame / max(length, 1)
+            c, s = math.cos(angle), math.sin(angle)
+            lookfrom = lookat + (
+                c * offset[0] + s * offset[2], offset[1],
+                -s * offset[0] + c * offset[2]
+            )
+            keyframes[frame] = dict(view, lookfrom=lookfrom.tolist())
+        return CameraPath(keyframes)
+
+
+class FrameWriter:
+    """Finishes and saves frames on a background thread.
+
+    `write` hands over the snapshot of a rendered frame; denoising, tone
+    mapping and PNG encoding then overlap with rendering the next one. At
+    most `max_pending` frames wait, so a slow disk holds the renderer back
+    instead of piling up images in memory.
+    """
+
+    def __init__(self, max_pending = 2):
+        self.pending = queue.Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            img, path, denoise = item
+            try:
+                if denoise:
+                    img.denoise()
+                img.gamma(2)
+                img.save(path)
+            except Exception as error:
+                self.error = self.error or error
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, img, path, denoise = False):
+        self.check()
+        self.pending.put((img, path, denoise))
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close()
+        if exc_type is None:
+            self.check()
+
+
+def render_animation(world, path, frames, image_width, image_height, samples, max_depth, memory_budget, output, seed = None, n_workers = None, denoise = False, on_frame = None, start_time = None, update = None):
+    """Render `frames` of the `CameraPath` `path` to `output.format(frame)`.
+
+    The BVH is built and published to the `RenderPool` once, and the same
+    warm workers render every frame; `n_workers=0` renders in-process
+    instead, reusing one `Workspace`. Finished frames go to a `FrameWriter`.
+
+    `update(frame, world)` may move spheres before each frame with
+    `BVH.update_spheres`; the pool then republishes the arrays in place.
+
+    `on_frame` is called with each frame's statistics (seconds, primary
+    rays per second). Returns them with the total wall time since
+    `start_time` (now by default), so setup and the last writes count, and
+    the amortized primary rays per second over the whole animation.
+    """
+    if start_time is None:
+        start_time = time.perf_counter()
+    if not isinstance(world, BVH):
+        world = BVH(world)
+    aspect_ratio = image_width / image_height
+    rays = image_width * image_height * samples
+
+    stats = list()
+    with contextlib.ExitStack() as stack:
+        pool = None
+        if n_workers != 0:
+            pool = stack.enter_context(RenderPool(world, n_workers))
+        stack.enter_context(workspace.use())
+        writer = stack.enter_context(FrameWriter())
+        for frame in frames:
+            frame_start = time.perf_counter()
+            cam = path.camera(frame, aspect_ratio)
+            if update is not None:
+                update(frame, world)
+                if pool is not None:
+                    pool.update(world)
+            if pool is None:
+                accumulator = render_samples(
+                    world, cam, image_width, image_height, samples,
+                    max_depth, memory_budget, seed, features=denoise
+                )
+            else:
+                accumulator = pool.render(
+                    cam, image_width, image_height, samples, max_depth,
+                    memory_budget, seed=seed, features=denoise
+                )
+            writer.write(accumulator.snapshot(), output.format(frame), denoise)
+            seconds = time.perf_counter() - frame_start
+            frame_stats = dict(
+                frame=frame, seconds=seconds, rays_per_second=rays / seconds
+            )
+            stats.append(frame_stats)
+            if on_frame is not None:
+                on_frame(frame_stats)
+
+    total_seconds = time.perf_counter() - start_time
+    return dict(
+        frames=stats, total_seconds=total_seconds,
+        amortized_rays_per_second=rays * len(stats) / total_seconds
+    )
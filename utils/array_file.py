@@ -0,0 +1,76 @@
+import os
+import json
+import struct
+import numpy as np
+
+# Magic, format version and the byte length of the JSON header after them.
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def write(path, magic, version, arrays, **header):
+    """Write host `arrays` and a JSON `header` to `path`, atomically.
+
+    The file is a preamble (`magic`, `version` and the header length),
+    the JSON header with the array layout added to it, and the arrays as
+    raw buffers at 64-byte aligned offsets, so `read` can map them in
+    place. It is written to `<path>.partial`, synced to disk and renamed
+    over `path`; a crash at any point leaves the previous file intact.
+    """
+    layout = list()
+    size = 0
+    for name, a in arrays.items():
+        layout.append((name, a.dtype.str, a.shape, size))
+        size = _aligned(size + a.nbytes)
+    header = json.dumps(dict(header, arrays=layout)).encode()
+    data_start = _aligned(PREAMBLE.size + len(header))
+    header = header.ljust(data_start - PREAMBLE.size)
+
+    partial = f"{path}.partial"
+    with open(partial, "wb") as f:
+        f.write(PREAMBLE.pack(magic, version, len(header)))
+        f.write(header)
+        for (_, _, _, offset), a in zip(layout, arrays.values()):
+            f.seek(data_start + offset)
+            f.write(np.ascontiguousarray(a).data)
+        f.truncate(data_start + size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+
+def read_header(f, magic, version, kind):
+    """The JSON header of an open file and the offset its arrays start at.
+
+    Raises ValueError unless the file has `magic` and `version`; `kind`
+    names the format in the message.
+    """
+    found, found_version, header_size = PREAMBLE.unpack(f.read(PREAMBLE.size))
+    if found != magic:
+        raise ValueError(f"{f.name} is not a {kind}")
+    if found_version != version:
+        raise ValueError(
+            f"{f.name} has {kind} format version {found_version}, "
+            f"this build reads version {version}"
+        )
+    return json.loads(f.read(header_size)), PREAMBLE.size + header_size
+
+
+def read(path, magic, version, kind):
+    """The header of a `write` file and its arrays, by name.
+
+    The arrays are views of one read-only memory map, so nothing is
+    copied and pages are only read when they are touched.
+    """
+    with open(path, "rb") as f:
+        header, data_start = read_header(f, magic, version, kind)
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {
+        name: np.ndarray(shape, dtype, buffer=mapped, offset=data_start + offset)
+        for name, dtype, shape, offset in header.pop("arrays")
+    }
+    return header, arrays
@@ -0,0 +1,71 @@
+import os
+import importlib
+
+BACKEND_ENV = "RAYTRACING_BACKEND"
+BACKENDS = ("cupy", "numpy")
+
+_module = None
+_name = None
+
+
+def _load(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {BACKENDS}")
+    return importlib.import_module(name)
+
+
+def _default():
+    name = os.environ.get(BACKEND_ENV)
+    if name:
+        return name
+    try:
+        importlib.import_module("cupy").cuda.runtime.getDeviceCount()
+        return "cupy"
+    except Exception:
+        return "numpy"
+
+
+def set_backend(name):
+    global _module, _name
+    _module = _load(name)
+    _name = name
+    # Worker processes pick the backend up from the environment.
+    os.environ[BACKEND_ENV] = name
+    return _module
+
+
+def get_backend():
+    if _module is None:
+        set_backend(_default())
+    return _name
+
+
+def get_array_module():
+    if _module is None:
+        set_backend(_default())
+    return _module
+
+
+def is_gpu():
+    return get_backend() == "cupy"
+
+
+def asnumpy(a):
+    if is_gpu():
+        return _module.asnumpy(a)
+    return a
+
+
+class _ArrayModule:
+    """Forwards attribute access to the active array module.
+
+    Modules bind `xp` once at import time, so the backend can still be
+    chosen afterwards with `set_backend` (or `RAYTRACING_BACKEND`) as long
+    as it happens before rendering starts.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_array_module(), name)
+
+
+xp = _ArrayModule()
@@ -0,0 +1,378 @@
+import numpy as np
+from utils.backend import xp, asnumpy
+from utils.hittable import Hittable
+from utils.sphere import Sphere
+from utils.sphere_set import SphereSet
+from utils.material import MaterialTable
+from utils import profiler, kernels, workspace
+
+
+def _writable(a):
+    # Arrays of a memory-mapped or shared scene are read-only views.
+    if getattr(a.flags, "writeable", True):
+        return a
+    return a.copy()
+
+
+class BVH(Hittable):
+    """Bounding volume hierarchy over the spheres of a `HittableList`.
+
+    The tree is built on the host with median splits and stored as flat
+    node arrays. `hit` walks it breadth-first for the whole ray list at
+    once, carrying (ray, node) pairs instead of one stack per ray, so only
+    spheres whose leaf boxes a ray actually enters are intersected.
+    """
+
+    def __init__(self, world, leaf_size = 4):
+        self.leaf_size = leaf_size
+        self.set_spheres(
+            *Sphere.pack(world.objects), world.get_material_table()
+        )
+
+    @staticmethod
+    def from_spheres(centers, radii, mat_ids, material_table, leaf_size = 4):
+        """Build over host sphere arrays without any `Sphere` objects."""
+        bvh = BVH.__new__(BVH)
+        bvh.leaf_size = leaf_size
+        bvh.set_spheres(centers, radii, mat_ids, material_table)
+        return bvh
+
+    def set_spheres(self, centers, radii, mat_ids, material_table):
+        order = self.build(centers, radii)
+        self.spheres = SphereSet(
+            centers[order], radii[order], mat_ids[order], material_table
+        )
+        self.set_order(order)
+        self.build_area = self.areas()
+
+    def set_order(self, order):
+        # Sphere i of the input is stored at slot[i].
+        self.order = np.asarray(order)
+        self.slot = xp.asarray(np.argsort(self.order))
+        self.levels = None
+
+    NODE_ARRAYS = ("lo", "hi", "left", "right", "start", "count")
+    SPHERE_ARRAYS = ("centers", "radii", "mat_ids")
+
+    def pack(self):
+        """Host copies of the node and sphere arrays, keyed by name."""
+        arrays = {name: getattr(self, name) for name in BVH.NODE_ARRAYS}
+        for name in BVH.SPHERE_ARRAYS:
+            arrays[name] = getattr(self.spheres, name)
+        arrays = {name: asnumpy(a) for name, a in arrays.items()}
+        arrays["order"] = self.order.astype(np.int32)
+        arrays.update(self.get_material_table().pack())
+        return arrays
+
+    @staticmethod
+    def from_arrays(arrays):
+        """Rebuild a BVH from `pack` output without rebuilding the tree."""
+        bvh = BVH.__new__(BVH)
+        bvh.leaf_size = max(int(arrays["count"].max(initial=0)), 1)
+        for name in BVH.NODE_ARRAYS:
+            setattr(bvh, name, xp.asarray(arrays[name]))
+        bvh.spheres = SphereSet(
+            *(arrays[name] for name in BVH.SPHERE_ARRAYS),
+            MaterialTable.from_arrays(arrays)
+        )
+        bvh.set_order(arrays["order"])
+        bvh.build_area = bvh.areas()
+        return bvh
+
+    def get_material_table(self):
+        return self.spheres.get_material_table()
+
+    def __len__(self):
+        return len(self.spheres)
+
+    def build(self, centers, radii):
+        extent = np.abs(radii)[:, None]
+        nodes, order = build_tree(
+            centers - extent, centers + extent, centers, self.leaf_size
+        )
+        for name, a in nodes.items():
+            setattr(self, name, xp.asarray(a))
+        return order
+
+    def internal_levels(self):
+        """Internal node indices by depth, root first, for `refit`."""
+        if self.levels is None:
+            count = asnumpy(self.count)
+            left, right = asnumpy(self.left), asnumpy(self.right)
+            self.levels = list()
+            node = np.zeros(1 if len(self) > 0 else 0, dtype=np.int32)
+            while len(node) > 0:
+                node = node[count[node] == 0]
+                if len(node) > 0:
+                    self.levels.append(xp.asarray(node))
+                node = np.concatenate([left[node], right[node]])
+        return self.levels
+
+    def refit(self):
+        """Recompute every node's box for the current spheres, bottom-up.
+
+        The topology is kept: leaf boxes are taken over their spheres in
+        `leaf_size` vectorized passes, then each level of internal nodes is
+        merged from its children, deepest level first.
+        """
+        extent = xp.abs(self.spheres.radii)[:, None]
+        prim_lo = self.spheres.centers - extent
+        prim_hi = self.spheres.centers + extent
+        lo = xp.empty_like(self.lo)
+        hi = xp.empty_like(self.hi)
+
+        leaf = xp.where(self.count > 0)[0]
+        first = self.start[leaf]
+        lo[leaf] = prim_lo[first]
+        hi[leaf] = prim_hi[first]
+        for k in range(1, self.leaf_size):
+            valid = k < self.count[leaf]
+            node, prim = leaf[valid], first[valid] + k
+            lo[node] = xp.minimum(lo[node], prim_lo[prim])
+            hi[node] = xp.maximum(hi[node], prim_hi[prim])
+
+        for node in reversed(self.internal_levels()):
+            left, right = self.left[node], self.right[node]
+            lo[node] = xp.minimum(lo[left], lo[right])
+            hi[node] = xp.maximum(hi[left], hi[right])
+        self.lo = lo
+        self.hi = hi
+        return self
+
+    def areas(self):
+        """Surface area (halved) of every node's box."""
+        d = xp.maximum(self.hi - self.lo, 0)
+        return d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0]
+
+    def inflation(self):
+        """Mean growth of the node boxes' areas since the tree was built.
+
+        Refitting keeps the topology, so spheres that move apart drag
+        their leaf and every ancestor box with them. Per node, a ray's
+        chance of entering a box grows with its area; the mean ratio tracks
+        that even in scenes where one huge sphere dominates the total.
+        """
+        if len(self) == 0:
+            return 1.0
+        return float((self.areas() / xp.maximum(self.build_area, 1e-12)).mean())
+
+    def update_spheres(self, centers = None, radii = None, idx = None, max_inflation = 2):
+        """Move and resize spheres in a batch, then refit or rebuild.
+
+        `centers` (M, 3) and `radii` (M,) replace the values of spheres
+        `idx` (indices in the order the BVH was built from; all of them by
+        default). The tree is refit, and rebuilt from scratch only if that
+        leaves its `inflation` above `max_inflation`. Returns whether it
+        was rebuilt.
+        """
+        slot = self.slot if idx is None else self.slot[xp.asarray(idx)]
+        spheres = self.spheres
+        if centers is not None:
+            spheres.centers = _writable(spheres.centers)
+            spheres.centers[slot] = xp.asarray(centers, dtype=xp.float32)
+        if radii is not None:
+            spheres.radii = _writable(spheres.radii)
+            spheres.radii[slot] = xp.asarray(radii, dtype=xp.float32)
+
+        with profiler.stage("refit"):
+            self.refit()
+        if self.inflation() <= max_inflation:
+            return False
+        with profiler.stage("rebuild"):
+            self.set_spheres(
+                asnumpy(spheres.centers[self.slot]),
+                asnumpy(spheres.radii[self.slot]),
+                asnumpy(spheres.mat_ids[self.slot]),
+                spheres.material_table
+            )
+        return True
+
+    def hit(self, r, t_min, t_max):
+        with profiler.stage("traversal"):
+            return self.traverse(r, t_min, t_max)
+
+    def traverse(self, r, t_min, t_max):
+        length = len(r)
+        if isinstance(t_max, (int, float, xp.floating)):
+            closest_so_far = workspace.full("hit.t", length, t_max)
+        else:
+            closest_so_far = workspace.empty("hit.t", length)
+            closest_so_far[...] = t_max
+        origin = r.origin().e
+        direction = r.direction().e
+        if kernels.enabled():
+            with profiler.stage("intersection"):
+                prim = kernels.closest_hit_bvh(
+                    origin, direction, t_min, closest_so_far, self,
+                    workspace.empty("hit.prim", length, xp.int32)
+                )
+            with profiler.stage("hit_record"):
+                return self.spheres.hit_record(r, closest_so_far, prim)
+
+        prim = workspace.full("hit.prim", length, -1, xp.int32)
+        walk(
+            self, self.spheres.intersect, origin, direction, t_min,
+            closest_so_far, prim
+        )
+        with profiler.stage("hit_record"):
+            return self.spheres.hit_record(r, closest_so_far, prim)
+
+
+def build_tree(prim_lo, prim_hi, centers, leaf_size):
+    """Median-split tree over primitive boxes, as flat host node arrays.
+
+    Returns the arrays (keyed by `BVH.NODE_ARRAYS` names) and the order
+    the primitives must be stored in: leaf `i` covers primitives
+    `start[i]:start[i] + count[i]` of it. Children always follow their
+    parent.
+    """
+    n = len(centers)
+    max_nodes = max(2 * n - 1, 1)
+    lo = np.zeros((max_nodes, 3), dtype=np.float32)
+    hi = np.zeros((max_nodes, 3), dtype=np.float32)
+    left = np.zeros(max_nodes, dtype=np.int32)
+    right = np.zeros(max_nodes, dtype=np.int32)
+    start = np.zeros(max_nodes, dtype=np.int32)
+    count = np.zeros(max_nodes, dtype=np.int32)
+
+    order = np.arange(n)
+    node_count = 1
+    stack = [(0, 0, n)] if n > 0 else []
+    while stack:
+        node, begin, end = stack.pop()
+        prims = order[begin:end]
+        lo[node] = prim_lo[prims].min(axis=0)
+        hi[node] = prim_hi[prims].max(axis=0)
+        if end - begin <= leaf_size:
+            start[node] = begin
+            count[node] = end - begin
+            continue
+
+        c = centers[prims]
+        axis = np.argmax(c.max(axis=0) - c.min(axis=0))
+        mid = (end - begin) // 2
+        order[begin:end] = prims[np.argpartition(c[:, axis], mid)]
+
+        left[node] = node_count
+        right[node] = node_count + 1
+        stack.append((node_count, begin, begin + mid))
+        stack.append((node_count + 1, begin + mid, end))
+        node_count += 2
+
+    nodes = dict(
+        lo=lo, hi=hi, left=left, right=right, start=start, count=count
+    )
+    return {name: a[:node_count] for name, a in nodes.items()}, order
+
+
+def walk(tree, intersect, origin, direction, t_min, closest_so_far, prim):
+    """Breadth-first closest-hit walk of `tree`'s node arrays.
+
+    All rays go down together as (ray, node) pairs. The primitives of each
+    leaf a ray enters are tested with `intersect(o, d, candidate, t_min,
+    t_max)`, which returns the hit distance or inf; `closest_so_far` and
+    `prim` are updated in place. The frontier and its per-level
+    temporaries are workspace buffers, so a warm workspace serves every
+    level without allocating them again.
+    """
+    ray = xp.flatnonzero(xp.einsum("ij,ij->i", direction, direction) > 0)
+    if len(tree) == 0:
+        ray = ray[:0]
+    inv_direction = workspace.empty(
+        "walk.inv_direction", direction.shape, direction.dtype
+    )
+    inv_direction[...] = direction
+    inv_direction[direction == 0] = 1e-20
+    xp.divide(1, inv_direction, out=inv_direction)
+    node = workspace.zeros("walk.node", len(ray), xp.int32)
+
+    while len(ray) > 0:
+        n = len(ray)
+        o = workspace.take("walk.o", origin, ray)
+        inv = workspace.take("walk.inv", inv_direction, ray)
+        dtype = xp.result_type(tree.lo, o, inv)
+        t_0 = workspace.empty("walk.t_0", (n, 3), dtype)
+        t_1 = workspace.empty("walk.t_1", (n, 3), dtype)
+        xp.subtract(workspace.take("walk.box", tree.lo, node), o, out=t_0)
+        xp.subtract(workspace.take("walk.box", tree.hi, node), o, out=t_1)
+        t_0 *= inv
+        t_1 *= inv
+        t_far = xp.maximum(
+            t_0, t_1, out=workspace.empty("walk.t_max", (n, 3), dtype)
+        ).min(axis=1, out=workspace.empty("walk.t_far", n, dtype))
+        t_near = xp.minimum(t_0, t_1, out=t_0).max(
+            axis=1, out=workspace.empty("walk.t_near", n, dtype)
+        )
+        enter = xp.less_equal(
+            t_near, t_far, out=workspace.empty("walk.enter", n, xp.bool_)
+        )
+        test = workspace.empty("walk.test", n, xp.bool_)
+        enter &= xp.greater(t_far, t_min, out=test)
+        enter &= xp.less(
+            t_near, workspace.take("walk.closest", closest_so_far, ray),
+            out=test
+        )
+        entered = xp.flatnonzero(enter)
+        ray = workspace.take("walk.entered_ray", ray, entered)
+        node = workspace.take("walk.entered_node", node, entered)
+
+        leaf = xp.greater(
+            workspace.take("walk.count", tree.count, node), 0,
+            out=workspace.empty("walk.leaf", len(node), xp.bool_)
+        )
+        idx = xp.flatnonzero(leaf)
+        with profiler.stage("intersection"):
+            hit_leaves(
+                tree, intersect, workspace.take("walk.leaf_ray", ray, idx),
+                workspace.take("walk.leaf_node", node, idx), origin,
+                direction, t_min, closest_so_far, prim
+            )
+
+        # Both children of every internal node entered form the next level.
+        idx = xp.flatnonzero(xp.logical_not(leaf, out=leaf))
+        k = len(idx)
+        inner = workspace.take("walk.inner", node, idx)
+        next_ray = workspace.empty("walk.ray", 2 * k, ray.dtype)
+        workspace.gather(ray, idx, next_ray[:k])
+        next_ray[k:] = next_ray[:k]
+        node = workspace.empty("walk.node", 2 * k, xp.int32)
+        workspace.gather(tree.left, inner, node[:k])
+        workspace.gather(tree.right, inner, node[k:])
+        ray = next_ray
+
+
+def hit_leaves(tree, intersect, ray, node, origin, direction, t_min, closest_so_far, prim):
+    count = workspace.take("leaves.count", tree.count, node)
+    first = workspace.take("leaves.start", tree.start, node)
+    total = int(count.sum())
+    if total == 0:
+        return
+    # (ray, primitive) pairs, grouped by the primitive's place in its leaf.
+    pair_ray = workspace.empty("leaves.ray", total, ray.dtype)
+    candidate = workspace.empty("leaves.candidate", total, first.dtype)
+    valid = workspace.empty("leaves.valid", len(node), xp.bool_)
+    offset = 0
+    for k in range(tree.leaf_size):
+        idx = xp.flatnonzero(xp.greater(count, k, out=valid))
+        end = offset + len(idx)
+        workspace.gather(ray, idx, pair_ray[offset:end])
+        workspace.gather(first, idx, candidate[offset:end])
+        candidate[offset:end] += k
+        offset = end
+
+    t = intersect(
+        workspace.take("leaves.o", origin, pair_ray),
+        workspace.take("leaves.d", direction, pair_ray), candidate, t_min,
+        workspace.take("leaves.t_max", closest_so_far, pair_ray)
+    )
+    hit = xp.flatnonzero(xp.isfinite(t))
+    ray, candidate, t = pair_ray[hit], candidate[hit], t[hit]
+
+    # Several leaves may report a hit for the same ray: keep the nearest.
+    order = xp.lexsort(xp.stack([t, ray]))
+    ray, candidate, t = ray[order], candidate[order], t[order]
+    first = xp.ones(len(ray), dtype=xp.bool_)
+    first[1:] = ray[1:] != ray[:-1]
+
+    closest_so_far[ray[first]] = t[first]
+    prim[ray[first]] = candidate[first]
@@ -0,0 +1,38 @@
+from utils.accumulator import Accumulator
+from utils import array_file
+
+MAGIC = b"RTCKPT\0\0"
+VERSION = 1
+
+
+def save_checkpoint(path, accumulator, next_sample, **settings):
+    """Write the state of a render in progress to `path`, atomically.
+
+    The file is an `array_file` of the `Accumulator.pack` arrays (sample
+    counts, running mean and M2, feature sums). Its header records
+    `next_sample`, which is the position of the seeded random streams:
+    they are keyed by sample index, so nothing else is needed to continue
+    them. `settings` (seed, depth, ...) are stored for `load_checkpoint`
+    to check.
+    """
+    array_file.write(
+        path, MAGIC, VERSION, accumulator.pack(),
+        next_sample=next_sample, settings=settings
+    )
+
+
+def load_checkpoint(path, **settings):
+    """Read a `save_checkpoint` file; returns (Accumulator, next_sample).
+
+    Raises ValueError if any of `settings` differs from what the checkpoint
+    was written with, since continuing it would mix two different renders.
+    """
+    header, arrays = array_file.read(path, MAGIC, VERSION, "render checkpoint")
+    stored = header["settings"]
+    for name, value in settings.items():
+        if stored.get(name) != value:
+            raise ValueError(
+                f"{path} was rendered with {name}={stored.get(name)!r}, "
+                f"not {value!r}"
+            )
+    return Accumulator.from_arrays(arrays), header["next_sample"]
@@ -0,0 +1,405 @@
+import json
+import time
+import socket
+import struct
+import asyncio
+import itertools
+import collections
+import numpy as np
+from utils.bvh import BVH
+from utils.accumulator import Accumulator
+from utils.render import scan_tile, Features
+from utils.scene_file import scene_camera
+from utils import kernels, workspace
+
+# Byte lengths of the JSON header and of the raw arrays after it.
+FRAME = struct.Struct("<II")
+
+
+def encode(header, arrays = None):
+    """A message: JSON `header` plus host `arrays` as raw bytes.
+
+    The array layout goes in the header, so nothing but JSON and plain
+    buffers crosses the wire.
+    """
+    arrays = arrays or dict()
+    header = dict(header, arrays=[
+        (name, a.dtype.str, a.shape) for name, a in arrays.items()
+    ])
+    header = json.dumps(header).encode()
+    payload = b"".join(np.ascontiguousarray(a).tobytes() for a in arrays.values())
+    return FRAME.pack(len(header), len(payload)) + header + payload
+
+
+def decode(header, payload):
+    header = json.loads(header)
+    arrays = dict()
+    offset = 0
+    for name, dtype, shape in header.pop("arrays"):
+        a = np.ndarray(shape, dtype, buffer=payload, offset=offset)
+        arrays[name] = a
+        offset += a.nbytes
+    return header, arrays
+
+
+async def read_message(reader):
+    header_size, payload_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+    header = await reader.readexactly(header_size)
+    return decode(header, await reader.readexactly(payload_size))
+
+
+def receive(stream):
+    """`read_message` for a blocking socket file."""
+    frame = stream.read(FRAME.size)
+    if len(frame) < FRAME.size:
+        raise ConnectionError("Coordinator closed the connection")
+    header_size, payload_size = FRAME.unpack(frame)
+    header = stream.read(header_size)
+    payload = stream.read(payload_size)
+    if len(payload) < payload_size:
+        raise ConnectionError("Coordinator closed the connection")
+    return decode(header, payload)
+
+
+class Frame:
+    """Work units of one render and the partial results merged so far.
+
+    A unit is (tile index, chunk index, first sample, end sample). Each
+    tile's chunks are merged in chunk order, so the result does not depend
+    on which worker rendered what or when.
+    """
+
+    def __init__(self, settings, tiles, samples, unit_samples, features):
+        self.settings = settings
+        self.tiles = tiles
+        self.units = [
+            (t, c, s, min(s + unit_samples, samples))
+            for t in range(len(tiles))
+            for c, s in enumerate(range(0, samples, unit_samples))
+        ]
+        self.accumulator = Accumulator(
+            settings["width"], settings["height"], features
+        )
+        self.unassigned = collections.deque()
+        self.reissued = set()
+        self.attempts = collections.Counter()
+        self.done = set()
+        self.pending = dict()
+        self.next_chunk = [0] * len(tiles)
+        self.finished = asyncio.Event()
+        self.error = None
+
+    def fail(self, message):
+        """End the frame; `Coordinator.render` raises RuntimeError(message)."""
+        if not self.finished.is_set():
+            self.error = RuntimeError(message)
+            self.finished.set()
+
+    def complete(self, unit, arrays):
+        """Keep a unit's partial accumulation; False if it was already done."""
+        if unit in self.done:
+            return False
+        self.done.add(unit)
+        t = unit[0]
+        self.pending[t, unit[1]] = Accumulator.from_arrays(arrays)
+        while (t, self.next_chunk[t]) in self.pending:
+            x, y, _, _ = self.tiles[t]
+            self.accumulator.merge(self.pending.pop((t, self.next_chunk[t])), x, y)
+            self.next_chunk[t] += 1
+        if len(self.done) == len(self.units):
+            self.finished.set()
+        return True
+
+
+class WorkerState:
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.queue = collections.deque()
+        self.in_flight = None
+        self.started = None
+        self.units = 0
+
+
+class Coordinator:
+    """Hands (tile, sample range) work units to TCP workers.
+
+    Each `render` splits the frame into `tile_size` tiles and
+    `unit_samples` sample chunks and deals them out to the connected
+    workers in contiguous blocks. A worker pulls units from its own block;
+    once that is empty it steals from the back of the longest remaining
+    one. Workers that join mid-frame start by stealing.
+
+    A worker's unit in flight and its undone block are re-issued when its
+    connection drops, and a unit in flight longer than `unit_timeout`
+    seconds is re-issued to whoever asks next (the first result wins).
+    A unit that has been lost or stalled `max_attempts` times (one that
+    crashes every worker it is sent to) fails the frame, and so does
+    losing the last worker or having every worker stall. Finished units are merged into one
+    `Accumulator` with `Accumulator.merge`.
+
+    Workers trust the coordinator and vice versa: there is no
+    authentication, so listen on localhost or a private network only.
+    """
+
+    def __init__(self, world, unit_timeout = 60, max_attempts = 3):
+        if not isinstance(world, BVH):
+            world = BVH(world)
+        self.scene = encode(dict(type="scene"), world.pack())
+        self.unit_timeout = unit_timeout
+        self.max_attempts = max_attempts
+        self.workers = dict()
+        self.worker_ids = itertools.count()
+        self.frame = None
+        self.work = None
+        self.server = None
+        self.closed = False
+        self.handlers = set()
+        self.stats = collections.Counter()
+
+    async def start(self, host = "127.0.0.1", port = 0):
+        """Listen for workers; returns the (host, port) bound."""
+        self.work = asyncio.Condition()
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stop listening and disconnect the workers, which then exit.
+
+        Workers still busy (or stuck) on a unit are disconnected too.
+        """
+        self.closed = True
+        async with self.work:
+            self.work.notify_all()
+        self.server.close()
+        for worker in list(self.workers.values()):
+            worker.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        worker = WorkerState(f"worker-{next(self.worker_ids)}", writer)
+        self.workers[worker.name] = worker
+        self.handlers.add(asyncio.current_task())
+        try:
+            writer.write(self.scene)
+            await writer.drain()
+            while True:
+                frame, unit = await self.next_unit(worker)
+                if unit is None:
+                    break
+                worker.in_flight, worker.started = unit, time.perf_counter()
+                frame.attempts[unit] += 1
+                writer.write(encode(dict(
+                    type="unit", unit=unit, tile=frame.tiles[unit[0]],
+                    **frame.settings
+                )))
+                await writer.drain()
+                header, arrays = await read_message(reader)
+                worker.in_flight = None
+                if frame.complete(tuple(header["unit"]), arrays):
+                    worker.units += 1
+                    self.stats["units"] += 1
+                else:
+                    self.stats["duplicates"] += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.workers[worker.name]
+            await self.reissue(worker)
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    async def next_unit(self, worker):
+        """The next unit for `worker`: its own, stolen, or re-issued.
+
+        Waits while there is no work; (None, None) once closed.
+        """
+        async with self.work:
+            while not self.closed:
+                frame = self.frame
+                if frame is not None and not frame.finished.is_set():
+                    unit = self.take(frame, worker)
+                    if unit is not None:
+                        return frame, unit
+                await self.work.wait()
+        return None, None
+
+    def take(self, frame, worker):
+        while worker.queue:
+            unit = worker.queue.popleft()
+            if unit not in frame.done:
+                return unit
+        while frame.unassigned:
+            unit = frame.unassigned.popleft()
+            if unit not in frame.done:
+                return unit
+        while True:
+            victim = max(
+                self.workers.values(), key=lambda other: len(other.queue)
+            )
+            if not victim.queue:
+                return None
+            unit = victim.queue.pop()
+            if unit not in frame.done:
+                self.stats["stolen"] += 1
+                return unit
+
+    async def reissue(self, worker):
+        frame = self.frame
+        if frame is None or frame.finished.is_set():
+            return
+        units = list(worker.queue)
+        unit = worker.in_flight
+        # A unit this worker stalled on was re-issued already; a copy may
+        # still be running elsewhere, so losing this one is no new attempt.
+        if (
+            unit is not None and unit not in frame.done
+            and (worker.name, unit) not in frame.reissued
+        ):
+            if frame.attempts[unit] >= self.max_attempts:
+                frame.fail(
+                    f"Unit {unit} was lost by {frame.attempts[unit]} "
+                    f"workers; giving up on the frame"
+                )
+                return
+            units.insert(0, unit)
+            self.stats["reissued"] += 1
+        worker.queue.clear()
+        worker.in_flight = None
+        if not self.workers and not self.closed:
+            frame.fail("All workers disconnected before the frame was done")
+            return
+        async with self.work:
+            frame.unassigned.extend(units)
+            self.work.notify_all()
+
+    async def render(self, view, image_width, image_height, samples, max_depth, seed = None, tile_size = 64, unit_samples = 4, features = False):
+        """Render a frame on the connected workers; returns its `Accumulator`.
+
+        `view` holds the `scene_camera` arguments. Seeded renders give the
+        same result for any number of workers and any failures that still
+        let the frame finish. Raises RuntimeError if there are no workers,
+        or if the frame fails (see the class docstring).
+        """
+        if not self.workers:
+            raise RuntimeError("No workers connected")
+        tiles = [
+            (x, y, min(tile_size, image_width - x), min(tile_size, image_height - y))
+            for y in range(0, image_height, tile_size)
+            for x in range(0, image_width, tile_size)
+        ]
+        settings = dict(
+            view=view, width=image_width, height=image_height,
+            max_depth=max_depth, seed=seed, features=features
+        )
+        frame = Frame(settings, tiles, samples, unit_samples, features)
+        workers = list(self.workers.values())
+        async with self.work:
+            self.frame = frame
+            for worker in workers:
+                worker.queue.clear()
+            blocks = np.array_split(np.arange(len(frame.units)), len(workers))
+            for worker, block in zip(workers, blocks):
+                worker.queue.extend(frame.units[i] for i in block)
+            self.work.notify_all()
+
+        while not frame.finished.is_set():
+            try:
+                await asyncio.wait_for(frame.finished.wait(), 1)
+            except asyncio.TimeoutError:
+                await self.reissue_stalled(frame)
+        if frame.error is not None:
+            raise frame.error
+        return frame.accumulator
+
+    async def reissue_stalled(self, frame):
+        now = time.perf_counter()
+        stalled = [
+            (worker.name, worker.in_flight) for worker in self.workers.values()
+            if worker.in_flight is not None
+            and worker.in_flight not in frame.done
+            and (worker.name, worker.in_flight) not in frame.reissued
+            and now - worker.started > self.unit_timeout
+        ]
+        for _, unit in stalled:
+            if frame.attempts[unit] >= self.max_attempts:
+                frame.fail(
+                    f"Unit {unit} stalled on {frame.attempts[unit]} "
+                    f"workers; giving up on the frame"
+                )
+                return
+        if all(
+            worker.in_flight is not None
+            and now - worker.started > self.unit_timeout
+            for worker in self.workers.values()
+        ):
+            frame.fail(
+                f"Every worker has been on its unit for more than "
+                f"{self.unit_timeout} s; giving up on the frame"
+            )
+            return
+        if stalled:
+            frame.reissued.update(stalled)
+            self.stats["reissued"] += len(stalled)
+            async with self.work:
+                frame.unassigned.extend(unit for _, unit in stalled)
+                self.work.notify_all()
+
+
+def run_worker(host, port, threads = None, retry_seconds = 10):
+    """Connect to a `Coordinator` and render the units it sends until it closes.
+
+    Connecting is retried for `retry_seconds`, so workers can be started
+    before the coordinator listens.
+    """
+    if threads is not None:
+        kernels.set_threads(threads)
+    deadline = time.perf_counter() + retry_seconds
+    while True:
+        try:
+            connection = socket.create_connection((host, port))
+            break
+        except ConnectionRefusedError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.1)
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    stream = connection.makefile("rb")
+    cameras = dict()
+    try:
+        _, arrays = receive(stream)
+        world = BVH.from_arrays(arrays)
+        with workspace.use():
+            while True:
+                try:
+                    unit, _ = receive(stream)
+                except ConnectionError:
+                    break
+                key = json.dumps(unit["view"], sort_keys=True), unit["width"], unit["height"]
+                if key not in cameras:
+                    cameras[key] = scene_camera(
+                        unit["view"], unit["width"] / unit["height"]
+                    )
+                accumulator = render_unit(world, cameras[key], unit)
+                connection.sendall(encode(
+                    dict(type="result", unit=unit["unit"]), accumulator.pack()
+                ))
+    finally:
+        stream.close()
+        connection.close()
+
+
+def render_unit(world, cam, unit):
+    """Accumulate one unit's samples of its tile."""
+    _, _, first_sample, end_sample = unit["unit"]
+    x, y, w, h = unit["tile"]
+    accumulator = Accumulator(w, h, unit["features"])
+    for s in range(first_sample, end_sample):
+        features = Features(w * h) if unit["features"] else None
+        tile = scan_tile(
+            world, cam, unit["width"], unit["height"], x, y, w, h,
+            unit["max_depth"], unit["seed"], s, features
+        )
+        accumulator.add(0, 0, w, h, tile, features)
+    return accumulator
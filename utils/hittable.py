@@ -1,7 +1,8 @@
-import cupy as cp
+from utils.backend import xp
 from abc import ABC, abstractmethod
 from utils.vec3 import Vec3, Point3, Vec3List
 from utils.ray import Ray, RayList
+from utils import workspace
 
 
 class HitRecord:
@@ -19,7 +20,7 @@ class HitRecord:
 
 
 class HitRecordList:
-    def __init__(self, point, t, mat, normal = Vec3List.new_zero(0), front_face = cp.array([])):
+    def __init__(self, point, t, mat, normal = Vec3List.new_zero(0), front_face = xp.array([])):
         self.p = point
         self.t = t
         self.material = mat
@@ -27,9 +28,8 @@ class HitRecordList:
         self.front_face = front_face
 
     def set_face_normal(self, r, outward_normal):
-        self.front_face = (r.direction() * outward_normal).e.sum(axis=1) < 0
-        front_face_3 = Vec3List.from_array(self.front_face)
-        self.normal = Vec3List(cp.where(front_face_3.e, outward_normal.e, -outward_normal.e))
+        self.front_face = (r.direction() @ outward_normal) < 0
+        self.normal = Vec3List(xp.where(self.front_face[:, None], outward_normal.e, -outward_normal.e))
         return self
 
     def __getitem__(self, idx):
@@ -60,49 +60,55 @@ class HitRecordList:
         self.idx += 1
         return result
 
-    def set_compress_info(self, idx):
-        self.compress_idx = idx
-        return self
+    def take(self, idx):
+        return HitRecordList(
+            Vec3List(self.p.get_ndarray(idx)),
+            self.t[idx],
+            self.material[idx],
+            Vec3List(self.normal.get_ndarray(idx)),
+            self.front_face[idx]
+        )
 
     def update(self, new):
-        if new.compress_idx is not None:
-            idx = new.compress_idx
-            old_idx = cp.arange(len(idx))
-        else:
-            idx = slice(0, -1)
-            old_idx = slice(0, -1)
-
-        change = (new.t[old_idx] < self.t[idx]) & (new.t[old_idx] > 0)
+        """Keep the closer hit of `self` and `new` for each ray."""
+        change = (new.t < self.t) & (new.t > 0)
         if not change.any():
             return self
-        change_3 = Vec3List.from_array(change)
+        change_3 = change[:, None]
 
-        self.p.e[idx] = cp.where(change_3.e, new.p.e[old_idx], self.p.e[idx])
-        self.t[idx] = cp.where(change, new.t[old_idx], self.t[idx])
-        self.material[idx] = cp.where(change, new.material[old_idx], self.material[idx])
-        self.normal.e[idx] = cp.where(change_3.e, new.normal.e[old_idx], self.normal.e[idx])
-        self.front_face[idx] = cp.where(change, new.front_face[old_idx], self.front_face[idx])
+        self.p.e[...] = xp.where(change_3, new.p.e, self.p.e)
+        self.t[...] = xp.where(change, new.t, self.t)
+        self.material[...] = xp.where(change, new.material, self.material)
+        self.normal.e[...] = xp.where(change_3, new.normal.e, self.normal.e)
+        self.front_face[...] = xp.where(change, new.front_face, self.front_face)
         return self
 
     @staticmethod
-    def new(length):
-        return HitRecordList(
-            Vec3List.new_empty(length),
-            cp.zeros(length, dtype=cp.float32),
-            cp.zeros(length, dtype=cp.int32),
-            Vec3List.new_empty(length),
-            cp.empty(length, dtype=cp.bool)
-        )
+    def new(length, name = None):
+        """An empty record; with `name`, its fields are workspace buffers."""
+        if name is None:
+            t = xp.zeros(length, dtype=xp.float32)
+        else:
+            t = workspace.zeros(f"{name}.t", length)
+        return HitRecordList.new_from_t(t, name)
 
     @staticmethod
-    def new_from_t(t):
+    def new_from_t(t, name = None):
         length = len(t)
+        if name is None:
+            return HitRecordList(
+                Vec3List.new_empty(length),
+                t,
+                xp.zeros(length, dtype=xp.int32),
+                Vec3List.new_empty(length),
+                xp.empty(length, dtype=xp.bool_)
+            )
         return HitRecordList(
-            Vec3List.new_empty(length),
+            Vec3List(workspace.empty(f"{name}.p", (length, 3))),
             t,
-            cp.zeros(length, dtype=cp.int32),
-            Vec3List.new_empty(length),
-            cp.empty(length, dtype=cp.bool)
+            workspace.zeros(f"{name}.material", length, xp.int32),
+            Vec3List(workspace.empty(f"{name}.normal", (length, 3))),
+            workspace.empty(f"{name}.front_face", length, xp.bool_)
         )
 
 class Hittable(ABC):
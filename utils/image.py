@@ -1,17 +1,32 @@
+import io
+import os
 import numpy as np
 from PIL import Image
 from utils.vec3 import Color, Vec3List
 
+# B3-spline taps of the a-trous wavelet filter.
+ATROUS_KERNEL = (1 / 16, 1 / 4, 3 / 8, 1 / 4, 1 / 16)
+
 
 class Img:
     def __init__(self, w, h):
         self.w = w
         self.h = h
         self.frame = np.zeros((h, w, 3), dtype=np.float64)
+        self.normal = None
+        self.albedo = None
+        self.depth = None
+        self.variance = None
 
     def set_frame(self, array):
         self.frame = array
 
+    def set_features(self, normal, albedo, depth, variance):
+        self.normal = normal
+        self.albedo = albedo
+        self.depth = depth
+        self.variance = variance
+
     def write_pixel(self, w, h, pixel_color, samples_per_pixel):
         color = pixel_color / samples_per_pixel
         self.frame[h][w] = color.clamp(0, 0.999).gamma(2).e
@@ -25,16 +40,89 @@ class Img:
         self.frame += frame.e.reshape((self.h, self.w, 3))
         return self
 
+    def write_tile(self, x, y, w, h, tile):
+        self.frame[y:y + h, x:x + w] += tile.e.reshape((h, w, 3))
+        return self
+
+    def add(self, img):
+        self.frame += img.frame
+        return self
+
     def average(self, samples_per_pixel):
         self.frame /= samples_per_pixel
         return self
 
+    def denoise(self, iterations = 5, sigma_color = 4, sigma_normal = 1, sigma_albedo = 0.3, sigma_depth = 0.05):
+        """Edge-avoiding a-trous wavelet filter (Dammertz et al. 2010).
+
+        Each iteration is a 5x5 B3-spline blur with holes of 2**i pixels,
+        where every tap is weighted down by how much its normal, albedo and
+        relative depth differ from the center pixel, and by its color
+        difference measured in standard deviations of the center's
+        estimate (as in SVGF), so converged pixels are left mostly alone.
+        The variance is filtered along with the color.
+        """
+        if self.normal is None:
+            raise ValueError("denoise needs the feature buffers (set_features)")
+
+        guides = (
+            (self.normal, sigma_normal),
+            (self.albedo, sigma_albedo),
+            (self.depth[:, :, None] / (self.depth.mean() + 1e-6), sigma_depth),
+        )
+        color = self.frame
+        variance = self.variance
+        for i in range(iterations):
+            step = 2 ** i
+            pad = ((2 * step, 2 * step), (2 * step, 2 * step))
+            padded_color = np.pad(color, pad + ((0, 0),), "edge")
+            padded_variance = np.pad(variance, pad, "edge")
+            padded_guides = [
+                (np.pad(g, pad + ((0, 0),), "edge"), g, sigma)
+                for g, sigma in guides
+            ]
+            color_scale = sigma_color * np.sqrt(variance) + 1e-4
+
+            total = np.zeros_like(color)
+            total_variance = np.zeros_like(variance)
+            weight_sum = np.zeros_like(variance)
+            for dy, ky in enumerate(ATROUS_KERNEL):
+                for dx, kx in enumerate(ATROUS_KERNEL):
+                    window = (
+                        slice(dy * step, dy * step + self.h),
+                        slice(dx * step, dx * step + self.w)
+                    )
+                    tap = padded_color[window]
+                    distance = np.sqrt(((tap - color) ** 2).sum(axis=2)) / color_scale
+                    for padded, center, sigma in padded_guides:
+                        distance += ((padded[window] - center) ** 2).sum(axis=2) / sigma**2
+                    weight = ky * kx * np.exp(-distance)
+                    total += weight[:, :, None] * tap
+                    total_variance += weight**2 * padded_variance[window]
+                    weight_sum += weight
+            color = total / weight_sum[:, :, None]
+            variance = total_variance / weight_sum**2
+
+        self.frame = color
+        return self
+
     def gamma(self, gamma):
         self.frame = np.clip(self.frame, 0, 0.999) ** (1 / gamma)
         return self
 
+    def encode(self, format = "PNG"):
+        """The image as the bytes of a `format` file, for sending rather than saving."""
+        buffer = io.BytesIO()
+        Image.fromarray(np.uint8(self.frame * 255)).save(buffer, format)
+        return buffer.getvalue()
+
     def save(self, path, show = False):
         im = Image.fromarray(np.uint8(self.frame * 255))
-        im.save(path)
+        # Write next to the target and rename, so a reader polling `path`
+        # never sees a half-written file.
+        root, ext = os.path.splitext(path)
+        partial = f"{root}.partial{ext}"
+        im.save(partial)
+        os.replace(partial, path)
         if show:
             im.show()
@@ -0,0 +1,259 @@
+"""Optional Numba kernels that fuse the NumPy hot paths into single loops.
+
+Each array-op step of `SphereSet.hit`, `BVH.hit` and `MaterialTable.scatter`
+is a full pass over the rays with its own temporaries. The kernels here do
+the same work in one loop per ray instead. They are used only on the NumPy
+backend, when Numba can be imported and `RAYTRACING_JIT` is not "0";
+otherwise callers keep the vectorized path. Results match it to float
+rounding: the kernels compute in a different order.
+"""
+import os
+import math
+import numpy as np
+from utils.backend import is_gpu
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+JIT_ENV = "RAYTRACING_JIT"
+# Deep enough for a median-split tree over 2**62 primitives.
+STACK_SIZE = 64
+
+
+def set_enabled(enabled):
+    # Worker processes pick the setting up from the environment.
+    os.environ[JIT_ENV] = "1" if enabled else "0"
+
+
+def enabled():
+    return (
+        numba is not None and os.environ.get(JIT_ENV, "1") != "0"
+        and not is_gpu()
+    )
+
+
+def set_threads(n):
+    """Threads per kernel launch; pool workers use one each."""
+    if numba is not None:
+        numba.set_num_threads(min(n, numba.config.NUMBA_NUM_THREADS))
+
+
+def _jit(fn):
+    if numba is None:
+        return fn
+    return numba.njit(parallel=True, cache=True)(fn)
+
+
+prange = range if numba is None else numba.prange
+
+
+def _sphere_t(ox, oy, oz, dx, dy, dz, cx, cy, cz, radius, t_min, t_max):
+    ocx, ocy, ocz = ox - cx, oy - cy, oz - cz
+    a = dx * dx + dy * dy + dz * dz
+    half_b = ocx * dx + ocy * dy + ocz * dz
+    c = ocx * ocx + ocy * ocy + ocz * ocz - radius * radius
+    discriminant = half_b * half_b - a * c
+    if discriminant <= 0:
+        return np.inf
+    root = math.sqrt(discriminant)
+    t = (-half_b - root) / a
+    if t_min < t < t_max:
+        return t
+    t = (-half_b + root) / a
+    if t_min < t < t_max:
+        return t
+    return np.inf
+
+
+if numba is not None:
+    _sphere_t = numba.njit(inline="always")(_sphere_t)
+
+
+@_jit
+def _closest_hit_all(origin, direction, t_min, closest, prim, centers, radii):
+    for i in prange(len(origin)):
+        ox, oy, oz = origin[i, 0], origin[i, 1], origin[i, 2]
+        dx, dy, dz = direction[i, 0], direction[i, 1], direction[i, 2]
+        if dx == 0 and dy == 0 and dz == 0:
+            continue
+        for s in range(len(radii)):
+            t = _sphere_t(
+                ox, oy, oz, dx, dy, dz,
+                centers[s, 0], centers[s, 1], centers[s, 2], radii[s],
+                t_min, closest[i]
+            )
+            if t < closest[i]:
+                closest[i] = t
+                prim[i] = s
+
+
+@_jit
+def _closest_hit_bvh(origin, direction, t_min, closest, prim, lo, hi, left, right, start, count, centers, radii):
+    for i in prange(len(origin)):
+        ox, oy, oz = origin[i, 0], origin[i, 1], origin[i, 2]
+        dx, dy, dz = direction[i, 0], direction[i, 1], direction[i, 2]
+        if dx == 0 and dy == 0 and dz == 0:
+            continue
+        ix = 1 / (dx if dx != 0 else 1e-20)
+        iy = 1 / (dy if dy != 0 else 1e-20)
+        iz = 1 / (dz if dz != 0 else 1e-20)
+
+        stack = np.empty(STACK_SIZE, dtype=np.int32)
+        stack[0] = 0
+        top = 1
+        while top > 0:
+            top -= 1
+            node = stack[top]
+            t_0, t_1 = (lo[node, 0] - ox) * ix, (hi[node, 0] - ox) * ix
+            t_near, t_far = min(t_0, t_1), max(t_0, t_1)
+            t_0, t_1 = (lo[node, 1] - oy) * iy, (hi[node, 1] - oy) * iy
+            t_near, t_far = max(t_near, min(t_0, t_1)), min(t_far, max(t_0, t_1))
+            t_0, t_1 = (lo[node, 2] - oz) * iz, (hi[node, 2] - oz) * iz
+            t_near, t_far = max(t_near, min(t_0, t_1)), min(t_far, max(t_0, t_1))
+            if not (t_near <= t_far and t_far > t_min and t_near < closest[i]):
+                continue
+
+            if count[node] > 0:
+                for s in range(start[node], start[node] + count[node]):
+                    t = _sphere_t(
+                        ox, oy, oz, dx, dy, dz,
+                        centers[s, 0], centers[s, 1], centers[s, 2], radii[s],
+                        t_min, closest[i]
+                    )
+                    if t < closest[i]:
+                        closest[i] = t
+                        prim[i] = s
+            else:
+                stack[top] = right[node]
+                stack[top + 1] = left[node]
+                top += 2
+
+
+def _prim(length, prim):
+    if prim is None:
+        prim = np.empty(length, dtype=np.int32)
+    prim.fill(-1)
+    return prim
+
+
+def closest_hit(origin, direction, t_min, closest, centers, radii, prim = None):
+    """Nearest sphere of every ray by testing all of them.
+
+    `closest` holds each ray's t_max and is updated in place; returns the
+    sphere index per ray, -1 on a miss, in `prim` when it is given.
+    """
+    prim = _prim(len(origin), prim)
+    _closest_hit_all(
+        origin, direction, np.float32(t_min), closest, prim, centers, radii
+    )
+    return prim
+
+
+def closest_hit_bvh(origin, direction, t_min, closest, bvh, prim = None):
+    """`closest_hit` with a depth-first walk of `bvh`'s node arrays."""
+    prim = _prim(len(origin), prim)
+    spheres = bvh.spheres
+    _closest_hit_bvh(
+        origin, direction, np.float32(t_min), closest, prim,
+        bvh.lo, bvh.hi, bvh.left, bvh.right, bvh.start, bvh.count,
+        spheres.centers, spheres.radii
+    )
+    return prim
+
+
+@_jit
+def _scatter(direction, point, normal, t, front_face, mat_type, albedo, fuzz, ref_idx, u0, u1, u2, out_origin, out_direction, attenuation):
+    for i in prange(len(direction)):
+        kind = mat_type[i]
+        nx, ny, nz = normal[i, 0], normal[i, 1], normal[i, 2]
+        dx, dy, dz = direction[i, 0], direction[i, 1], direction[i, 2]
+        length = math.sqrt(dx * dx + dy * dy + dz * dz)
+        if length > 0:
+            dx, dy, dz = dx / length, dy / length, dz / length
+        else:
+            dx, dy, dz = 0.0, 0.0, 0.0
+
+        # Point in the unit sphere (Metal, Hemisphere), as in
+        # Vec3.random_in_unit_sphere_list.
+        theta = u0[i] * 2 * math.pi
+        phi = math.acos(2 * u1[i] - 1)
+        r = u2[i] ** (1 / 3)
+        sx = r * math.sin(phi) * math.cos(theta)
+        sy = r * math.sin(phi) * math.sin(theta)
+        sz = r * math.cos(phi)
+
+        keep = t[i] > 0
+        ax, ay, az = albedo[i, 0], albedo[i, 1], albedo[i, 2]
+        if kind == 0:
+            # Lambertian: normal plus a random unit vector.
+            a = u0[i] * 2 * math.pi
+            z = 2 * u1[i] - 1
+            rz = math.sqrt(1 - z * z)
+            keep = keep and front_face[i]
+            ox, oy, oz = nx + rz * math.cos(a), ny + rz * math.sin(a), nz + z
+        elif kind == 1:
+            # Hemisphere: the unit-sphere point flipped into the normal's side.
+            keep = keep and front_face[i]
+            if sx * nx + sy * ny + sz * nz > 0:
+                ox, oy, oz = sx, sy, sz
+            else:
+                ox, oy, oz = -sx, -sy, -sz
+        elif kind == 2:
+            # Metal: fuzzed mirror reflection.
+            dn = dx * nx + dy * ny + dz * nz
+            ox = dx - 2 * dn * nx + fuzz[i] * sx
+            oy = dy - 2 * dn * ny + fuzz[i] * sy
+            oz = dz - 2 * dn * nz + fuzz[i] * sz
+            keep = keep and front_face[i] and ox * nx + oy * ny + oz * nz > 0
+        else:
+            # Dielectric: Schlick-weighted choice of reflection or refraction.
+            eta = 1 / ref_idx[i] if front_face[i] else ref_idx[i]
+            cos_theta = -(dx * nx + dy * ny + dz * nz)
+            sin_theta = math.sqrt(max(1 - min(cos_theta, 1.0) ** 2, 0.0))
+            r0 = ((1 - eta) / (1 + eta)) ** 2
+            reflect_prob = r0 + (1 - r0) * (1 - min(cos_theta, 1.0)) ** 5
+            if eta * sin_theta > 1 or u0[i] < reflect_prob:
+                ox = dx + 2 * cos_theta * nx
+                oy = dy + 2 * cos_theta * ny
+                oz = dz + 2 * cos_theta * nz
+            else:
+                px = (dx + nx * cos_theta) * eta
+                py = (dy + ny * cos_theta) * eta
+                pz = (dz + nz * cos_theta) * eta
+                perp = -math.sqrt(max(1 - (px * px + py * py + pz * pz), 0.0))
+                ox, oy, oz = px + nx * perp, py + ny * perp, pz + nz * perp
+            ax, ay, az = 1.0, 1.0, 1.0
+
+        if keep:
+            out_origin[i, 0] = point[i, 0]
+            out_origin[i, 1] = point[i, 1]
+            out_origin[i, 2] = point[i, 2]
+            out_direction[i, 0] = ox
+            out_direction[i, 1] = oy
+            out_direction[i, 2] = oz
+            attenuation[i, 0] = ax
+            attenuation[i, 1] = ay
+            attenuation[i, 2] = az
+
+
+def scatter(direction, point, normal, t, front_face, mat_type, albedo, fuzz, ref_idx, u0, u1, u2, out = None):
+    """Scatter a mixed set of hits in one pass.
+
+    `mat_type` is each ray's index into `MaterialTable.TYPES` and the
+    material parameters are per ray. `u0`-`u2` are the ray's first three
+    random dimensions. Returns (origin, direction, attenuation); absorbed
+    rays get all zeros, like the `scatter_batch` methods. `out` is an
+    optional tuple of three zeroed (N, 3) arrays to write them to.
+    """
+    length = len(direction)
+    if out is None:
+        out = tuple(np.zeros((length, 3), dtype=np.float32) for _ in range(3))
+    out_origin, out_direction, attenuation = out
+    _scatter(
+        direction, point, normal, t, front_face, mat_type,
+        albedo, fuzz, ref_idx, u0, u1, u2,
+        out_origin, out_direction, attenuation
+    )
+    return out_origin, out_direction, attenuation
@@ -1,89 +1,118 @@
 from abc import ABC, abstractmethod
-import cupy as cp
+import numpy as np
+from utils.backend import xp, asnumpy
 from utils.ray import RayList
 from utils.vec3 import Vec3, Color, Vec3List
 from utils.hittable import HitRecordList
-from utils.utils import random_float_list
+from utils.random_stream import GlobalStream
+from utils import profiler, kernels, workspace
 
 
 class Material(ABC):
+    # Names of the per-ray parameters `scatter_batch` takes after `rec`.
+    PARAMS = ()
+
     @abstractmethod
     def __init__(self, idx):
         self.idx = idx
 
     @abstractmethod
-    def scatter(self, r_in, rec):
+    def scatter(self, r_in, rec, rng = None):
         return NotImplemented
 
 
 class Lambertian(Material):
+    PARAMS = ("albedo",)
+
     def __init__(self, a, idx):
         self.albedo = a
         self.idx = idx
 
-    def scatter(self, r_in, rec):
+    def scatter(self, r_in, rec, rng = None):
+        return Lambertian.scatter_batch(r_in, rec, self.albedo, rng)
+
+    @staticmethod
+    def scatter_batch(r_in, rec, albedo, rng = None):
         condition = (rec.t > 0) & rec.front_face
-        scatter_direction = rec.normal + Vec3.random_unit_vector(len(r_in))
-        scattered = RayList(rec.p.mul_ndarray(condition), scatter_direction.mul_ndarray(condition))
-        attenuation = Vec3List.from_array(condition) * self.albedo
+        scatter_direction = rec.normal + Vec3.random_unit_vector(len(r_in), rng)
+        scattered = RayList(rec.p.mul_ndarray(condition), scatter_direction.imul_ndarray(condition))
+        attenuation = Vec3List.from_array(condition) * albedo
         return scattered, attenuation
 
 
 class Hemisphere(Material):
+    PARAMS = ("albedo",)
+
     def __init__(self, a, idx):
         self.albedo = a
         self.idx = idx
 
-    def scatter(self, r_in, rec):
+    def scatter(self, r_in, rec, rng = None):
+        return Hemisphere.scatter_batch(r_in, rec, self.albedo, rng)
+
+    @staticmethod
+    def scatter_batch(r_in, rec, albedo, rng = None):
         condition = (rec.t > 0) & rec.front_face
 
-        scatter_direction = Vec3.random_in_hemisphere(rec.normal)
-        scattered = RayList(rec.p.mul_ndarray(condition), scatter_direction.mul_ndarray(condition))
-        attenuation = Vec3List.from_array(condition) * self.albedo
+        scatter_direction = Vec3.random_in_hemisphere(rec.normal, rng)
+        scattered = RayList(rec.p.mul_ndarray(condition), scatter_direction.imul_ndarray(condition))
+        attenuation = Vec3List.from_array(condition) * albedo
         return scattered, attenuation
 
 
 
 class Metal(Material):
+    PARAMS = ("albedo", "fuzz")
+
     def __init__(self, a, f, idx):
         self.albedo = a
         self.fuzz = f if f < 1 else 1
         self.idx = idx
 
-    def scatter(self, r_in, rec):
+    def scatter(self, r_in, rec, rng = None):
+        fuzz = xp.full(len(r_in), self.fuzz, dtype=xp.float32)
+        return Metal.scatter_batch(r_in, rec, self.albedo, fuzz, rng)
+
+    @staticmethod
+    def scatter_batch(r_in, rec, albedo, fuzz, rng = None):
         condition = (rec.t > 0) & rec.front_face
 
-        reflected = (
-            r_in.direction().unit_vector().reflect(rec.normal)
-            + Vec3.random_in_unit_sphere_list(len(r_in)) * self.fuzz
-        )
+        reflected = r_in.direction().unit_vector().reflect(rec.normal)
+        reflected += Vec3.random_in_unit_sphere_list(len(r_in), rng).imul_ndarray(fuzz)
 
         condition = condition & (reflected @ rec.normal > 0)
-        scattered = RayList(rec.p.mul_ndarray(condition), reflected.mul_ndarray(condition))
+        scattered = RayList(rec.p.mul_ndarray(condition), reflected.imul_ndarray(condition))
 
-        attenuation = Vec3List.from_array(condition) *  self.albedo
+        attenuation = Vec3List.from_array(condition) * albedo
         return scattered, attenuation
 
 
 class Dielectric(Material):
+    PARAMS = ("ref_idx",)
+
     def __init__(self, ri, idx):
         self.ref_idx = ri  # refractive indices
         self.idx = idx
 
-    def scatter(self, r_in, rec):
-        etai_over_etat = cp.where(
-            rec.front_face, 1 / self.ref_idx, self.ref_idx
+    def scatter(self, r_in, rec, rng = None):
+        return Dielectric.scatter_batch(r_in, rec, self.ref_idx, rng)
+
+    @staticmethod
+    def scatter_batch(r_in, rec, ref_idx, rng = None):
+        rng = rng or GlobalStream(len(r_in))
+        etai_over_etat = xp.where(
+            rec.front_face, 1 / ref_idx, ref_idx
         )
 
         unit_direction = r_in.direction().unit_vector()
         cos_theta = -unit_direction @ rec.normal
-        cos_theta = cp.where(cos_theta > 1, 1, cos_theta)
-        sin_theta = cp.sqrt(1 - cos_theta**2)
-        reflect_prob = self.schlick(cos_theta, etai_over_etat)
+        cos_theta = xp.where(cos_theta > 1, 1, cos_theta)
+        sin_theta = xp.sqrt(1 - cos_theta**2)
+        reflect_prob = Dielectric.schlick(cos_theta, etai_over_etat)
 
         reflect_condition = (
             (etai_over_etat * sin_theta > 1)
-            | (random_float_list(len(r_in)) < reflect_prob)
+            | (rng.uniform(0) < reflect_prob)
         )
         reflected = (unit_direction.mul_ndarray(reflect_condition)).reflect(
             rec.normal.mul_ndarray(reflect_condition)
@@ -91,12 +120,13 @@ class Dielectric(Material):
         refracted = (unit_direction.mul_ndarray(~reflect_condition)).refract(
             rec.normal.mul_ndarray(~reflect_condition), etai_over_etat
         )
-        direction = reflected + refracted
+        direction = reflected
+        direction += refracted
 
         condition = rec.t > 0
         scattered = RayList(
             rec.p.mul_ndarray(condition),
-            direction.mul_ndarray(condition)
+            direction.imul_ndarray(condition)
         )
         attenuation = Vec3List.from_array(condition) * Color(1, 1, 1)
         return scattered, attenuation
@@ -106,3 +136,107 @@ class Dielectric(Material):
         r0 = (1 - ref_idx) / (1 + ref_idx)
         r0 **= 2
         return r0 + (1 - r0) * ((1 - cosine) ** 5)
+
+
+class MaterialTable:
+    """Material parameters in contiguous arrays indexed by material id.
+
+    Built once when a scene is packed. `scatter` shades a mixed set of hits
+    with one `scatter_batch` call per material type, gathering each ray's
+    parameters from the table, and the arrays are all a worker needs to
+    shade, so they ship with the rest of the packed scene.
+    """
+
+    TYPES = (Lambertian, Hemisphere, Metal, Dielectric)
+    ARRAYS = ("type_id", "albedo", "fuzz", "ref_idx")
+
+    def __init__(self, materials):
+        size = max(materials, default=0) + 1
+        type_id = np.full(size, -1, dtype=np.int32)
+        albedo = np.zeros((size, 3), dtype=np.float32)
+        fuzz = np.zeros(size, dtype=np.float32)
+        ref_idx = np.ones(size, dtype=np.float32)
+        for idx, mat in materials.items():
+            type_id[idx] = MaterialTable.TYPES.index(type(mat))
+            if "albedo" in mat.PARAMS:
+                albedo[idx] = mat.albedo.e
+            else:
+                # Only read as the denoiser's feature albedo.
+                albedo[idx] = 1
+            if "fuzz" in mat.PARAMS:
+                fuzz[idx] = mat.fuzz
+            if "ref_idx" in mat.PARAMS:
+                ref_idx[idx] = mat.ref_idx
+        self.set_arrays(type_id, albedo, fuzz, ref_idx)
+
+    def set_arrays(self, type_id, albedo, fuzz, ref_idx):
+        self.type_id = xp.asarray(type_id)
+        self.albedo = xp.asarray(albedo)
+        self.fuzz = xp.asarray(fuzz)
+        self.ref_idx = xp.asarray(ref_idx)
+
+    def pack(self):
+        return {name: asnumpy(getattr(self, name)) for name in MaterialTable.ARRAYS}
+
+    @staticmethod
+    def from_arrays(arrays):
+        table = MaterialTable.__new__(MaterialTable)
+        table.set_arrays(*(arrays[name] for name in MaterialTable.ARRAYS))
+        return table
+
+    def __len__(self):
+        return len(self.type_id)
+
+    def gather(self, material_type, mat):
+        params = list()
+        for name in material_type.PARAMS:
+            value = getattr(self, name)[mat]
+            params.append(Vec3List(value) if value.ndim == 2 else value)
+        return params
+
+    def scatter(self, r_in, rec, rng = None):
+        with profiler.stage("material"):
+            return self.scatter_types(r_in, rec, rng)
+
+    def scatter_types(self, r_in, rec, rng = None):
+        length = len(r_in)
+        if kernels.enabled():
+            rng = rng or GlobalStream(length)
+            mat = rec.material
+            origin, direction, attenuation = kernels.scatter(
+                r_in.direction().e, rec.p.e, rec.normal.e, rec.t,
+                rec.front_face, self.type_id[mat], self.albedo[mat],
+                self.fuzz[mat], self.ref_idx[mat],
+                rng.uniform(0), rng.uniform(1), rng.uniform(2),
+                tuple(
+                    workspace.zeros(f"scatter.{name}", (length, 3))
+                    for name in ("origin", "direction", "attenuation")
+                )
+            )
+            return (
+                RayList(Vec3List(origin), Vec3List(direction)),
+                Vec3List(attenuation)
+            )
+
+        scattered = RayList(
+            Vec3List(workspace.zeros("scatter.origin", (length, 3))),
+            Vec3List(workspace.zeros("scatter.direction", (length, 3)))
+        )
+        attenuation = Vec3List(workspace.zeros("scatter.attenuation", (length, 3)))
+        mat_type = self.type_id[rec.material]
+        for type_idx, material_type in enumerate(MaterialTable.TYPES):
+            idx = xp.where(mat_type == type_idx)[0]
+            if len(idx) == 0:
+                continue
+
+            with profiler.stage(f"material/{material_type.__name__}"):
+                type_rec = rec.take(idx)
+                type_scattered, type_attenuation = material_type.scatter_batch(
+                    r_in.take(idx), type_rec,
+                    *self.gather(material_type, type_rec.material),
+                    None if rng is None else rng.take(idx)
+                )
+            scattered.origin().e[idx] = type_scattered.origin().e
+            scattered.direction().e[idx] = type_scattered.direction().e
+            attenuation.e[idx] = type_attenuation.e
+        return scattered, attenuation
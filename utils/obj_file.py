@@ -0,0 +1,134 @@
+import re
+import numpy as np
+from utils.triangle_mesh import TriangleMesh
+
+# Lookup table: whether a byte value is whitespace.
+WHITESPACE = np.zeros(256, dtype=bool)
+WHITESPACE[np.frombuffer(b" \t\r\n", dtype=np.uint8)] = True
+# Texture and normal references of a face corner ("7/3/5", "7//5").
+CORNER_SUFFIX = re.compile(rb"/\S*")
+# Comments, to the end of their line.
+COMMENT = re.compile(rb"#[^\n]*")
+
+
+def _parse_chunk(chunk, vertex_base):
+    """Vertices (V, 3) and triangles (F, 3) of whole lines of OBJ text.
+
+    Every byte outside `v` and `f` lines (and their keywords) is blanked,
+    the numbers left are parsed in one call, and each is assigned its line
+    and its position on the line from the positions of the token starts.
+    A line's keyword is its first non-blank byte, so indented lines count.
+    """
+    if not chunk.endswith(b"\n"):
+        chunk += b"\n"
+    if b"#" in chunk:
+        chunk = COMMENT.sub(b"", chunk)
+    chunk = CORNER_SUFFIX.sub(b"", chunk)
+    data = np.frombuffer(chunk, dtype=np.uint8).copy()
+    newline = np.where(data == ord("\n"))[0]
+    starts = np.concatenate([[0], newline[:-1] + 1])
+    # First non-blank byte of each line; at or past the newline for blank
+    # lines, which then match no keyword.
+    first = starts
+    indented = WHITESPACE[data[starts]] & (starts < newline)
+    if indented.any():
+        text = np.append(np.where(~WHITESPACE[data])[0], len(data) - 1)
+        first = starts.copy()
+        first[indented] = text[np.searchsorted(text, starts[indented])]
+    keyword = np.where(first < newline, data[first], ord(" "))
+    separated = WHITESPACE[data[np.minimum(first + 1, len(data) - 1)]]
+    is_vertex = separated & (keyword == ord("v"))
+    is_face = separated & (keyword == ord("f"))
+    selected = is_vertex | is_face
+
+    lengths = np.diff(np.concatenate([[0], newline + 1]))
+    data[~np.repeat(selected, lengths)] = ord(" ")
+    data[first[selected]] = ord(" ")
+    space = WHITESPACE[data]
+    begins = np.where(~space[1:] & space[:-1])[0] + 1
+    values = np.zeros(0)
+    if len(begins) > 0:
+        # Blank text would parse as [-1].
+        values = np.fromstring(data.tobytes(), dtype=np.float64, sep=" ")
+    if len(values) != len(begins):
+        raise ValueError("Malformed vertex or face line")
+
+    token_line = np.searchsorted(newline, begins)
+    new_line = np.ones(len(begins), dtype=bool)
+    new_line[1:] = token_line[1:] != token_line[:-1]
+    index = np.arange(len(begins))
+    position = index - np.maximum.accumulate(np.where(new_line, index, 0))
+    counts = np.bincount(token_line, minlength=len(starts))
+    if (counts[selected] < 3).any():
+        raise ValueError("Vertex or face line with fewer than 3 values")
+
+    vertex = is_vertex[token_line]
+    # Extra values (a w coordinate, vertex colors) are ignored.
+    vertices = values[vertex & (position < 3)].astype(np.float32).reshape(-1, 3)
+
+    face = ~vertex
+    index = values[face].astype(np.int64)
+    token_line = token_line[face]
+    position = position[face]
+    # Negative indices count back from the last vertex defined so far.
+    defined = vertex_base + np.cumsum(is_vertex)[token_line]
+    index = np.where(index < 0, defined + index, index - 1)
+    if (index < 0).any():
+        raise ValueError("Face refers to an undefined vertex")
+
+    # Polygons are split into a fan around their first corner.
+    corner = np.where(position >= 2)[0]
+    faces = np.stack([
+        index[corner - position[corner]], index[corner - 1], index[corner]
+    ], axis=1)
+    return vertices, faces
+
+
+def read_obj_arrays(path, chunk_size = 1 << 22):
+    """Vertex (V, 3) float32 and triangle index (F, 3) int32 arrays of an OBJ file.
+
+    The file is read `chunk_size` bytes at a time and each chunk is
+    parsed with whole-array operations, so memory is bounded by the
+    chunk and the output arrays, and no Python object is made per vertex
+    or face. Only `v` and `f` lines are read: texture coordinates,
+    normals, groups and materials are skipped, and polygons are
+    triangulated as fans.
+    """
+    vertices = list()
+    faces = list()
+    vertex_count = 0
+    rest = b""
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            chunk = rest + block
+            if block:
+                end = chunk.rfind(b"\n") + 1
+                chunk, rest = chunk[:end], chunk[end:]
+            if chunk:
+                v, t = _parse_chunk(chunk, vertex_count)
+                vertices.append(v)
+                faces.append(t)
+                vertex_count += len(v)
+            if not block:
+                break
+    if not vertices:
+        return np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32)
+    vertices = np.concatenate(vertices)
+    faces = np.concatenate(faces).astype(np.int32)
+    if len(faces) > 0 and faces.max() >= len(vertices):
+        raise ValueError(f"{path} refers to an undefined vertex")
+    return vertices, faces
+
+
+def read_obj(path, material, leaf_size = 4, chunk_size = 1 << 22):
+    """A `TriangleMesh` of the OBJ file at `path`, all of one material."""
+    vertices, faces = read_obj_arrays(path, chunk_size)
+    return TriangleMesh(vertices, faces, material, leaf_size)
+
+
+def write_obj(path, vertices, faces):
+    """Write vertex and triangle arrays as a minimal OBJ file."""
+    with open(path, "w") as f:
+        np.savetxt(f, vertices, fmt="v %.7g %.7g %.7g")
+        np.savetxt(f, np.asarray(faces) + 1, fmt="f %d %d %d")
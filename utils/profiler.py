@@ -0,0 +1,239 @@
+import os
+import contextlib
+import json
+import time
+import threading
+import tracemalloc
+from utils.backend import xp, is_gpu
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+_profiler = None
+
+
+def current():
+    return _profiler
+
+
+def stage(name):
+    """Time the enclosed block as `name` while a profile is active.
+
+    With no active profile this returns a shared no-op context manager, so
+    instrumented code pays one global lookup per call.
+    """
+    if _profiler is None:
+        return _NULL_STAGE
+    return _Stage(_profiler, name)
+
+
+def count_bounce(bounce, rays, hits, survivors):
+    if _profiler is not None:
+        _profiler.count_bounce(bounce, rays, hits, survivors)
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.exit(self.name)
+        return False
+
+
+class Profiler:
+    """Per-stage wall time, call counts and ray statistics of a render.
+
+    Stages nest, and each call is also kept as a trace event, so `trace`
+    can lay them out on a timeline. With `memory` set, tracemalloc measures
+    how far each stage pushes allocations above what was live when it
+    started (NumPy buffers only). CuPy work is synchronized at stage
+    boundaries so the times belong to the stage that launched it.
+
+    Profilers are plain data and can be pickled back from render workers
+    and folded in with `merge`.
+    """
+
+    def __init__(self, memory = False):
+        self.memory = memory
+        self.stages = dict()
+        self.bounces = list()
+        self.events = list()
+        self.stack = list()
+        self.wall = 0.0
+        self.started = None
+        self.owns_tracemalloc = False
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.owns_tracemalloc = True
+        else:
+            self.owns_tracemalloc = False
+        return self
+
+    def stop(self):
+        self.wall += time.perf_counter() - self.started
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+        return self
+
+    def enter(self, name):
+        if is_gpu():
+            xp.cuda.Device().synchronize()
+        frame = [name, time.perf_counter(), 0, 0]
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1][3] = max(self.stack[-1][3], peak)
+            tracemalloc.reset_peak()
+            frame[2] = frame[3] = current
+        self.stack.append(frame)
+
+    def exit(self, name):
+        if is_gpu():
+            xp.cuda.Device().synchronize()
+        end = time.perf_counter()
+        _, start, current, peak = self.stack.pop()
+        allocated = 0
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            allocated = peak - current
+            if self.stack:
+                self.stack[-1][3] = max(self.stack[-1][3], peak)
+
+        stats = self.stages.setdefault(name, [0, 0.0, 0, 0])
+        stats[0] += 1
+        stats[1] += end - start
+        stats[2] += allocated
+        stats[3] = max(stats[3], allocated)
+        self.events.append(
+            (name, os.getpid(), threading.get_ident(), start, end - start)
+        )
+
+    def bounce_stats(self, bounce):
+        while len(self.bounces) <= bounce:
+            self.bounces.append([0, 0, 0, 0])
+        return self.bounces[bounce]
+
+    def count_bounce(self, bounce, rays, hits, survivors):
+        stats = self.bounce_stats(bounce)
+        stats[0] += 1
+        stats[1] += rays
+        stats[2] += hits
+        stats[3] += survivors
+
+    def merge(self, other):
+        for name, (calls, seconds, allocated, peak) in other.stages.items():
+            stats = self.stages.setdefault(name, [0, 0.0, 0, 0])
+            stats[0] += calls
+            stats[1] += seconds
+            stats[2] += allocated
+            stats[3] = max(stats[3], peak)
+        for bounce, other_stats in enumerate(other.bounces):
+            stats = self.bounce_stats(bounce)
+            for k, value in enumerate(other_stats):
+                stats[k] += value
+        self.events.extend(other.events)
+        return self
+
+    def report(self):
+        """The statistics as plain dicts and lists, e.g. for JSON."""
+        return dict(
+            wall_seconds=self.wall,
+            stages={
+                name: dict(
+                    calls=calls, seconds=seconds,
+                    bytes_allocated=allocated if self.memory else None,
+                    peak_bytes=peak if self.memory else None,
+                )
+                for name, (calls, seconds, allocated, peak) in self.stages.items()
+            },
+            bounces=[
+                dict(
+                    bounce=bounce, wavefronts=wavefronts, rays=rays,
+                    hits=hits, survivors=survivors,
+                    hit_ratio=hits / max(rays, 1),
+                    compaction_ratio=survivors / max(rays, 1),
+                )
+                for bounce, (wavefronts, rays, hits, survivors)
+                in enumerate(self.bounces)
+            ],
+        )
+
+    def trace(self):
+        """Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+        origin = min((event[3] for event in self.events), default=0)
+        events = [
+            dict(
+                name=name, ph="X", pid=pid, tid=tid,
+                ts=1e6 * (start - origin), dur=1e6 * duration
+            )
+            for name, pid, tid, start, duration in self.events
+        ]
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def save_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+    def summary(self):
+        wall = max(self.wall, 1e-9)
+        lines = [
+            f"{'stage':<20}{'calls':>8}{'total s':>10}{'mean ms':>10}{'% wall':>8}"
+            + (f"{'peak MiB':>10}" if self.memory else "")
+        ]
+        by_time = sorted(self.stages.items(), key=lambda item: -item[1][1])
+        for name, (calls, seconds, _, peak) in by_time:
+            lines.append(
+                f"{name:<20}{calls:>8}{seconds:>10.3f}"
+                f"{1e3 * seconds / calls:>10.3f}{100 * seconds / wall:>8.1f}"
+                + (f"{peak / 1024**2:>10.1f}" if self.memory else "")
+            )
+        if self.bounces:
+            lines.append("")
+            lines.append(f"{'bounce':<8}{'rays':>12}{'hit %':>8}{'kept %':>8}")
+            for bounce in self.report()["bounces"]:
+                lines.append(
+                    f"{bounce['bounce']:<8}{bounce['rays']:>12}"
+                    f"{100 * bounce['hit_ratio']:>8.1f}"
+                    f"{100 * bounce['compaction_ratio']:>8.1f}"
+                )
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profile(memory = False, profiler = None, enabled = True):
+    """Make a `Profiler` active for the enclosed block.
+
+        with profile() as prof:
+            render_samples(...)
+        print(prof.summary())
+
+    With `enabled` false nothing is recorded and the block gets None.
+    """
+    global _profiler
+    if not enabled:
+        yield None
+        return
+    previous = _profiler
+    profiler = (profiler or Profiler(memory)).start()
+    _profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _profiler = previous
+        profiler.stop()
@@ -0,0 +1,70 @@
+from utils.backend import xp
+from utils.utils import random_float_list
+
+MASK = 0xFFFFFFFF
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+
+
+def philox4x32(c0, c1, c2, c3, k0, k1, rounds = 10):
+    """Philox-4x32 block function on uint64 arrays holding 32-bit words."""
+    for _ in range(rounds):
+        p0 = c0 * PHILOX_M0
+        p1 = c2 * PHILOX_M1
+        c0, c1, c2, c3 = (
+            (p1 >> 32) ^ c1 ^ k0, p1 & MASK,
+            (p0 >> 32) ^ c3 ^ k1, p0 & MASK
+        )
+        k0 = (k0 + PHILOX_W0) & MASK
+        k1 = (k1 + PHILOX_W1) & MASK
+    return c0, c1, c2, c3
+
+
+class RandomStream:
+    """Counter-based random numbers for a batch of rays.
+
+    Every value is a pure function of (seed, pixel, sample, bounce, dim):
+    the first four select a Philox counter and key, `dim` picks one of the
+    32-bit lanes of its output. The same pixel therefore gets the same bits
+    however the frame is tiled and whichever worker renders it.
+    """
+
+    def __init__(self, seed, pixel, sample, bounce = 0):
+        self.seed = seed
+        self.pixel = xp.asarray(pixel).astype(xp.uint64)
+        self.sample = sample
+        self.bounce = bounce
+        self.blocks = dict()
+
+    def at_bounce(self, bounce):
+        return RandomStream(self.seed, self.pixel, self.sample, bounce)
+
+    def take(self, idx):
+        return RandomStream(self.seed, self.pixel[idx], self.sample, self.bounce)
+
+    def block(self, n):
+        if n not in self.blocks:
+            ones = xp.ones(len(self.pixel), dtype=xp.uint64)
+            self.blocks[n] = philox4x32(
+                self.pixel, ones * (self.sample & MASK),
+                ones * (self.bounce & MASK), ones * (n & MASK),
+                self.seed & MASK, (self.seed >> 32) & MASK
+            )
+        return self.blocks[n]
+
+    def uniform(self, dim, _min = 0, _max = 1):
+        word = self.block(dim // 4)[dim % 4]
+        u = (word >> 8).astype(xp.float32) * (1 / (1 << 24))
+        return (_min + (_max - _min) * u).astype(xp.float32, copy=False)
+
+
+class GlobalStream:
+    """Adapter with the `RandomStream` interface over the global generator."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def uniform(self, dim, _min = 0, _max = 1):
+        return random_float_list(self.size, _min, _max)
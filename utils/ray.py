@@ -1,4 +1,4 @@
-import cupy as cp
+from utils.backend import xp
 from utils.vec3 import Vec3, Point3, Vec3List
 
 
@@ -41,12 +41,19 @@ class RayList:
     def __add__(self, r):
         return RayList(self.o + r.o, self.d + r.d)
 
-    def at(self, t):
-        return self.o + self.d.mul_ndarray(t)
+    def at(self, t, out = None):
+        point = self.d.mul_ndarray(t, out)
+        point += self.o
+        return point
+
+    def take(self, idx):
+        return RayList(
+            Vec3List(self.o.get_ndarray(idx)), Vec3List(self.d.get_ndarray(idx))
+        )
 
     @staticmethod
     def single(r):
-        return RayList(cp.array([r.o.e]), cp.array([r.d.e]))
+        return RayList(xp.array([r.o.e]), xp.array([r.d.e]))
 
     @staticmethod
     def new_empty(length):
@@ -0,0 +1,274 @@
+import time
+from utils.backend import xp
+from utils.vec3 import Color, Vec3List
+from utils.accumulator import Accumulator
+from utils.random_stream import RandomStream, GlobalStream
+from utils import profiler, workspace
+
+
+class PathState:
+    """The live paths of a wavefront.
+
+    Each path carries its ray, the throughput accumulated so far and the
+    index of the pixel its radiance belongs to. Terminated paths are
+    dropped by `take` and never expanded back to full length.
+    """
+
+    def __init__(self, ray, throughput, pixel, rng = None):
+        self.ray = ray
+        self.throughput = throughput
+        self.pixel = pixel
+        self.rng = rng
+
+    def __len__(self):
+        return len(self.pixel)
+
+    def take(self, idx):
+        with profiler.stage("compaction"):
+            return PathState(
+                self.ray.take(idx),
+                Vec3List(self.throughput.get_ndarray(idx)),
+                self.pixel[idx],
+                None if self.rng is None else self.rng.take(idx)
+            )
+
+
+class Features:
+    """First-hit normal, albedo and depth of each ray, for `Img.denoise`."""
+
+    def __init__(self, length):
+        self.normal = Vec3List.new_zero(length)
+        self.albedo = Vec3List.new_zero(length)
+        self.depth = xp.zeros(length, dtype=xp.float32)
+
+    def arrays(self):
+        return self.normal.e, self.albedo.e, self.depth
+
+    @staticmethod
+    def from_arrays(normal, albedo, depth):
+        features = Features.__new__(Features)
+        features.normal = Vec3List(normal)
+        features.albedo = Vec3List(albedo)
+        features.depth = depth
+        return features
+
+    def record(self, pixel, rec, albedo, background):
+        hit = (rec.material != 0)[:, None]
+        self.normal.e[pixel] = xp.where(hit, rec.normal.e, 0)
+        self.albedo.e[pixel] = xp.where(hit, albedo, background.e)
+        self.depth[pixel] = xp.where(hit[:, 0], rec.t, 0)
+
+
+def sky_color(r, out = None):
+    length = len(r)
+    dtype = r.direction().e.dtype
+    unit_direction = r.direction().unit_vector(
+        workspace.empty("sky.unit", (length, 3), dtype)
+    )
+    t = (unit_direction.y() + 1) * 0.5
+    color = Vec3List.from_vec3(Color(1, 1, 1), length).mul_ndarray(1 - t, out)
+    color += Vec3List.from_vec3(Color(0.5, 0.7, 1), length).mul_ndarray(
+        t, workspace.empty("sky.blue", (length, 3), dtype)
+    )
+    return color
+
+
+def ray_color_loop(r, world, depth, rng = None, features = None):
+    length = len(r)
+    radiance = Vec3List.new_zero(length)
+    path = PathState(
+        r, Vec3List.from_vec3(Color(1, 1, 1), length), xp.arange(length), rng
+    )
+    path = path.take(xp.where(r.direction().length_squared() > 0)[0])
+    table = world.get_material_table()
+
+    for bounce in range(depth):
+        if len(path) == 0:
+            break
+        rec = world.hit(path.ray, 0.001, xp.inf)
+        if features is not None and bounce == 0:
+            features.record(
+                path.pixel, rec, table.albedo[rec.material], sky_color(path.ray)
+            )
+
+        with profiler.stage("sky"):
+            sky = xp.where(rec.material == 0)[0]
+            color = sky_color(path.ray.take(sky), workspace.empty(
+                "sky.color", (len(sky), 3), path.ray.direction().e.dtype
+            ))
+            color *= path.throughput.get_ndarray(sky)
+            radiance.e[path.pixel[sky]] += color.e
+        rays = len(path)
+        hit = xp.where(rec.material != 0)[0]
+        if bounce == depth - 1:
+            profiler.count_bounce(bounce, rays, len(hit), 0)
+            break
+
+        path = path.take(hit)
+        scattered, attenuation = table.scatter(
+            path.ray, rec.take(hit),
+            None if path.rng is None else path.rng.at_bounce(bounce + 1)
+        )
+        path.ray = scattered
+        path.throughput *= attenuation
+        path = path.take(xp.where(scattered.direction().length_squared() > 0)[0])
+        profiler.count_bounce(bounce, rays, len(hit), len(path))
+
+    return radiance
+
+
+# Peak bytes per traced ray: the transient buffers of one bounce of
+# `ray_color_loop` (measured with benchmarks/tiles.py).
+RAY_BYTES = 4096
+
+
+def tile_shape(image_width, image_height, memory_budget):
+    rays = memory_budget // RAY_BYTES
+    if rays < image_width:
+        return max(1, rays), 1
+    return image_width, min(image_height, rays // image_width)
+
+
+def scan_pixels(world, cam, image_width, image_height, i_list, j_list, max_depth, seed = None, sample = 0, features = None):
+    if seed is None:
+        rng = None
+        jitter = GlobalStream(len(i_list))
+    else:
+        rng = RandomStream(seed, j_list * image_width + i_list, sample)
+        jitter = rng
+    u = (jitter.uniform(0) + i_list) / (image_width - 1)
+    v = (jitter.uniform(1) + j_list) / (image_height - 1)
+    with profiler.stage("camera"):
+        r = cam.get_ray(u, v, rng)
+    return ray_color_loop(r, world, max_depth, rng, features)
+
+
+def scan_tile(world, cam, image_width, image_height, x, y, w, h, max_depth, seed = None, sample = 0, features = None):
+    i_list = xp.tile(xp.arange(x, x + w), h)
+    j_list = xp.concatenate(xp.transpose(
+        xp.tile(xp.arange(y, y + h), (w, 1))
+    ))
+    return scan_pixels(
+        world, cam, image_width, image_height,
+        i_list, j_list, max_depth, seed, sample, features
+    )
+
+
+def scan_frame(world, cam, image_width, image_height, max_depth, seed = None, sample = 0):
+    with workspace.use():
+        return scan_tile(
+            world, cam, image_width, image_height,
+            0, 0, image_width, image_height, max_depth, seed, sample
+        ).cpu()
+
+
+def frame_tiles(image_width, image_height, memory_budget):
+    tile_w, tile_h = tile_shape(image_width, image_height, memory_budget)
+    return [
+        (x, y, min(tile_w, image_width - x), min(tile_h, image_height - y))
+        for y in range(0, image_height, tile_h)
+        for x in range(0, image_width, tile_w)
+    ]
+
+
+def scan_frame_tiled(world, cam, accumulator, max_depth, memory_budget, seed = None, sample = 0):
+    image_width, image_height = accumulator.w, accumulator.h
+    for x, y, w, h in frame_tiles(image_width, image_height, memory_budget):
+        features = Features(w * h) if accumulator.has_features() else None
+        tile = scan_tile(
+            world, cam, image_width, image_height,
+            x, y, w, h, max_depth, seed, sample, features
+        )
+        with profiler.stage("accumulate"):
+            accumulator.add(x, y, w, h, tile, features)
+    return accumulator
+
+
+def render_samples(world, cam, image_width, image_height, samples, max_depth, memory_budget, seed = None, first_sample = 0, features = False):
+    accumulator = Accumulator(image_width, image_height, features)
+    with workspace.use():
+        for s in range(first_sample, first_sample + samples):
+            scan_frame_tiled(
+                world, cam, accumulator, max_depth, memory_budget, seed, s
+            )
+    return accumulator
+
+
+def render_adaptive(world, cam, image_width, image_height, base_samples, max_samples, max_error, max_depth, memory_budget, seed = None, features = False):
+    """Spend samples only where the estimate is still noisy.
+
+    Every pixel gets `base_samples` (which also fill the feature buffers
+    when `features` is set). Each further pass adds one sample to
+    the pixels whose `Accumulator.error` is above `max_error`, until none
+    is left or `max_samples` is reached. All active pixels take part in
+    every pass, so they share a sample index and seeded renders stay
+    reproducible.
+    """
+    with workspace.use():
+        accumulator = render_samples(
+            world, cam, image_width, image_height, base_samples,
+            max_depth, memory_budget, seed, features=features
+        )
+        chunk = max(1, memory_budget // RAY_BYTES)
+        active = xp.arange(image_width * image_height)
+        for s in range(base_samples, max_samples):
+            active = active[accumulator.error().reshape(-1)[active] > max_error]
+            if len(active) == 0:
+                break
+            for c in range(0, len(active), chunk):
+                pixel = active[c:c + chunk]
+                radiance = scan_pixels(
+                    world, cam, image_width, image_height,
+                    pixel % image_width, pixel // image_width,
+                    max_depth, seed, s
+                )
+                with profiler.stage("accumulate"):
+                    accumulator.add_pixels(pixel, radiance)
+    return accumulator
+
+
+def render_progressive(world, cam, image_width, image_height, time_budget, max_depth, memory_budget, seed = None, max_error = None, max_samples = None, snapshot = None, snapshot_interval = None, pool = None, features = False, start_time = None):
+    """Add one-sample passes until the time budget or noise target is met.
+
+    The clock starts at `start_time` (a `time.perf_counter` value, now by
+    default). A pass is only started if the previous one says it will end
+    before the deadline, so the result is the most converged image that
+    fits in `time_budget` seconds. Rendering also stops once the mean
+    `Accumulator.error` is at most `max_error`, or after `max_samples`.
+
+    Every `snapshot_interval` seconds `snapshot(accumulator)` is called
+    with the running estimate. Passes go through `pool.render` when a
+    `RenderPool` is given; seeded results match `render_samples` with the
+    same number of samples either way.
+    """
+    if start_time is None:
+        start_time = time.perf_counter()
+    accumulator = Accumulator(image_width, image_height, features)
+    last_snapshot = time.perf_counter()
+    pass_time = 0
+    s = 0
+    with workspace.use():
+        while max_samples is None or s < max_samples:
+            pass_start = time.perf_counter()
+            if s > 0 and pass_start - start_time + pass_time > time_budget:
+                break
+            if pool is None:
+                scan_frame_tiled(
+                    world, cam, accumulator, max_depth, memory_budget, seed, s
+                )
+            else:
+                pool.render(
+                    cam, image_width, image_height, 1, max_depth, memory_budget,
+                    accumulator, seed, s
+                )
+            pass_time = time.perf_counter() - pass_start
+            s += 1
+
+            if max_error is not None and s > 1:
+                if float(accumulator.error().mean()) <= max_error:
+                    break
+            if snapshot is not None and snapshot_interval is not None:
+                if time.perf_counter() - last_snapshot >= snapshot_interval:
+                    snapshot(accumulator)
+                    last_snapshot = time.perf_counter()
+    return accumulator
@@ -0,0 +1,229 @@
+import os
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from utils.backend import xp, asnumpy, get_backend, set_backend
+from utils.vec3 import Vec3List
+from utils.bvh import BVH
+from utils.accumulator import Accumulator
+from utils.render import scan_tile, frame_tiles, Features
+from utils import profiler, kernels, workspace
+
+
+class SharedScene:
+    """Handle to a BVH whose arrays live in one shared memory block.
+
+    The node, sphere and material table arrays all go in the block; only
+    its name and the array layout are pickled, so publishing to any number
+    of workers costs one copy.
+    """
+
+    def __init__(self, name, layout):
+        self.name = name
+        self.layout = layout
+
+    @staticmethod
+    def publish(world):
+        arrays = world.pack()
+        size = sum(a.nbytes for a in arrays.values())
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        layout = list()
+        offset = 0
+        for name, a in arrays.items():
+            view = np.ndarray(a.shape, a.dtype, buffer=shm.buf, offset=offset)
+            view[...] = a
+            layout.append((name, a.dtype.str, a.shape, offset))
+            offset += a.nbytes
+        return SharedScene(shm.name, layout), shm
+
+    def update(self, world, shm):
+        """Copy a changed `world` over the published arrays in place.
+
+        Moving spheres keeps every array's shape (the node count depends
+        only on the sphere count), so the block is reused; anything else
+        raises ValueError.
+        """
+        arrays = world.pack()
+        layout = [
+            (name, a.dtype.str, a.shape) for name, a in arrays.items()
+        ]
+        if layout != [entry[:3] for entry in self.layout]:
+            raise ValueError("The updated scene does not fit the published one")
+        for (name, dtype, shape, offset), a in zip(self.layout, arrays.values()):
+            np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)[...] = a
+
+    def attach(self, shm = None):
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=self.name)
+        arrays = {
+            name: np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+            for name, dtype, shape, offset in self.layout
+        }
+        return BVH.from_arrays(arrays), shm
+
+
+def _worker(backend, scene, tasks, results):
+    set_backend(backend)
+    # One worker per core already: keep the JIT kernels single-threaded.
+    kernels.set_threads(1)
+    world, shm = scene.attach()
+    version = 0
+    # Scratch buffers stay warm across tasks.
+    with workspace.use():
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            (
+                cam, image_width, image_height, t, tile, sample,
+                max_depth, seed, with_features, profile_memory,
+                scene_version, task_scene
+            ) = task
+            if scene_version != version:
+                # The arrays changed under us, or the pool moved to another
+                # scene; drop anything derived from the old ones.
+                if task_scene.name == scene.name:
+                    world, shm = scene.attach(shm)
+                else:
+                    shm.close()
+                    scene = task_scene
+                    world, shm = scene.attach()
+                version = scene_version
+            x, y, w, h = tile
+            features = Features(w * h) if with_features else None
+            with profiler.profile(
+                profile_memory, enabled=profile_memory is not None
+            ) as prof:
+                radiance = scan_tile(
+                    world, cam, image_width, image_height,
+                    x, y, w, h, max_depth, seed, sample, features
+                )
+            if features is not None:
+                features = Features.from_arrays(*(
+                    asnumpy(a) for a in features.arrays()
+                ))
+            results.put((t, sample, asnumpy(radiance.e), features, prof))
+
+
+class RenderPool:
+    """Persistent worker processes that trace (sample, tile) tasks.
+
+    The scene is published once through shared memory when the pool
+    starts; each `render` call only queues small task tuples, so the same
+    warm workers can serve many frames.
+    """
+
+    def __init__(self, world, n_workers = None):
+        if not isinstance(world, BVH):
+            world = BVH(world)
+        self.n_workers = n_workers or os.cpu_count()
+        self.scene, self.shm = SharedScene.publish(world)
+        self.version = 0
+
+        ctx = multiprocessing.get_context("spawn")
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.workers = [
+            ctx.Process(
+                target=_worker,
+                args=(get_backend(), self.scene, self.tasks, self.results),
+                daemon=True
+            )
+            for _ in range(self.n_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def render(self, cam, image_width, image_height, samples, max_depth, memory_budget, accumulator = None, seed = None, first_sample = 0, features = False, on_progress = None):
+        """Trace `samples` passes of every tile and fold them in order.
+
+        `on_progress(done, total)` is called as each (sample, tile) result
+        is folded into the accumulator.
+        """
+        if accumulator is None:
+            accumulator = Accumulator(image_width, image_height, features)
+        with_features = accumulator.has_features()
+        prof = profiler.current()
+        profile_memory = None if prof is None else prof.memory
+        tiles = frame_tiles(image_width, image_height, memory_budget)
+        for s in range(first_sample, first_sample + samples):
+            for t, tile in enumerate(tiles):
+                self.tasks.put((
+                    cam, image_width, image_height, t, tile, s,
+                    max_depth, seed, with_features, profile_memory,
+                    self.version, self.scene
+                ))
+
+        # Fold each tile's samples in order so the result does not depend
+        # on which worker finished first.
+        next_sample = [first_sample] * len(tiles)
+        pending = dict()
+        done = 0
+        for _ in range(samples * len(tiles)):
+            t, s, radiance, features, worker_prof = self.result()
+            if worker_prof is not None:
+                prof.merge(worker_prof)
+            pending[t, s] = radiance, features
+            while (t, next_sample[t]) in pending:
+                x, y, w, h = tiles[t]
+                radiance, features = pending.pop((t, next_sample[t]))
+                if features is not None:
+                    features = Features.from_arrays(*(
+                        xp.asarray(a) for a in features.arrays()
+                    ))
+                with profiler.stage("accumulate"):
+                    accumulator.add(
+                        x, y, w, h, Vec3List(xp.asarray(radiance)), features
+                    )
+                next_sample[t] += 1
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, samples * len(tiles))
+        return accumulator
+
+    def set_world(self, world):
+        """Publish a different scene for the following `render` calls.
+
+        The workers stay up and attach the new block with their next task.
+        The old block is unlinked at once; the mappings workers still hold
+        keep its memory alive until then.
+        """
+        if not isinstance(world, BVH):
+            world = BVH(world)
+        old = self.shm
+        self.scene, self.shm = SharedScene.publish(world)
+        self.version += 1
+        old.close()
+        old.unlink()
+
+    def update(self, world):
+        """Publish new sphere positions and boxes of the pool's BVH.
+
+        Call it between `render` calls, after `BVH.update_spheres`; the
+        workers pick the new arrays up with their next task.
+        """
+        self.scene.update(world, self.shm)
+        self.version += 1
+
+    def result(self):
+        while True:
+            try:
+                return self.results.get(timeout=1)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("A render worker exited unexpectedly")
+
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
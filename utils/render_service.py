@@ -0,0 +1,443 @@
+import os
+import json
+import math
+import time
+import base64
+import signal
+import asyncio
+import itertools
+import contextlib
+import collections
+import numpy as np
+from utils.render import render_progressive
+from utils.render_pool import RenderPool
+from utils.scene_file import scene_camera
+from utils import workspace
+
+# Fields of a job and their defaults; `camera` defaults to the scene's
+# own view and `image` to sending the PNG back when there is no `output`.
+JOB_FIELDS = dict(
+    scene="random", spheres=10000, camera=None, width=320, height=180,
+    samples=8, max_depth=5, seed=0, priority=0, denoise=False, output=None,
+    image=None,
+)
+POSITIVE_FIELDS = ("spheres", "width", "height", "samples", "max_depth")
+# Camera arguments of a job (see `scene_camera`).
+CAMERA_VECTORS = ("lookfrom", "lookat", "vup")
+CAMERA_NUMBERS = ("vfov", "aperture", "focus_dist")
+# Largest request body accepted; a job is a small JSON object.
+MAX_BODY = 1024**2
+
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value):
+    return (
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        and math.isfinite(value)
+    )
+
+
+def check_camera(camera):
+    if not isinstance(camera, dict):
+        raise ValueError("camera must be a JSON object")
+    fields = CAMERA_VECTORS + CAMERA_NUMBERS
+    if sorted(camera) != sorted(fields):
+        raise ValueError(f"camera needs exactly the fields {list(fields)}")
+    for name in CAMERA_VECTORS:
+        vector = camera[name]
+        if not (
+            isinstance(vector, list) and len(vector) == 3
+            and all(is_number(a) for a in vector)
+        ):
+            raise ValueError(f"camera {name} must be a list of 3 numbers")
+    for name in CAMERA_NUMBERS:
+        if not is_number(camera[name]):
+            raise ValueError(f"camera {name} must be a number")
+    if not 0 < camera["vfov"] < 180:
+        raise ValueError("camera vfov must be between 0 and 180 degrees")
+    if camera["aperture"] < 0 or camera["focus_dist"] <= 0:
+        raise ValueError("camera aperture must be >= 0 and focus_dist > 0")
+
+
+def check_relative_path(name, path):
+    """A job path must stay inside the directory the service resolves it in."""
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"{name} must be a non-empty string")
+    if os.path.isabs(path) or ".." in path.replace("\\", "/").split("/"):
+        raise ValueError(f"{name} must be a relative path without '..'")
+
+
+def resolve(directory, path):
+    """`path` under `directory`; ValueError if it leads outside (symlinks too)."""
+    directory = os.path.realpath(directory)
+    resolved = os.path.realpath(os.path.join(directory, path))
+    if os.path.commonpath([directory, resolved]) != directory:
+        raise ValueError(f"{path} is outside {directory}")
+    return resolved
+
+
+def make_job(job):
+    """A copy of the job dict `job` with defaults filled in.
+
+    Raises ValueError for anything that is not a valid job, so it can be
+    rejected before it is queued. `scene` and `output` must be relative
+    paths without `..`; the service resolves them under its scene and
+    output directories.
+    """
+    if not isinstance(job, dict):
+        raise ValueError("A job is a JSON object")
+    unknown = sorted(set(job) - set(JOB_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown job fields {unknown}")
+    job = dict(JOB_FIELDS, **job)
+    for name in POSITIVE_FIELDS:
+        if not is_int(job[name]) or job[name] < 1:
+            raise ValueError(f"{name} must be a positive integer")
+    for name in ("seed", "priority"):
+        if not is_int(job[name]):
+            raise ValueError(f"{name} must be an integer")
+    if not isinstance(job["denoise"], bool):
+        raise ValueError("denoise must be true or false")
+    if job["image"] is not None and not isinstance(job["image"], bool):
+        raise ValueError("image must be true, false or null")
+    if job["camera"] is not None:
+        check_camera(job["camera"])
+    check_relative_path("scene", job["scene"])
+    if job["output"] is not None:
+        check_relative_path("output", job["output"])
+    if job["image"] is None:
+        job["image"] = job["output"] is None
+    return job
+
+
+def parse_job(body):
+    try:
+        job = json.loads(body or b"{}")
+    except json.JSONDecodeError as error:
+        raise ValueError(f"Invalid JSON: {error}")
+    return make_job(job)
+
+
+class RenderService:
+    """Render daemon: a priority queue of jobs in front of warm workers.
+
+    Scenes are loaded with `load_scene(name, n_spheres)` (returning a BVH
+    and its `scene_camera` view) and kept in a small LRU cache; the one in
+    use is published to a single long-lived `RenderPool`, or rendered
+    in-process with one warm `Workspace` when `n_workers` is 0. Jobs run
+    one at a time, highest `priority` first and in arrival order within a
+    priority, each using every worker.
+
+    A job's `scene` is one of `scene_names` or a scene file under
+    `scene_dir`, and its `output` is written under `output_dir`; paths
+    leading anywhere else, symlinks included, fail the job.
+
+    Clients talk HTTP over TCP or a Unix socket:
+
+        POST /jobs   a JSON job (see `JOB_FIELDS`); the response streams
+                     one JSON event per line: queued, started, progress
+                     and finally done (with the base64 PNG if `image`)
+                     or error
+        GET /status  queue length, running job and counters
+    """
+
+    def __init__(self, load_scene, n_workers = None, memory_budget = 256 * 1024**2, max_scenes = 4, scene_names = (), scene_dir = ".", output_dir = "."):
+        self.load_scene = load_scene
+        self.scene_names = scene_names
+        self.scene_dir = scene_dir
+        self.output_dir = output_dir
+        self.n_workers = n_workers
+        self.memory_budget = memory_budget
+        self.max_scenes = max_scenes
+        self.scenes = collections.OrderedDict()
+        self.pool = None
+        self.published = None
+        self.jobs = None
+        self.job_ids = itertools.count(1)
+        self.running = None
+        self.counts = collections.Counter()
+        self.stack = contextlib.ExitStack()
+
+    def scene(self, job):
+        """(BVH, view) of a job's scene, loaded once per cache slot."""
+        name = job["scene"]
+        if name not in self.scene_names:
+            name = resolve(self.scene_dir, name)
+            if not os.path.isfile(name):
+                raise ValueError(f"No scene file {job['scene']}")
+        key = (name, job["spheres"], job["seed"])
+        if name not in self.scene_names:
+            key += (os.path.getmtime(name),)
+        if key in self.scenes:
+            self.scenes.move_to_end(key)
+        else:
+            # Generated scenes draw from the global generator.
+            np.random.seed(job["seed"])
+            self.scenes[key] = self.load_scene(name, job["spheres"])
+            if len(self.scenes) > self.max_scenes:
+                self.scenes.popitem(last=False)
+        return key, self.scenes[key]
+
+    def start(self, warm_job = None):
+        """Load the scene of `warm_job` and start the workers on it.
+
+        A tiny frame is rendered before returning, so the workers have
+        imported everything (and compiled any JIT kernels) before the first
+        real job arrives.
+        """
+        job = make_job(warm_job or {})
+        key, (world, _) = self.scene(job)
+        if self.n_workers == 0:
+            self.stack.enter_context(workspace.use())
+        else:
+            self.pool = self.stack.enter_context(RenderPool(world, self.n_workers))
+            self.published = key
+        samples = 1 if self.pool is None else self.pool.n_workers
+        job.update(width=8, height=8, samples=samples, output=None, image=False)
+        self.render(job, lambda done, total: None)
+        return self
+
+    def close(self):
+        self.stack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def render(self, job, on_progress):
+        """Render a job to PNG bytes; blocking, so it runs off the event loop."""
+        key, (world, view) = self.scene(job)
+        output = None
+        if job["output"] is not None:
+            output = resolve(self.output_dir, job["output"])
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        cam = scene_camera(job["camera"] or view, job["width"] / job["height"])
+        if self.pool is None:
+            accumulator = render_progressive(
+                world, cam, job["width"], job["height"], np.inf,
+                job["max_depth"], self.memory_budget, job["seed"],
+                max_samples=job["samples"], features=job["denoise"],
+                snapshot=lambda accumulator: on_progress(
+                    accumulator.samples() // (job["width"] * job["height"]),
+                    job["samples"]
+                ),
+                snapshot_interval=0
+            )
+        else:
+            if key != self.published:
+                self.pool.set_world(world)
+                self.published = key
+            accumulator = self.pool.render(
+                cam, job["width"], job["height"], job["samples"],
+                job["max_depth"], self.memory_budget, seed=job["seed"],
+                features=job["denoise"], on_progress=on_progress
+            )
+        img = accumulator.snapshot()
+        if job["denoise"]:
+            img.denoise()
+        img.gamma(2)
+        if output is not None:
+            img.save(output)
+        return img.encode() if job["image"] else None
+
+    async def run_jobs(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job, events, writer = await self.jobs.get()
+            if writer.is_closing():
+                # The client went away while the job was queued.
+                self.counts["cancelled"] += 1
+                continue
+            self.running = job["id"]
+            start_time = time.perf_counter()
+            events.put_nowait(dict(
+                event="started", job=job["id"],
+                queued_seconds=start_time - job["submitted"]
+            ))
+            last = [None]
+
+            def on_progress(done, total):
+                # Called from the render thread; only whole percents are sent.
+                percent = 100 * done // total
+                if percent != last[0]:
+                    last[0] = percent
+                    loop.call_soon_threadsafe(events.put_nowait, dict(
+                        event="progress", job=job["id"], done=done, total=total
+                    ))
+
+            try:
+                png = await loop.run_in_executor(None, self.render, job, on_progress)
+            except Exception as error:
+                self.counts["failed"] += 1
+                events.put_nowait(dict(event="error", job=job["id"], message=str(error)))
+            else:
+                self.counts["done"] += 1
+                end_time = time.perf_counter()
+                event = dict(
+                    event="done", job=job["id"],
+                    seconds=end_time - start_time,
+                    latency=end_time - job["submitted"], output=job["output"]
+                )
+                if png is not None:
+                    event["image"] = base64.b64encode(png).decode()
+                events.put_nowait(event)
+            finally:
+                self.running = None
+
+    def status(self):
+        return dict(
+            queued=self.jobs.qsize(), running=self.running,
+            workers=0 if self.pool is None else self.pool.n_workers,
+            scenes=len(self.scenes), **self.counts
+        )
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, body = await read_request(reader)
+                job = None
+                if method == "POST" and target == "/jobs":
+                    job = parse_job(body)
+            except ValueError as error:
+                await respond(writer, 400, dict(error=str(error)))
+                return
+            if method == "GET" and target == "/status":
+                await respond(writer, 200, self.status())
+            elif job is not None:
+                await self.stream_job(job, writer)
+            else:
+                await respond(writer, 404, dict(error=f"No {method} {target}"))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream_job(self, job, writer):
+        job["id"] = next(self.job_ids)
+        job["submitted"] = time.perf_counter()
+        events = asyncio.Queue()
+        position = self.jobs.qsize()
+        self.jobs.put_nowait((-job["priority"], job["id"], job, events, writer))
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        event = dict(event="queued", job=job["id"], position=position)
+        while True:
+            writer.write(json.dumps(event).encode() + b"\n")
+            await writer.drain()
+            if event["event"] in ("done", "error"):
+                break
+            event = await events.get()
+
+    async def serve(self, host = "127.0.0.1", port = 8765, path = None, on_ready = None):
+        """Accept jobs on `path` (a Unix socket) or `host`:`port`.
+
+        Serves until SIGINT or SIGTERM. A render in progress still
+        completes before the workers stop; queued jobs are dropped.
+        """
+        self.jobs = asyncio.PriorityQueue()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        if path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        scheduler = asyncio.create_task(self.run_jobs())
+        if on_ready is not None:
+            on_ready()
+        async with server:
+            await stop.wait()
+        scheduler.cancel()
+        if path is not None:
+            os.unlink(path)
+
+
+async def read_request(reader):
+    """The method, target and body of an HTTP request; ValueError if malformed."""
+    request_line = (await reader.readline()).decode().split(" ", 2)
+    if len(request_line) != 3:
+        raise ValueError("Malformed request line")
+    method, target, _ = request_line
+    headers = dict()
+    while True:
+        line = (await reader.readline()).decode().strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get("content-length", "0")
+    if not length.isdigit():
+        raise ValueError(f"Invalid Content-Length {length!r}")
+    if int(length) > MAX_BODY:
+        raise ValueError(f"Request body is larger than {MAX_BODY} bytes")
+    body = await reader.readexactly(int(length))
+    return method, target, body
+
+
+async def respond(writer, status, payload):
+    body = json.dumps(payload).encode()
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}[status]
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+
+
+async def open_connection(address):
+    """Connect to a service at a Unix socket path or a (host, port) pair."""
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def request(address, method, target, payload = None):
+    """Send one request; returns the status and the response's line reader."""
+    reader, writer = await open_connection(address)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()).strip():
+        pass
+    return status, reader, writer
+
+
+async def submit(address, job):
+    """Submit a job and yield its events until done; raises on an error."""
+    status, reader, writer = await request(address, "POST", "/jobs", job)
+    try:
+        if status != 200:
+            raise ValueError(json.loads(await reader.read())["error"])
+        async for line in reader:
+            event = json.loads(line)
+            if event["event"] == "error":
+                raise RuntimeError(event["message"])
+            yield event
+            if event["event"] == "done":
+                break
+    finally:
+        writer.close()
+
+
+async def get_status(address):
+    status, reader, writer = await request(address, "GET", "/status")
+    try:
+        return json.loads(await reader.read())
+    finally:
+        writer.close()
@@ -0,0 +1,44 @@
+from utils.vec3 import Point3, Vec3
+from utils.camera import Camera
+from utils.bvh import BVH
+from utils import array_file
+
+MAGIC = b"RTSCENE\0"
+# Version 2 stores the build order of the spheres, for `update_spheres`.
+VERSION = 2
+
+
+def write_scene(path, world, camera = None):
+    """Write a scene as a versioned binary file.
+
+    `world` is a `BVH` (or anything `BVH` accepts) and is stored with its
+    built tree, so loading never rebuilds it. `camera` holds the `Camera`
+    arguments other than the aspect ratio, which is left to the renderer:
+    lookfrom, lookat, vup, vfov, aperture and focus_dist.
+
+    The file is an `array_file` of the `BVH.pack` arrays, with the camera
+    in its header.
+    """
+    if not isinstance(world, BVH):
+        world = BVH(world)
+    array_file.write(path, MAGIC, VERSION, world.pack(), camera=camera)
+
+
+def read_scene(path):
+    """Map a `write_scene` file and return (BVH, camera arguments or None).
+
+    The arrays are views of one read-only memory map, so on NumPy nothing
+    is copied and pages are only read when the renderer touches them. On
+    CuPy they are copied to the device once.
+    """
+    header, arrays = array_file.read(path, MAGIC, VERSION, "scene file")
+    return BVH.from_arrays(arrays), header["camera"]
+
+
+def scene_camera(camera, aspect_ratio):
+    """The `Camera` for the arguments stored by `write_scene`."""
+    return Camera(
+        Point3(*camera["lookfrom"]), Point3(*camera["lookat"]),
+        Vec3(*camera["vup"]), camera["vfov"], aspect_ratio,
+        camera["aperture"], camera["focus_dist"]
+    )
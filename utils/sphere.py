@@ -1,8 +1,9 @@
-import cupy as cp
-from utils.vec3 import Vec3, Point3, Vec3List
-from utils.ray import RayList
+import numpy as np
+from utils.backend import xp
+from utils.vec3 import Vec3, Point3
 from utils.hittable import Hittable, HitRecordList
 from utils.material import Material
+from utils import workspace
 
 
 class Sphere(Hittable):
@@ -12,11 +13,14 @@ class Sphere(Hittable):
         self.material = mat
 
     def hit(self, r, t_min, t_max):
-        if isinstance(t_max, (int, float, cp.floating)):
-            t_max_list = cp.full(len(r), t_max, cp.float32)
+        if isinstance(t_max, (int, float, xp.floating)):
+            t_max_list = workspace.full("sphere.t_max", len(r), t_max)
         else:
             t_max_list = t_max
-        oc = r.origin() - self.center
+        oc = r.origin().sub(
+            self.center,
+            out=workspace.empty("sphere.oc", (len(r), 3), r.origin().e.dtype)
+        )
         a = r.direction().length_squared()
         half_b = oc @ r.direction()
         c = oc.length_squared() - self.radius**2
@@ -24,10 +28,10 @@ class Sphere(Hittable):
 
         discriminant_condition = discriminant_list > 0
         if not discriminant_condition.any():
-            return HitRecordList.new(len(r)).set_compress_info(None)
+            return HitRecordList.new(len(r))
 
         positive_discriminant_list = (discriminant_list * discriminant_condition)
-        root = cp.sqrt(positive_discriminant_list)
+        root = xp.sqrt(positive_discriminant_list)
         non_zero_a = a - (a == 0)
         t_0 = (-half_b - root) / non_zero_a
         t_1 = (-half_b + root) / non_zero_a
@@ -39,24 +43,27 @@ class Sphere(Hittable):
             (t_min < t_1) & (t_1 < t_max_list) & (~t_0_condition) & discriminant_condition
         )
 
-        t = cp.where(t_0_condition, t_0, 0)
-        t = cp.where(t_1_condition, t_1, t)
+        t = xp.where(t_0_condition, t_0, 0)
+        t = xp.where(t_1_condition, t_1, t)
 
-        condition = t > 0
-        full_rate = condition.sum() / len(t)
-        if full_rate > 0.5:
-            idx = None
-        else:
-            idx = cp.where(condition)[0]
-            t = t[idx]
-            r = RayList(
-                Vec3List(r.origin().get_ndarray(idx)),
-                Vec3List(r.direction().get_ndarray(idx))
-            )
-
-        point = r.at(t)
-        outward_normal = (point - self.center) / self.radius
+        dtype = xp.result_type(r.origin().e, r.direction().e, t)
+        point = r.at(t, out=workspace.empty("sphere.p", (len(r), 3), dtype))
+        outward_normal = point.sub(
+            self.center,
+            out=workspace.empty("sphere.normal", (len(r), 3), dtype)
+        )
+        outward_normal /= self.radius
         result = HitRecordList(
-            point, t, cp.full(len(r), self.material.idx, dtype=cp.int32)
-        ).set_face_normal(r, outward_normal).set_compress_info(idx)
+            point, t, xp.full(len(r), self.material.idx, dtype=xp.int32)
+        ).set_face_normal(r, outward_normal)
         return result
+
+    @staticmethod
+    def pack(spheres):
+        """Host arrays of centers (N, 3), radii (N,) and material ids (N,)."""
+        centers = np.array(
+            [s.center.e for s in spheres], dtype=np.float32
+        ).reshape(-1, 3)
+        radii = np.array([s.radius for s in spheres], dtype=np.float32)
+        mat_ids = np.array([s.material.idx for s in spheres], dtype=np.int32)
+        return centers, radii, mat_ids
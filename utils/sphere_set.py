@@ -0,0 +1,128 @@
+from utils.backend import xp
+from utils.hittable import Hittable, HitRecordList
+from utils.sphere import Sphere
+from utils import profiler, kernels, workspace
+
+
+class SphereSet(Hittable):
+    """Spheres packed into contiguous center, radius and material id arrays.
+
+    `hit` tests a chunk of rays against a chunk of spheres in one
+    broadcasted (rays x spheres) pass and keeps the nearest hit with an
+    argmin. `max_pairs` bounds the size of those temporaries.
+    """
+
+    def __init__(self, centers, radii, mat_ids, material_table, max_pairs = 1 << 20):
+        self.centers = xp.asarray(centers, dtype=xp.float32).reshape(-1, 3)
+        self.radii = xp.asarray(radii, dtype=xp.float32)
+        self.mat_ids = xp.asarray(mat_ids, dtype=xp.int32)
+        self.material_table = material_table
+        self.max_pairs = max_pairs
+
+    @staticmethod
+    def from_list(world, max_pairs = 1 << 20):
+        centers, radii, mat_ids = Sphere.pack(world.objects)
+        return SphereSet(
+            centers, radii, mat_ids, world.get_material_table(), max_pairs
+        )
+
+    def take(self, order):
+        return SphereSet(
+            self.centers[order], self.radii[order], self.mat_ids[order],
+            self.material_table, self.max_pairs
+        )
+
+    def get_material_table(self):
+        return self.material_table
+
+    def __len__(self):
+        return len(self.radii)
+
+    def hit(self, r, t_min, t_max):
+        with profiler.stage("traversal"):
+            return self.traverse(r, t_min, t_max)
+
+    def traverse(self, r, t_min, t_max):
+        length = len(r)
+        if isinstance(t_max, (int, float, xp.floating)):
+            closest_so_far = workspace.full("hit.t", length, t_max)
+        else:
+            closest_so_far = workspace.empty("hit.t", length)
+            closest_so_far[...] = t_max
+        origin = r.origin().e
+        direction = r.direction().e
+        if kernels.enabled():
+            with profiler.stage("intersection"):
+                prim = kernels.closest_hit(
+                    origin, direction, t_min, closest_so_far,
+                    self.centers, self.radii,
+                    workspace.empty("hit.prim", length, xp.int32)
+                )
+            with profiler.stage("hit_record"):
+                return self.hit_record(r, closest_so_far, prim)
+
+        prim = workspace.full("hit.prim", length, -1, xp.int32)
+        ray = xp.where((direction ** 2).sum(axis=1) > 0)[0]
+
+        sphere_chunk = max(1, min(len(self), self.max_pairs))
+        ray_chunk = max(1, self.max_pairs // sphere_chunk)
+        for s in range(0, len(self), sphere_chunk):
+            candidate = xp.arange(s, min(s + sphere_chunk, len(self)))
+            for i in range(0, len(ray), ray_chunk):
+                chunk = ray[i:i + ray_chunk]
+                with profiler.stage("intersection"):
+                    t = self.intersect(
+                        origin[chunk][:, None, :], direction[chunk][:, None, :],
+                        candidate[None, :], t_min, closest_so_far[chunk][:, None]
+                    )
+                    best = t.argmin(axis=1)
+                    best_t = t[xp.arange(len(chunk)), best]
+                    hit = xp.isfinite(best_t)
+                    closest_so_far[chunk[hit]] = best_t[hit]
+                    prim[chunk[hit]] = candidate[best[hit]]
+
+        with profiler.stage("hit_record"):
+            return self.hit_record(r, closest_so_far, prim)
+
+    def intersect(self, o, d, candidate, t_min, t_max):
+        """Ray parameter of the nearest hit in (t_min, t_max), inf on a miss.
+
+        `o`, `d` and `t_max` broadcast against the sphere indices in
+        `candidate`, so this serves both pairwise and all-pairs tests.
+        """
+        oc = o - self.centers[candidate]
+        a = (d ** 2).sum(axis=-1)
+        half_b = (oc * d).sum(axis=-1)
+        c = (oc ** 2).sum(axis=-1) - self.radii[candidate] ** 2
+        discriminant = half_b ** 2 - a * c
+
+        root = xp.sqrt(xp.maximum(discriminant, 0))
+        t_0 = (-half_b - root) / a
+        t_1 = (-half_b + root) / a
+        t_0_condition = (t_min < t_0) & (t_0 < t_max)
+        t_1_condition = (t_min < t_1) & (t_1 < t_max)
+        t = xp.where(t_1_condition, t_1, xp.inf)
+        t = xp.where(t_0_condition, t_0, t)
+        return xp.where(discriminant > 0, t, xp.inf).astype(xp.float32)
+
+    def hit_record(self, r, closest_so_far, prim):
+        rec = HitRecordList.new_from_t(closest_so_far, "hit")
+        idx = xp.where(prim >= 0)[0]
+        if len(idx) == 0:
+            return rec
+
+        p = prim[idx]
+        d = r.direction().e[idx]
+        point = d * closest_so_far[idx][:, None]
+        point += r.origin().e[idx]
+        outward_normal = point - self.centers[p]
+        outward_normal /= self.radii[p][:, None]
+        front_face = xp.einsum("ij,ij->i", d, outward_normal) < 0
+
+        rec.p.e[idx] = point
+        rec.material[idx] = self.mat_ids[p]
+        rec.normal.e[idx] = xp.where(
+            front_face[:, None], outward_normal, -outward_normal
+        )
+        rec.front_face[idx] = front_face
+        return rec
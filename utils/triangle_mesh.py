@@ -0,0 +1,117 @@
+import numpy as np
+from utils.backend import xp
+from utils.hittable import Hittable, HitRecordList
+from utils.material import MaterialTable
+from utils.bvh import build_tree, walk
+from utils import profiler, workspace
+
+
+class TriangleMesh(Hittable):
+    """Triangles of one material, as packed vertex and index arrays.
+
+    A median-split tree over the triangles' boxes is built like the
+    sphere `BVH` and walked by the same breadth-first traversal; leaves
+    are tested with a vectorized Möller–Trumbore pass over every (ray,
+    triangle) pair at once. Triangles are stored in tree order with their
+    first corner and two edges precomputed, so no per-triangle object
+    exists at any point.
+
+    The normal is the geometric one, facing the side the corners wind
+    counter-clockwise around; `Dielectric` treats that side as outside.
+    A mesh can be rendered on its own or added to a `HittableList`.
+    """
+
+    def __init__(self, vertices, faces, material, leaf_size = 4):
+        vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        faces = np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+        if len(faces) > 0 and not (0 <= faces.min() and faces.max() < len(vertices)):
+            raise ValueError("Face vertex indices out of range")
+        self.material = material
+        self.leaf_size = leaf_size
+
+        corners = vertices[faces]
+        nodes, order = build_tree(
+            corners.min(axis=1), corners.max(axis=1), corners.mean(axis=1),
+            leaf_size
+        )
+        for name, a in nodes.items():
+            setattr(self, name, xp.asarray(a))
+        corners = corners[order]
+        self.vertices = xp.asarray(vertices)
+        self.faces = xp.asarray(faces[order])
+        self.v0 = xp.asarray(corners[:, 0])
+        self.e1 = xp.asarray(corners[:, 1] - corners[:, 0])
+        self.e2 = xp.asarray(corners[:, 2] - corners[:, 0])
+
+    def get_material_table(self):
+        return MaterialTable({self.material.idx: self.material})
+
+    def __len__(self):
+        return len(self.faces)
+
+    def hit(self, r, t_min, t_max):
+        with profiler.stage("traversal"):
+            return self.traverse(r, t_min, t_max)
+
+    def traverse(self, r, t_min, t_max):
+        length = len(r)
+        if isinstance(t_max, (int, float, xp.floating)):
+            closest_so_far = workspace.full("mesh.t", length, t_max)
+        else:
+            closest_so_far = workspace.empty("mesh.t", length)
+            closest_so_far[...] = t_max
+        prim = workspace.full("mesh.prim", length, -1, xp.int32)
+        walk(
+            self, self.intersect, r.origin().e, r.direction().e, t_min,
+            closest_so_far, prim
+        )
+        with profiler.stage("hit_record"):
+            return self.hit_record(r, closest_so_far, prim)
+
+    def intersect(self, o, d, candidate, t_min, t_max):
+        """Möller–Trumbore: ray parameter of the hit in (t_min, t_max), else inf.
+
+        `o`, `d` and `t_max` broadcast against the triangle indices in
+        `candidate`. Rays parallel to a triangle's plane miss it.
+        """
+        e1 = self.e1[candidate]
+        e2 = self.e2[candidate]
+        p = xp.cross(d, e2)
+        det = (e1 * p).sum(axis=-1)
+        parallel = xp.abs(det) < 1e-12
+        inv_det = 1 / xp.where(parallel, 1, det)
+
+        s = o - self.v0[candidate]
+        u = (s * p).sum(axis=-1) * inv_det
+        q = xp.cross(s, e1)
+        v = (d * q).sum(axis=-1) * inv_det
+        t = (e2 * q).sum(axis=-1) * inv_det
+        hit = (
+            ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1)
+            & (t_min < t) & (t < t_max)
+        )
+        return xp.where(hit, t, xp.inf).astype(xp.float32)
+
+    def hit_record(self, r, closest_so_far, prim):
+        rec = HitRecordList.new_from_t(closest_so_far, "hit")
+        idx = xp.where(prim >= 0)[0]
+        if len(idx) == 0:
+            return rec
+
+        p = prim[idx]
+        d = r.direction().e[idx]
+        point = d * closest_so_far[idx][:, None]
+        point += r.origin().e[idx]
+        outward_normal = xp.cross(self.e1[p], self.e2[p])
+        outward_normal /= xp.sqrt(
+            (outward_normal ** 2).sum(axis=1, keepdims=True)
+        )
+        front_face = xp.einsum("ij,ij->i", d, outward_normal) < 0
+
+        rec.p.e[idx] = point
+        rec.material[idx] = self.material.idx
+        rec.normal.e[idx] = xp.where(
+            front_face[:, None], outward_normal, -outward_normal
+        )
+        rec.front_face[idx] = front_face
+        return rec
@@ -1,15 +1,16 @@
-import cupy as cp
-
-rng = cp.random
+import math
+import numpy as np
+from utils.backend import xp
 
 
 def degrees_to_radians(degrees):
-    return degrees * cp.pi / 180
+    return degrees * math.pi / 180
 
 
 def random_float(_min = 0, _max = 1):
-    return rng.uniform(_min, _max)
+    # Scalar draws are setup code: keep them on the host generator.
+    return np.random.uniform(_min, _max)
 
 
 def random_float_list(size: int, _min = 0, _max = 1):
-    return rng.uniform(_min, _max, size).astype(cp.float32, copy=False)
+    return xp.random.uniform(_min, _max, size).astype(xp.float32, copy=False)
@@ -1,10 +1,22 @@
-import cupy as cp
-from utils.utils import random_float, random_float_list
+import math
+import numpy as np
+from utils.backend import xp, asnumpy
+from utils.utils import random_float
+from utils.random_stream import GlobalStream
 
 
 class Vec3:
+    """Scalar 3-vector for scene and camera setup, as three Python floats.
+
+    It never touches the array backend: values are uploaded only when they
+    enter a `Vec3List`, either through `Vec3List.from_vec3` or as the
+    operand of a batched operation.
+    """
+
+    __slots__ = ("e",)
+
     def __init__(self, e0 = 0, e1 = 0, e2 = 0):
-        self.e: cp.ndarray = cp.array([e0, e1, e2], dtype=cp.float32)
+        self.e = (float(e0), float(e1), float(e2))
 
     def x(self):
         return self.e[0]
@@ -22,40 +34,46 @@ class Vec3:
         return f'{self.e[0]} {self.e[1]} {self.e[2]}'
 
     def length_squared(self):
-        return self.e @ self.e
+        x, y, z = self.e
+        return x * x + y * y + z * z
 
     def length(self):
-        return cp.sqrt(self.length_squared())
+        return math.sqrt(self.length_squared())
 
     def __add__(self, v):
-        return Vec3(*(self.e + v.e))
+        if not isinstance(v, Vec3):
+            return NotImplemented
+        return Vec3(self.e[0] + v.e[0], self.e[1] + v.e[1], self.e[2] + v.e[2])
 
     def __neg__(self):
-        return Vec3(*(-self.e))
+        return Vec3(-self.e[0], -self.e[1], -self.e[2])
 
     def __sub__(self, v):
-        return self + (-v)
+        if not isinstance(v, Vec3):
+            return NotImplemented
+        return Vec3(self.e[0] - v.e[0], self.e[1] - v.e[1], self.e[2] - v.e[2])
 
     def __mul__(self, v):
         if isinstance(v, Vec3):
-            return Vec3(*(self.e * v.e))
-        return Vec3(*(self.e * v))
+            return Vec3(self.e[0] * v.e[0], self.e[1] * v.e[1], self.e[2] * v.e[2])
+        if isinstance(v, Vec3List):
+            return NotImplemented
+        return Vec3(self.e[0] * v, self.e[1] * v, self.e[2] * v)
 
     def __matmul__(self, v):
-        return self.e @ v.e
+        if not isinstance(v, Vec3):
+            return NotImplemented
+        return self.e[0] * v.e[0] + self.e[1] * v.e[1] + self.e[2] * v.e[2]
 
     def __truediv__(self, t):
         return self * (1 / t)
 
     def __iadd__(self, v):
-        self.e += v.e
+        self.e = (self + v).e
         return self
 
     def __imul__(self, v):
-        if isinstance(v, Vec3):
-            self.e *= v.e
-        else:
-            self.e *= v
+        self.e = (self * v).e
         return self
 
     def __itruediv__(self, t):
@@ -63,7 +81,8 @@ class Vec3:
         return self
 
     def cross(self, v):
-        return Vec3(*cp.cross(self.e, v.e))
+        (a0, a1, a2), (b0, b1, b2) = self.e, v.e
+        return Vec3(a1 * b2 - a2 * b1, a2 * b0 - a0 * b2, a0 * b1 - a1 * b0)
 
     def unit_vector(self):
         length = self.length()
@@ -72,10 +91,10 @@ class Vec3:
         return self / length
 
     def clamp(self, _min, _max):
-        return Vec3(*cp.clip(self.e, _min, _max))
+        return Vec3(*(min(max(c, _min), _max) for c in self.e))
 
     def gamma(self, gamma):
-        return Vec3(*(self.e ** (1 / gamma)))
+        return Vec3(*(c ** (1 / gamma) for c in self.e))
 
     def reflect(self, n):
         return self - (n * (self @ n)) * 2
@@ -83,188 +102,237 @@ class Vec3:
     def refract(self, normal, etai_over_etat):
         cos_theta = -self @ normal
         r_out_parallel = (self + normal * cos_theta) * etai_over_etat
-        r_out_prep = normal * (-cp.sqrt(1 - r_out_parallel.length_squared()))
+        r_out_prep = normal * (-math.sqrt(1 - r_out_parallel.length_squared()))
         return r_out_parallel + r_out_prep
 
     @staticmethod
     def random(_min: float = 0, _max: float = 1):
-        return Vec3(*random_float_list(3, _min, _max))
+        return Vec3(*np.random.uniform(_min, _max, 3))
 
     @staticmethod
     def random_in_unit_sphere():
         u = random_float()
         v = random_float()
-        theta = u * 2 * cp.pi
-        phi = cp.arccos(2 * v - 1)
-        r = cp.cbrt(random_float())
-        sinTheta = cp.sin(theta)
-        cosTheta = cp.cos(theta)
-        sinPhi = cp.sin(phi)
-        cosPhi = cp.cos(phi)
-        x = r * sinPhi * cosTheta
-        y = r * sinPhi * sinTheta
-        z = r * cosPhi
+        theta = u * 2 * math.pi
+        phi = math.acos(2 * v - 1)
+        r = random_float() ** (1 / 3)
+        x = r * math.sin(phi) * math.cos(theta)
+        y = r * math.sin(phi) * math.sin(theta)
+        z = r * math.cos(phi)
         return Vec3(x, y, z)
 
     @staticmethod
-    def random_in_unit_sphere_list(size):
-        u = random_float_list(size)
-        v = random_float_list(size)
-        theta = u * 2 * cp.pi
-        phi = cp.arccos(2 * v - 1)
-        r = cp.cbrt(random_float_list(size))
-        sinTheta = cp.sin(theta)
-        cosTheta = cp.cos(theta)
-        sinPhi = cp.sin(phi)
-        cosPhi = cp.cos(phi)
+    def random_in_unit_sphere_list(size, rng = None):
+        rng = rng or GlobalStream(size)
+        u = rng.uniform(0)
+        v = rng.uniform(1)
+        theta = u * 2 * xp.pi
+        phi = xp.arccos(2 * v - 1)
+        r = xp.cbrt(rng.uniform(2))
+        sinTheta = xp.sin(theta)
+        cosTheta = xp.cos(theta)
+        sinPhi = xp.sin(phi)
+        cosPhi = xp.cos(phi)
         x = r * sinPhi * cosTheta
         y = r * sinPhi * sinTheta
         z = r * cosPhi
-        return Vec3List(cp.transpose(cp.array([x, y, z])))
+        return Vec3List(xp.stack([x, y, z], axis=1))
 
     @staticmethod
-    def random_unit_vector(size):
-        a = random_float_list(size, 0, 2 * cp.pi)
-        z = random_float_list(size, -1, 1)
-        r = cp.sqrt(1 - z**2)
-        return Vec3List(cp.transpose(cp.array([r*cp.cos(a), r*cp.sin(a), z])))
+    def random_unit_vector(size, rng = None):
+        rng = rng or GlobalStream(size)
+        a = rng.uniform(0, 0, 2 * xp.pi)
+        z = rng.uniform(1, -1, 1)
+        r = xp.sqrt(1 - z**2)
+        return Vec3List(xp.stack([r*xp.cos(a), r*xp.sin(a), z], axis=1))
 
     @staticmethod
-    def random_in_hemisphere(normal):
-        in_unit_sphere = Vec3.random_in_unit_sphere_list(len(normal))
-        return Vec3List(cp.where(
+    def random_in_hemisphere(normal, rng = None):
+        in_unit_sphere = Vec3.random_in_unit_sphere_list(len(normal), rng)
+        return Vec3List(xp.where(
             in_unit_sphere @ normal > 0, in_unit_sphere.e, -in_unit_sphere.e
         ))
 
     @staticmethod
-    def random_in_unit_disk(size):
-        r = cp.sqrt(random_float_list(size))
-        theta = random_float_list(size) * 2 * cp.pi
-        return cp.array([r*cp.cos(theta), r*cp.sin(theta)])
+    def random_in_unit_disk(size, rng = None, dim = 0):
+        rng = rng or GlobalStream(size)
+        r = xp.sqrt(rng.uniform(dim))
+        theta = rng.uniform(dim + 1) * 2 * xp.pi
+        return xp.array([r*xp.cos(theta), r*xp.sin(theta)])
 
 
 Point3 = Vec3
 Color = Vec3
 
 
+def _elements(v):
+    """The array operand of a `Vec3List` operation; uploads a scalar `Vec3`."""
+    if isinstance(v, Vec3):
+        return xp.asarray(v.e, dtype=xp.float32)
+    return v.e
+
+
+def _operand(v):
+    """`_elements` for vectors, scalars as they are."""
+    if isinstance(v, (Vec3, Vec3List)):
+        return _elements(v)
+    return v
+
+
+def _out(out):
+    return out.e if isinstance(out, Vec3List) else out
+
+
 class Vec3List:
+    """Batch of 3-vectors as an (N, 3) array.
+
+    Scalar and per-ray (N,) operands are broadcast rather than copied out
+    to (N, 3), so `from_vec3` and `from_array` return read-only views. The
+    binary operations take an `out` Vec3List (or array) to write into, and
+    the in-place operators and `imul_ndarray`/`idiv_ndarray` reuse the
+    left operand's buffer.
+    """
+
     def __init__(self, e):
         self.e = e
 
     def x(self):
-        return cp.transpose(self.e)[0]
+        return self.e[:, 0]
 
     def y(self):
-        return cp.transpose(self.e)[1]
+        return self.e[:, 1]
 
     def z(self):
-        return cp.transpose(self.e)[2]
+        return self.e[:, 2]
 
     def cpu(self):
-        self.e = cp.asnumpy(self.e)
+        self.e = asnumpy(self.e)
         return self
 
     def __getitem__(self, idx):
-        return Vec3(*self.e[idx])
+        return Vec3(*self.e[idx].tolist())
 
     def get_ndarray(self, idx):
         return self.e[idx]
 
     def __setitem__(self, idx, val):
-        self.e[idx] = val.e
+        self.e[idx] = _elements(val)
 
     def __len__(self):
         return len(self.e)
 
+    def add(self, v, out = None):
+        return Vec3List(xp.add(self.e, _elements(v), out=_out(out)))
+
+    def sub(self, v, out = None):
+        return Vec3List(xp.subtract(self.e, _elements(v), out=_out(out)))
+
+    def mul(self, v, out = None):
+        return Vec3List(xp.multiply(self.e, _operand(v), out=_out(out)))
+
+    def div(self, v, out = None):
+        return Vec3List(xp.true_divide(self.e, _operand(v), out=_out(out)))
+
     def __add__(self, v):
-        return Vec3List(self.e + v.e)
+        return self.add(v)
 
     __radd__ = __add__
 
     def __iadd__(self, v):
-        self.e += v.e
+        self.e += _elements(v)
         return self
 
     def __mul__(self, v):
-        if isinstance(v, (Vec3, Vec3List)):
-            return Vec3List(self.e * v.e)
-        return Vec3List(self.e * v)
+        return self.mul(v)
 
     __rmul__ = __mul__
 
     def __imul__(self, v):
-        if isinstance(v, (Vec3, Vec3List)):
-            self.e *= v.e
-        else:
-            self.e *= v
+        self.e *= _operand(v)
         return self
 
     def __sub__(self, v):
-        return Vec3List(self.e - v.e)
+        return self.sub(v)
 
     def __rsub__(self, v):
-        return Vec3List(v.e - self.e)
+        return Vec3List(_elements(v) - self.e)
 
     def __isub__(self, v):
-        self.e -= v.e
+        self.e -= _elements(v)
         return self
 
     def __neg__(self):
         return Vec3List(-self.e)
 
     def __truediv__(self, v):
-        if isinstance(v, Vec3List):
-            return Vec3List(self.e / v.e)
-        return Vec3List(self.e / v)
+        return self.div(v)
+
+    def __itruediv__(self, v):
+        self.e /= _operand(v)
+        return self
 
     def __matmul__(self, v):
-        return (self.e * v.e).sum(axis=1)
+        other = _elements(v)
+        return xp.einsum(
+            "ij,ij->i" if other.ndim == 2 else "ij,j->i", self.e, other
+        )
+
+    def mul_ndarray(self, a, out = None):
+        return Vec3List(xp.multiply(self.e, a[:, None], out=_out(out)))
 
-    def mul_ndarray(self, a):
-        return self * Vec3List.from_array(a)
+    def div_ndarray(self, a, out = None):
+        return Vec3List(xp.true_divide(self.e, a[:, None], out=_out(out)))
 
-    def div_ndarray(self, a):
-        return self / Vec3List.from_array(a)
+    def imul_ndarray(self, a):
+        self.e *= a[:, None]
+        return self
+
+    def idiv_ndarray(self, a):
+        self.e /= a[:, None]
+        return self
 
     def as_float32(self):
-        self.e = self.e.astype(cp.float32, copy=False)
+        self.e = self.e.astype(xp.float32, copy=False)
         return self
 
     def length_squared(self):
-        return (self.e ** 2).sum(axis=1)
+        return xp.einsum("ij,ij->i", self.e, self.e)
 
     def length(self):
-        return cp.sqrt(self.length_squared())
+        return xp.sqrt(self.length_squared())
 
-    def unit_vector(self):
+    def unit_vector(self, out = None):
         length = self.length()
         condition = length > 0
-        length_non_zero = cp.where(condition, length, 1)
-        return self.div_ndarray(length_non_zero).mul_ndarray(condition)
+        length[~condition] = 1
+        return self.div_ndarray(length, out).imul_ndarray(condition)
 
     def reflect(self, n):
-        return self - (n.mul_ndarray(self @ n)) * 2
+        scaled = n.mul_ndarray(self @ n)
+        scaled *= 2
+        return self.sub(scaled, out=scaled)
 
     def refract(self, normal, etai_over_etat):
         cos_theta = -self @ normal
-        r_out_parallel = (self + normal.mul_ndarray(cos_theta)).mul_ndarray(etai_over_etat)
-        r_out_prep = normal.mul_ndarray(-cp.sqrt(1 - r_out_parallel.length_squared()))
-        return r_out_parallel + r_out_prep
+        r_out_parallel = normal.mul_ndarray(cos_theta)
+        r_out_parallel += self
+        r_out_parallel.imul_ndarray(etai_over_etat)
+        r_out_prep = normal.mul_ndarray(-xp.sqrt(1 - r_out_parallel.length_squared()))
+        r_out_prep += r_out_parallel
+        return r_out_prep
 
     @staticmethod
     def from_vec3(v, length):
-        v1 = cp.tile(v.e, (length, 1))
-        return Vec3List(v1)
+        return Vec3List(xp.broadcast_to(_elements(v), (length, 3)))
 
     @staticmethod
     def from_array(a):
-        vl = cp.transpose(cp.tile(a, (3, 1)))
-        return Vec3List(vl)
+        return Vec3List(xp.broadcast_to(a[:, None], (len(a), 3)))
 
     @staticmethod
     def new_empty(length):
-        return Vec3List(cp.empty((length, 3), dtype=cp.float32))
+        return Vec3List(xp.empty((length, 3), dtype=xp.float32))
 
     @staticmethod
     def new_zero(length):
-        return Vec3List(cp.zeros((length, 3), dtype=cp.float32))
+        return Vec3List(xp.zeros((length, 3), dtype=xp.float32))
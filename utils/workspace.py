@@ -0,0 +1,116 @@
+import contextlib
+from utils.backend import xp, is_gpu
+
+
+class Workspace:
+    """Named scratch buffers reused across bounces, tiles and samples.
+
+    `empty(name, shape, dtype)` returns the first `shape[0]` rows of a
+    buffer kept under `name` and `dtype`, growing it only when a longer one
+    is asked for. Wavefronts shrink as paths terminate, so after the first
+    bounce of the first tile the hot path allocates none of these buffers
+    again.
+
+    A buffer is only valid until the next request for the same name: a
+    result that outlives the bounce that made it (anything stored in a
+    `PathState`, the radiance of a tile) must not be a workspace buffer.
+    `allocations` and `allocated_bytes` count the buffers actually created,
+    `requests` the calls served, so reuse is measurable.
+    """
+
+    def __init__(self):
+        self.buffers = dict()
+        self.requests = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def empty(self, name, shape, dtype = None):
+        if isinstance(shape, int):
+            shape = (shape,)
+        dtype = xp.dtype(dtype or xp.float32)
+        self.requests += 1
+        # Keyed by dtype too: primary rays are float64, later bounces float32.
+        key = (name, dtype)
+        buffer = self.buffers.get(key)
+        if (
+            buffer is None or len(buffer) < shape[0]
+            or buffer.shape[1:] != tuple(shape[1:])
+        ):
+            buffer = xp.empty(shape, dtype=dtype)
+            self.buffers[key] = buffer
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+        return buffer[:shape[0]]
+
+    def zeros(self, name, shape, dtype = None):
+        return self.full(name, shape, 0, dtype)
+
+    def full(self, name, shape, value, dtype = None):
+        buffer = self.empty(name, shape, dtype)
+        buffer.fill(value)
+        return buffer
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def report(self):
+        return dict(
+            buffers=len(self.buffers), bytes=self.nbytes(),
+            requests=self.requests, allocations=self.allocations,
+            allocated_bytes=self.allocated_bytes,
+        )
+
+
+_workspace = None
+
+
+def current():
+    return _workspace
+
+
+def empty(name, shape, dtype = None):
+    """`Workspace.empty` on the active workspace, a new array without one."""
+    if _workspace is None:
+        return xp.empty(shape, dtype=dtype or xp.float32)
+    return _workspace.empty(name, shape, dtype)
+
+
+def zeros(name, shape, dtype = None):
+    if _workspace is None:
+        return xp.zeros(shape, dtype=dtype or xp.float32)
+    return _workspace.zeros(name, shape, dtype)
+
+
+def full(name, shape, value, dtype = None):
+    if _workspace is None:
+        return xp.full(shape, value, dtype=dtype or xp.float32)
+    return _workspace.full(name, shape, value, dtype)
+
+
+def gather(a, idx, out):
+    """`a[idx]` along the first axis, written to `out`."""
+    if is_gpu():
+        return xp.take(a, idx, axis=0, out=out)
+    # NumPy's default mode="raise" gathers into a temporary and copies it.
+    return xp.take(a, idx, axis=0, out=out, mode="clip")
+
+
+def take(name, a, idx):
+    """`a[idx]` along the first axis, in the buffer `name` if one is active."""
+    return gather(a, idx, empty(name, (len(idx),) + a.shape[1:], a.dtype))
+
+
+@contextlib.contextmanager
+def use(workspace = None):
+    """Make `workspace` active for the enclosed block.
+
+    Without one, the active workspace is kept if there is one and a new
+    one is made otherwise, so nested render calls share their buffers.
+    """
+    global _workspace
+    previous = _workspace
+    _workspace = workspace or previous or Workspace()
+    try:
+        yield _workspace
+    finally:
+        _workspace = previous